@@ -0,0 +1,5 @@
+"""Benchmarks of pysigrok's inputs, outputs and decoding loop.
+
+Run them with python -m benchmarks. Captures are generated with SrZipOutput and
+the results are written as JSON so that runs can be compared across releases.
+"""
@@ -0,0 +1,96 @@
+import click
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import sigrokdecode
+
+from .captures import UNITSIZES, WAVEFORMS, SyntheticDevice, capture_path
+from .suite import BENCHMARKS, run_benchmark
+
+
+@click.command()
+@click.option(
+    "-b",
+    "--benchmark",
+    "benchmarks",
+    multiple=True,
+    type=click.Choice(list(BENCHMARKS)),
+    help="Benchmark to run. Defaults to all of them",
+)
+@click.option(
+    "-w",
+    "--waveform",
+    "waveforms",
+    multiple=True,
+    type=click.Choice(list(WAVEFORMS)),
+    help="Waveform to run the benchmarks on. Defaults to all of them",
+)
+@click.option("--samples", type=int, default=1_000_000, show_default=True)
+@click.option(
+    "--unitsize",
+    "unitsizes",
+    multiple=True,
+    type=click.Choice([str(u) for u in UNITSIZES]),
+    help="Bytes per sample of the captures. Defaults to 1",
+)
+@click.option("--repeat", type=int, default=3, show_default=True)
+@click.option(
+    "--capture-dir",
+    type=click.Path(file_okay=False),
+    help="Directory to keep the generated captures in between runs",
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.File("w"),
+    default="-",
+    help="File to write the JSON results to",
+)
+def main(benchmarks, waveforms, samples, unitsizes, repeat, capture_dir, output):
+    benchmarks = benchmarks or list(BENCHMARKS)
+    waveforms = waveforms or list(WAVEFORMS)
+    unitsizes = [int(u) for u in unitsizes] or [1]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if capture_dir is None:
+            capture_dir = tmp
+        os.makedirs(capture_dir, exist_ok=True)
+        results = []
+        for name in benchmarks:
+            _, benchmark_waveforms = BENCHMARKS[name]
+            runs = [(None, None)]
+            if benchmark_waveforms is not None:
+                runs = [
+                    (waveform, unitsize)
+                    for waveform in waveforms
+                    if waveform in benchmark_waveforms
+                    for unitsize in unitsizes
+                ]
+            for waveform, unitsize in runs:
+                path = device = None
+                if waveform is not None:
+                    device = SyntheticDevice(waveform, unitsize)
+                    path = capture_path(capture_dir, waveform, samples, unitsize)
+                result = run_benchmark(name, path, device, samples, repeat)
+                results.append(result)
+                print(
+                    f"{name:18} {waveform or '-':7} {unitsize or '-'} "
+                    f"{result['samples_per_second']:14,.0f} samples/s",
+                    file=sys.stderr,
+                )
+
+    report = {
+        "pysigrok": sigrokdecode.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "results": results,
+    }
+    output.write(json.dumps(report, indent=2) + "\n")
+
+
+main()
@@ -0,0 +1,208 @@
+"""Synthetic srzip captures for the benchmarks.
+
+Each waveform is one period of logic runs that is repeated up to the requested
+number of samples. Waveforms use the low channels and the top channel flips
+every period so that every byte of wider samples changes too.
+"""
+import array
+import math
+import os
+import random
+
+from sigrokdecode.runs import LogicRuns
+from sigrokdecode.srzip import SrZipOutput
+
+DEFAULT_SAMPLERATE = 10_000_000
+
+# Samples per bit of the serial protocols.
+BIT_SAMPLES = 10
+
+# Samples written to SrZipOutput at a time.
+BLOCK_SAMPLES = 1 << 20
+
+# Unitsizes SrZipOutput can write.
+UNITSIZES = (1, 2, 4)
+
+
+def _bits(byte):
+    """The bits of byte, most significant first."""
+    return [(byte >> bit) & 1 for bit in range(7, -1, -1)]
+
+
+def uart_period():
+    """8N1 frames of every byte value on channel 0, idle high between them."""
+    levels = []
+    for byte in range(256):
+        levels.extend((1, 1, 0))
+        levels.extend(reversed(_bits(byte)))
+        levels.append(1)
+    return LogicRuns((level, BIT_SAMPLES) for level in levels)
+
+
+def spi_period():
+    """Mode 0 SPI transfers. Channels are CLK, MOSI, MISO and CS#."""
+    half = BIT_SAMPLES // 2
+    runs = LogicRuns([(0x8, 4 * BIT_SAMPLES)])
+    for byte in range(0, 256, 7):
+        for bit in _bits(byte):
+            data = bit << 1 | (bit ^ 1) << 2
+            runs.append(data, half)
+            runs.append(data | 0x1, half)
+        runs.append(0, BIT_SAMPLES)
+    runs.append(0x8, 4 * BIT_SAMPLES)
+    return runs
+
+
+def i2c_period():
+    """Writes of two bytes to every 7-bit address. Channels are SCL and SDA."""
+    half = BIT_SAMPLES // 2
+    runs = LogicRuns()
+    for address in range(128):
+        runs.append(0x3, 4 * BIT_SAMPLES)
+        # Start
+        runs.append(0x1, half)
+        for byte in (address << 1, address, 0xFF - address):
+            # The receiver acks each byte by pulling SDA low.
+            for bit in _bits(byte) + [0]:
+                sda = bit << 1
+                runs.append(sda, half)
+                runs.append(sda | 0x1, half)
+                runs.append(sda, half)
+        # Stop
+        runs.append(0x0, half)
+        runs.append(0x1, half)
+        runs.append(0x3, half)
+    return runs
+
+
+def idle_period():
+    """A short pulse on channel 0 after a long idle stretch."""
+    return LogicRuns([(0, 100_000), (1, BIT_SAMPLES)])
+
+
+def toggle_period():
+    """A counter on the low channels that changes every sample."""
+    return LogicRuns((value, 1) for value in range(256))
+
+
+def busy_period():
+    """Random values on every channel, each held for 3 to 10 samples."""
+    rng = random.Random(0)
+    return LogicRuns((rng.getrandbits(32), rng.randint(3, 10)) for _ in range(1 << 16))
+
+
+WAVEFORMS = {
+    "uart": uart_period,
+    "spi": spi_period,
+    "i2c": i2c_period,
+    "idle": idle_period,
+    "toggle": toggle_period,
+    "busy": busy_period,
+    "analog": uart_period,
+}
+
+
+class SyntheticDevice:
+    """Stands in for the driver SrZipOutput takes the capture's metadata from."""
+
+    name = "pysigrok-benchmarks"
+
+    def __init__(self, waveform, unitsize=1, samplerate=DEFAULT_SAMPLERATE):
+        if waveform not in WAVEFORMS:
+            raise ValueError(
+                "Unknown waveform " + waveform + ". Use one of: " + ", ".join(WAVEFORMS)
+            )
+        if unitsize not in UNITSIZES:
+            raise ValueError(
+                f"Unsupported unitsize {unitsize}. Use one of: "
+                + ", ".join(str(u) for u in UNITSIZES)
+            )
+        self.waveform = waveform
+        self.unitsize = unitsize
+        self.samplerate = samplerate
+        # The most channels that still fit in unitsize bytes.
+        self.logic_channels = [f"D{i}" for i in range(8 * unitsize - 1)]
+        self.analog_channels = []
+        if waveform == "analog":
+            self.analog_channels = ["A0", "A1"]
+
+    def logic_blocks(self, samples):
+        """Yield LogicRuns of at most BLOCK_SAMPLES covering samples samples."""
+        period = WAVEFORMS[self.waveform]()
+        mask = (1 << len(self.logic_channels)) - 1
+        flip = 1 << (len(self.logic_channels) - 1)
+        pending = LogicRuns()
+        flipped = False
+        remaining = samples
+        while remaining > 0:
+            for value, length in period:
+                value &= mask
+                pending.append(value ^ flip if flipped else value, length)
+            flipped = not flipped
+            while pending.samples >= BLOCK_SAMPLES or (
+                pending.samples >= remaining and remaining > 0
+            ):
+                block = pending.take(min(BLOCK_SAMPLES, remaining))
+                remaining -= block.samples
+                yield block
+
+    def analog_blocks(self, samples):
+        """Yield per-channel float arrays: a sine and a sawtooth."""
+        if not self.analog_channels:
+            return
+        period = 1000
+        sine = array.array(
+            "f", (math.sin(2 * math.pi * i / period) for i in range(period))
+        )
+        saw = array.array("f", (i / period for i in range(period)))
+        repeats = BLOCK_SAMPLES // period
+        sine *= repeats
+        saw *= repeats
+        start = 0
+        while start < samples:
+            count = min(len(sine), samples - start)
+            yield sine[:count], saw[:count]
+            start += count
+
+
+def write_capture(
+    file, device, samples, *, logic_blocks=None, analog_blocks=None, **output_options
+):
+    """Write samples samples of device's waveform to file as an srzip capture.
+
+    logic_blocks and analog_blocks replace the device's blocks when given.
+    """
+    if logic_blocks is None:
+        logic_blocks = device.logic_blocks(samples)
+    if analog_blocks is None:
+        analog_blocks = device.analog_blocks(samples)
+    output = SrZipOutput(
+        file,
+        device,
+        logic_channels=device.logic_channels,
+        analog_channels=device.analog_channels,
+        **output_options,
+    )
+    output.start()
+    start = 0
+    for block in logic_blocks:
+        output.output(device, start, start + block.samples, ["logic", block])
+        start += block.samples
+    if device.analog_channels:
+        start = 0
+        for block in analog_blocks:
+            output.output(
+                device, start, start + len(block[0]), ["analog_block", *block]
+            )
+            start += len(block[0])
+    output.stop()
+
+
+def capture_path(directory, waveform, samples, unitsize):
+    """Return the path of a capture, writing it first if it doesn't exist."""
+    path = os.path.join(directory, f"{waveform}-{samples}-{unitsize}.sr")
+    if not os.path.exists(path):
+        tmp = path + ".tmp"
+        write_capture(tmp, SyntheticDevice(waveform, unitsize), samples)
+        os.replace(tmp, path)
+    return path
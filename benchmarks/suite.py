@@ -0,0 +1,287 @@
+"""The benchmarks and the toy decoders they run.
+
+A benchmark is a function taking the path of a capture, the device that
+generated it and its number of samples. It prepares what it needs and returns
+the function that is timed. That does the work once and returns any counters
+worth reporting.
+"""
+import io
+import itertools
+import time
+
+import sigrokdecode as srd
+from sigrokdecode.bits import BitsOutput
+from sigrokdecode.output import Output
+from sigrokdecode.srzip import SrZipInput
+
+from .captures import BIT_SAMPLES, write_capture
+
+
+class EdgeCounter(srd.Decoder):
+    """Waits for every edge on its channel."""
+
+    id = "edges"
+    name = "Edges"
+    channels = ({"id": "data", "name": "Data"},)
+    annotations = (("edge", "Edge"),)
+    options = ()
+
+    def reset(self):
+        self.edges = 0
+
+    def start(self):
+        pass
+
+    def decode(self):
+        while True:
+            self.wait({0: "e"})
+            self.edges += 1
+
+
+class ToyUart(srd.Decoder):
+    """Decodes 8N1 frames with a fixed bit length and puts the bytes."""
+
+    id = "toyuart"
+    name = "Toy UART"
+    channels = ({"id": "rx", "name": "RX"},)
+    annotations = (("data", "Data"), ("start", "Start bit"), ("stop", "Stop bit"))
+    options = ()
+
+    def reset(self):
+        pass
+
+    def start(self):
+        self.out_ann = self.register(srd.OUTPUT_ANN)
+        self.out_python = self.register(srd.OUTPUT_PYTHON)
+
+    def decode(self):
+        half = BIT_SAMPLES // 2
+        while True:
+            self.wait({0: "f"})
+            start = self.samplenum
+            self.wait({"skip": half})
+            self.put(start, start + BIT_SAMPLES, self.out_ann, [1, ["Start"]])
+            value = 0
+            for bit in range(8):
+                (rx,) = self.wait({"skip": BIT_SAMPLES})
+                value |= rx << bit
+            (rx,) = self.wait({"skip": BIT_SAMPLES})
+            end = self.samplenum + half
+            self.put(start, end, self.out_ann, [0, [f"{value:02X}"]])
+            self.put(end - BIT_SAMPLES, end, self.out_ann, [2, ["Stop"]])
+            self.put(start, end, self.out_python, value)
+
+
+class ByteCounter(srd.Decoder):
+    """Stacked on ToyUart. Annotates every byte it receives."""
+
+    id = "bytes"
+    name = "Bytes"
+    inputs = ["toyuart"]
+    annotations = (("byte", "Byte"),)
+    options = ()
+
+    def reset(self):
+        pass
+
+    def start(self):
+        self.out_ann = self.register(srd.OUTPUT_ANN)
+
+    def decode(self, startsample, endsample, data):
+        self.put(startsample, endsample, self.out_ann, [0, [str(data)]])
+
+
+class CountingOutput(Output):
+    """Counts what it is handed instead of writing it anywhere."""
+
+    def __init__(self, data_classes=("logic",)):
+        self.data_classes = data_classes
+        self.items = 0
+
+    def output(self, source, startsample, endsample, data):
+        self.items += 1
+
+
+def _decoder(cls, **pin_mapping):
+    return {"id": cls.id, "cls": cls, "options": {}, "pin_mapping": pin_mapping}
+
+
+def srzip_write(path, device, samples):
+    """Write the waveform into memory with SrZipOutput."""
+    # Generate the samples up front so that only writing them is timed.
+    logic_blocks = list(device.logic_blocks(samples))
+    analog_blocks = list(device.analog_blocks(samples))
+
+    def run():
+        output = io.BytesIO()
+        write_capture(
+            output,
+            device,
+            samples,
+            logic_blocks=logic_blocks,
+            analog_blocks=analog_blocks,
+        )
+        return {"bytes": len(output.getvalue())}
+
+    return run
+
+
+def srzip_read(path, device, samples):
+    """Read every logic sample change with SrZipInput."""
+
+    def run():
+        output = CountingOutput()
+        srd.run_decoders(SrZipInput(path), output)
+        return {"puts": output.items}
+
+    return run
+
+
+def srzip_read_analog(path, device, samples):
+    """Read the logic and analog samples in blocks."""
+
+    def run():
+        output = CountingOutput(("logic", "analog"))
+        srd.run_decoders(SrZipInput(path, analog_blocks="true"), output)
+        return {"puts": output.items}
+
+    return run
+
+
+class _NullFile(io.RawIOBase):
+    """Counts the bytes written to it and drops them."""
+
+    def __init__(self):
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
+
+
+def bits_output(path, device, samples):
+    """Render the capture as text with BitsOutput."""
+
+    def run():
+        input_ = SrZipInput(path)
+        output_file = _NullFile()
+        srd.run_decoders(input_, BitsOutput(output_file, input_, input_.logic_channels))
+        return {"bytes": output_file.size}
+
+    return run
+
+
+def _wait_edges(path, data_classes):
+    def run():
+        input_ = SrZipInput(path)
+        output = CountingOutput(data_classes)
+        decoders = srd.start_decoders(
+            input_, output, [_decoder(EdgeCounter, data=0)], annotations={}
+        )
+        decoders[0].run(input_)
+        srd.stop_decoders(decoders, output)
+        return {"edges": decoders[0].edges, "puts": output.items}
+
+    return run
+
+
+def wait_edges(path, device, samples):
+    """Wait for every edge on channel 0 from a decoder."""
+    return _wait_edges(path, ())
+
+
+def wait_edges_logic(path, device, samples):
+    """Wait for every edge on channel 0 while an output takes the logic data."""
+    return _wait_edges(path, ("logic",))
+
+
+def decode_uart(path, device, samples):
+    """Decode the UART waveform into annotations."""
+
+    def run():
+        output = CountingOutput(())
+        srd.run_decoders(SrZipInput(path), output, [_decoder(ToyUart, rx=0)])
+        return {"annotations": output.items}
+
+    return run
+
+
+def decode_stack(path, device, samples):
+    """Decode the UART waveform with a decoder stacked on top."""
+
+    def run():
+        output = CountingOutput(())
+        srd.run_decoders(
+            SrZipInput(path),
+            output,
+            [_decoder(ToyUart, rx=0), _decoder(ByteCounter)],
+            annotations={"bytes": None},
+        )
+        return {"annotations": output.items}
+
+    return run
+
+
+# Condition lists that decoders commonly pass to wait().
+CONDITIONS = (
+    [{0: "r"}],
+    [{0: "f"}, {1: "h"}],
+    [{0: "e", 1: "l"}, {2: "s"}, {3: "r"}],
+)
+
+
+def cond_matches(path, device, samples):
+    """Check each wait() condition against samples pairs of 4-bit sample values."""
+    pairs = list(itertools.product(range(16), repeat=2))
+    pairs = (pairs * (samples // len(pairs) + 1))[:samples]
+
+    def run():
+        matches = 0
+        for conds in CONDITIONS:
+            for cond in conds:
+                for last_sample, current_sample in pairs:
+                    matches += srd.cond_matches(cond, last_sample, current_sample)
+        return {"matches": matches}
+
+    return run
+
+
+# name: (function, waveforms it runs on or None when it needs no capture)
+BENCHMARKS = {
+    "srzip_write": (srzip_write, ("uart", "spi", "i2c", "idle", "toggle", "analog")),
+    "srzip_read": (srzip_read, ("uart", "spi", "i2c", "idle", "toggle", "busy")),
+    "srzip_read_analog": (srzip_read_analog, ("analog",)),
+    "bits_output": (bits_output, ("uart", "idle", "toggle")),
+    "wait_edges": (wait_edges, ("uart", "spi", "i2c", "idle", "toggle", "busy")),
+    "wait_edges_logic": (wait_edges_logic, ("uart", "idle", "busy")),
+    "decode_uart": (decode_uart, ("uart",)),
+    "decode_stack": (decode_stack, ("uart",)),
+    "cond_matches": (cond_matches, None),
+}
+
+
+def run_benchmark(name, path, device, samples, repeat=3):
+    """Run a benchmark repeat times and return its result with the best time."""
+    function, _ = BENCHMARKS[name]
+    run = function(path, device, samples)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        counters = run()
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best:
+            best = seconds
+    result = {
+        "benchmark": name,
+        "waveform": device.waveform if device is not None else None,
+        "unitsize": device.unitsize if device is not None else None,
+        "samples": samples,
+        "seconds": best,
+        "samples_per_second": samples / best if best else 0,
+        "repeat": repeat,
+    }
+    result.update(counters)
+    return result
@@ -8,6 +8,7 @@ if sys.version_info < (3, 10):
 else:
     from importlib.metadata import entry_points
 import functools
+import operator
 
 __version__ = "0.4.2"
 
@@ -48,6 +49,15 @@ DataType = typing.Union[
 ]
 
 
+def callback_filter(output_filter) -> typing.Optional[typing.FrozenSet[str]]:
+    """Normalize a callback's filter to None, for everything, or a set of names."""
+    if output_filter is None:
+        return None
+    if isinstance(output_filter, str):
+        output_filter = (output_filter,)
+    return frozenset(output_filter)
+
+
 def SR_KHZ(num):
     return num * 1000
 
@@ -59,6 +69,10 @@ def SR_MHZ(num):
 class Decoder:
     # __init__() won't get called by subclasses
 
+    _pins_of = None
+    # Replaced by add_callback(). Decoders without callbacks put nowhere.
+    _dispatch: typing.Dict[OutputType, typing.Any] = {}
+
     def register(self, output_type: OutputType, proto_id=None, meta=None) -> OutputType:
         """
         This function is used to register the output that will be generated by the
@@ -91,58 +105,129 @@ class Decoder:
         # print(output_type, output_filter, fun)
         if not hasattr(self, "callbacks"):
             self.callbacks = {}
+            self._dispatch = {}
 
         if output_type not in self.callbacks:
-            self.callbacks[output_type] = set()
-
-        if isinstance(output_filter, str):
-            output_filter = set((output_filter,))
-
-        self.callbacks[output_type].add((output_filter, fun))
+            self.callbacks[output_type] = []
+
+        output_filter = callback_filter(output_filter)
+        if (output_filter, fun) not in self.callbacks[output_type]:
+            self.callbacks[output_type].append((output_filter, fun))
+
+        # Work out once which callbacks want each annotation class or binary track.
+        callbacks = self.callbacks[output_type]
+        if output_type == OUTPUT_ANN:
+            classes = getattr(self, "annotations", ())
+        elif output_type == OUTPUT_BINARY:
+            classes = getattr(self, "binary", ())
+        else:
+            classes = ()
+        if all(output_filter is None for output_filter, _ in callbacks):
+            self._dispatch[output_type] = (False, tuple(cb for _, cb in callbacks))
+        else:
+            self._dispatch[output_type] = (
+                True,
+                [
+                    tuple(
+                        cb
+                        for output_filter, cb in callbacks
+                        if output_filter is None or cls[0] in output_filter
+                    )
+                    for cls in classes
+                ],
+            )
 
     def wait(self, conds=[]):
         assert hasattr(self, "input")
+        raw_data = self.input.wait(self._data_conditions(conds))
+        return self._decoder_pins(raw_data)
+
+    def _data_conditions(self, conds):
+        """Translate wait() conditions on decoder channels to the input's channels."""
         if isinstance(conds, dict):
             conds = [conds]
-        if self.one_to_one:
-            data_conds = conds
-        else:
-            data_conds = []
+        if not hasattr(self, "_wait_conditions"):
+            self._wait_conditions = {}
+        key = conditions_key(conds)
+        data_conds = self._wait_conditions.get(key)
+        if data_conds is None:
+            data_conds = Conditions()
             for cond in conds:
                 data_cond = {}
                 for k in cond:
-                    if k == "skip":
-                        data_cond["skip"] = cond[k]
+                    if k == "skip" or self.one_to_one:
+                        data_cond[k] = cond[k]
                     else:
                         data_cond[self.decoder_channel_to_data_channel[k]] = cond[k]
                 data_conds.append(data_cond)
-
-        raw_data = self.input.wait(data_conds)
-        data = [None] * (
-            len(type(self).channels) + len(getattr(type(self), "optional_channels", []))
+            data_conds.compiled = compile_conditions(data_conds)
+            if len(self._wait_conditions) >= _MAX_COMPILED_CONDITIONS:
+                self._wait_conditions.clear()
+            self._wait_conditions[key] = data_conds
+        if data_conds.compiled.skips and not getattr(
+            self.input, "uses_compiled_conditions", False
+        ):
+            # Older inputs count skips down in place so hand them fresh dicts.
+            skip_conds = Conditions(dict(cond) for cond in data_conds)
+            skip_conds.compiled = data_conds.compiled
+            data_conds = skip_conds
+        return data_conds
+
+    def _decoder_pins(self, raw_data):
+        """Pick the decoder's channels out of the pins returned by the input."""
+        if self._pins_of is None:
+            self._build_pin_getter()
+        # Inputs hand back the same tuple for the same sample value.
+        cached = self._pin_cache.get(id(raw_data))
+        if cached is not None and cached[0] is raw_data:
+            return cached[1]
+        data = self._pins_of(raw_data)
+        if type(raw_data) is tuple:
+            if len(self._pin_cache) >= _MAX_CACHED_PINS:
+                self._pin_cache.clear()
+            self._pin_cache[id(raw_data)] = (raw_data, data)
+        return data
+
+    def _build_pin_getter(self):
+        """Precompute how _decoder_pins() maps the input's pins to the decoder's."""
+        mapping = getattr(self, "decoder_channel_to_data_channel", {})
+        count = len(getattr(type(self), "channels", [])) + len(
+            getattr(type(self), "optional_channels", [])
         )
-        for decoder_channel in self.decoder_channel_to_data_channel:
-            data_channel = self.decoder_channel_to_data_channel[decoder_channel]
-            data[decoder_channel] = raw_data[data_channel]
-
-        return tuple(data)
+        # Holds the raw tuples too so that their ids stay unique.
+        self._pin_cache = {}
+        data_channels = [mapping.get(i) for i in range(count)]
+        if None in data_channels:
+            template = [None] * count
+            pairs = tuple(mapping.items())
+
+            def pins_of(raw_data):
+                data = template.copy()
+                for decoder_channel, data_channel in pairs:
+                    data[decoder_channel] = raw_data[data_channel]
+                return tuple(data)
+
+            self._pins_of = pins_of
+        elif data_channels == list(range(count)):
+            # Slicing a tuple to its own length returns the tuple itself.
+            self._pins_of = lambda raw_data: tuple(raw_data[:count])
+        elif count == 1:
+            getter = operator.itemgetter(data_channels[0])
+            self._pins_of = lambda raw_data: (getter(raw_data),)
+        else:
+            self._pins_of = operator.itemgetter(*data_channels)
 
     def put(
         self, startsample: int, endsample: int, output_id: OutputType, data: DataType
     ) -> None:
         # print(startsample, endsample, output_id, data)
-        if output_id not in self.callbacks:
+        dispatch = self._dispatch.get(output_id)
+        if dispatch is None:
             return
-        for output_filter, cb in self.callbacks[output_id]:
-            if output_filter is not None:
-                if output_id == OUTPUT_ANN:
-                    annotation = self.annotations[data[0]]
-                    if annotation[0] not in output_filter:
-                        continue
-                elif output_id == OUTPUT_BINARY:
-                    track = self.binary[data[0]]
-                    if track[0] != output_filter:
-                        continue
+        by_class, callbacks = dispatch
+        if by_class:
+            callbacks = callbacks[data[0]]
+        for cb in callbacks:
             cb(startsample, endsample, data)
 
     def set_channelnum(self, channelname: str, channelnum: int) -> None:
@@ -159,6 +244,7 @@ class Decoder:
                 self.decoder_channel_to_data_channel[i] = channelnum
                 self.one_to_one = self.one_to_one and i == channelnum
                 break
+        self._build_pin_getter()
 
     def has_channel(self, decoder_channel: int) -> bool:
         return decoder_channel in self.decoder_channel_to_data_channel
@@ -191,40 +277,154 @@ def get_decoder(decoder_id):
     )
 
 
+class Condition:
+    """A single wait() condition compiled down to bit masks.
+
+    Pin states map to masks over the sample word so that checking a sample is a
+    handful of integer operations instead of a walk over the condition dict.
+    """
+
+    __slots__ = (
+        "mask",
+        "level_mask",
+        "level_value",
+        "edge_mask",
+        "rising_mask",
+        "falling_mask",
+        "same_mask",
+        "skip",
+    )
+
+    def __init__(self, cond):
+        self.mask = 0
+        self.level_mask = 0
+        self.level_value = 0
+        self.edge_mask = 0
+        self.rising_mask = 0
+        self.falling_mask = 0
+        self.same_mask = 0
+        self.skip = cond.get("skip")
+        if self.skip is not None:
+            return
+        for channel in cond:
+            state = cond[channel]
+            bit = 1 << channel
+            self.mask |= bit
+            if state == "l":
+                self.level_mask |= bit
+            elif state == "h":
+                self.level_mask |= bit
+                self.level_value |= bit
+            elif state == "r":
+                self.edge_mask |= bit
+                self.rising_mask |= bit
+            elif state == "f":
+                self.edge_mask |= bit
+                self.falling_mask |= bit
+            elif state == "e":
+                self.edge_mask |= bit
+            elif state == "s":
+                self.same_mask |= bit
+
+    def matches(self, last_sample, current_sample):
+        if self.skip is not None:
+            return self.skip == 0
+        changed = last_sample ^ current_sample
+        return (
+            current_sample & self.level_mask == self.level_value
+            and changed & self.edge_mask == self.edge_mask
+            and current_sample & self.rising_mask == self.rising_mask
+            and current_sample & self.falling_mask == 0
+            and changed & self.same_mask == 0
+        )
+
+
+class ConditionSet:
+    """Compiled form of the list of conditions passed to a single wait() call."""
+
+    __slots__ = ("conditions", "skips", "pins", "steady", "mask")
+
+    def __init__(self, conds):
+        self.conditions = tuple(Condition(cond) for cond in conds)
+        # (index, skip count) for skip conditions
+        self.skips = tuple(
+            (i, cond.skip)
+            for i, cond in enumerate(self.conditions)
+            if cond.skip is not None
+        )
+        # (index, condition) for pin conditions
+        self.pins = tuple(
+            (i, cond) for i, cond in enumerate(self.conditions) if cond.skip is None
+        )
+        # Pin conditions that can hold without an edge.
+        self.steady = tuple(cond for _, cond in self.pins if cond.edge_mask == 0)
+        self.mask = 0
+        for _, cond in self.pins:
+            self.mask |= cond.mask
+
+
+class Conditions(list):
+    """List of wait() condition dicts that carries its compiled form along.
+
+    Inputs that understand compiled conditions use ``compiled`` directly and
+    others still see the plain list of dicts.
+    """
+
+    compiled: typing.Optional[ConditionSet] = None
+
+
+_MAX_COMPILED_CONDITIONS = 1024
+_MAX_CACHED_PINS = 1024
+_compiled_conditions: typing.Dict[typing.Any, ConditionSet] = {}
+
+
+def conditions_key(conds):
+    return tuple(map(tuple, map(dict.items, conds)))
+
+
+def compile_conditions(conds) -> ConditionSet:
+    """Compile a list of wait() condition dicts, caching the result."""
+    compiled = getattr(conds, "compiled", None)
+    if compiled is not None:
+        return compiled
+    key = conditions_key(conds)
+    compiled = _compiled_conditions.get(key)
+    if compiled is None:
+        if len(_compiled_conditions) >= _MAX_COMPILED_CONDITIONS:
+            _compiled_conditions.clear()
+        compiled = ConditionSet(conds)
+        _compiled_conditions[key] = compiled
+    return compiled
+
+
 def cond_matches(cond, last_sample, current_sample):
-    matches = True
-    for channel in cond:
-        if channel == "skip":
-            return cond["skip"] == 0
-        state = cond[channel]
-        mask = 1 << channel
-        last_value = last_sample & mask
-        value = current_sample & mask
-        if (
-            (state == "l" and value != 0)
-            or (state == "h" and value == 0)
-            or (state == "r" and not (last_value == 0 and value != 0))
-            or (state == "f" and not (last_value != 0 and value == 0))
-            or (state == "e" and last_value == value)
-            or (state == "s" and last_value != value)
-        ):
-            matches = False
-            break
-    return matches
+    condition = compile_conditions((cond,)).conditions[0]
+    return condition.matches(last_sample, current_sample)
 
 
-def run_decoders(
+def start_decoders(
     input_,
     output,
     decoders=[],
     output_type=OUTPUT_ANN,
     output_filter=None,
     annotations=None,
+    stats=None,
 ):
+    """Create, connect and start the decoder stack. Returns the decoder instances.
+
+    The first decoder still needs to be run over input_ and stop_decoders()
+    called once the input is done. stats is an optional stats.RunStats that
+    instruments the decoders and output.
+    """
+    if stats is not None:
+        stats.add_output(output)
     # When doing an annotation output, include data from the input file too.
-    if output_type == OUTPUT_ANN:
+    if output_type == OUTPUT_ANN and output.data_classes:
         input_.add_callback(
-            OUTPUT_PYTHON, None, functools.partial(output.output, input_)
+            OUTPUT_PYTHON,
+            tuple(output.data_classes),
+            functools.partial(output.output, input_),
         )
 
     all_decoders = []
@@ -238,6 +438,8 @@ def run_decoders(
         for decoder_id in decoder_info["pin_mapping"]:
             channelnum = decoder_info["pin_mapping"][decoder_id]
             decoder.set_channelnum(decoder_id, channelnum)
+        if stats is not None:
+            stats.add_decoder(decoder, decoder_info["id"])
 
         if next_decoder:
             decoder.add_callback(OUTPUT_PYTHON, output_filter, next_decoder.decode)
@@ -248,6 +450,7 @@ def run_decoders(
             if (
                 output_type == OUTPUT_ANN
                 and output_filter is None
+                and annotations is not None
                 and decoder_info["id"] in annotations
             ):
                 output_filter = annotations[decoder_info["id"]]
@@ -257,10 +460,6 @@ def run_decoders(
         next_decoder = decoder
         output_filter = None
 
-    if all_decoders:
-        first_decoder = all_decoders[0]
-    else:
-        first_decoder = output
     for d in all_decoders:
         d.reset()
     output.reset()
@@ -273,9 +472,37 @@ def run_decoders(
     output.start()
     for d in all_decoders:
         d.start()
+    return all_decoders
 
-    first_decoder.run(input_)
 
+def stop_decoders(all_decoders, output):
     for d in all_decoders:
         d.stop()
     output.stop()
+
+
+def run_decoders(
+    input_,
+    output,
+    decoders=[],
+    output_type=OUTPUT_ANN,
+    output_filter=None,
+    annotations=None,
+    stats=None,
+):
+    """Decode all of input_ into output.
+
+    Pass a stats.RunStats as stats to collect statistics about the run.
+    """
+    all_decoders = start_decoders(
+        input_, output, decoders, output_type, output_filter, annotations, stats
+    )
+    if all_decoders:
+        first_decoder = all_decoders[0]
+    else:
+        first_decoder = output
+    if stats is not None:
+        stats.run(input_, functools.partial(first_decoder.run, input_))
+    else:
+        first_decoder.run(input_)
+    stop_decoders(all_decoders, output)
@@ -0,0 +1,183 @@
+"""asyncio front-end for decoding streams of samples.
+
+A DecodePipeline wraps a DecoderSession. feed() and close() run the decoders on
+the event loop's executor so the loop stays free to serve other streams while
+blocks are decoded. The records come out of the pipeline as an async iterator:
+
+    pipeline = DecodePipeline(decoders, ["D0", "D1"], samplerate=1000000)
+
+    async def produce():
+        async for block in reader:
+            await pipeline.feed(block)
+        await pipeline.close()
+
+    asyncio.ensure_future(produce())
+    async for record in pipeline:
+        ...
+
+decode_stream() does both for an async iterable of blocks. A pipeline that
+won't be closed, for example because its consumer went away, must be aborted to
+release its decoder thread.
+"""
+import asyncio
+import functools
+
+from . import OUTPUT_ANN
+from .stream import DecoderSession
+
+# Marks the end of the records in a pipeline's queue.
+_END = object()
+
+
+class _Failed:
+    def __init__(self, error):
+        self.error = error
+
+
+class DecodePipeline:
+    """Decode blocks fed from a coroutine and iterate over the records.
+
+    Create it from a coroutine running on the loop that will use it.
+    max_records bounds the records waiting to be iterated over. feed() waits
+    for room once it is reached. executor defaults to the loop's default
+    executor. A feed() that is cancelled loses the records of its block.
+    """
+
+    def __init__(
+        self,
+        decoders,
+        logic_channels,
+        *,
+        samplerate=0,
+        output_type=OUTPUT_ANN,
+        annotations=None,
+        initial_state=None,
+        executor=None,
+        max_records=0,
+    ):
+        self._session_args = (decoders, logic_channels)
+        self._session_kwargs = {
+            "samplerate": samplerate,
+            "output_type": output_type,
+            "annotations": annotations,
+            "initial_state": initial_state,
+        }
+        self._session = None
+        self._executor = executor
+        self._records = asyncio.Queue(max_records)
+        # Blocks must reach the session in order, one at a time.
+        self._lock = asyncio.Lock()
+        self.closed = False
+
+    async def _call(self, function, *args):
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self._executor, functools.partial(function, *args)
+        )
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # The session can't take another call until this one is done.
+            await asyncio.wait([future])
+            raise
+
+    async def _run(self, method, *args):
+        async with self._lock:
+            try:
+                if self._session is None:
+                    self._session = await self._call(
+                        functools.partial(
+                            DecoderSession, *self._session_args, **self._session_kwargs
+                        )
+                    )
+                records = await self._call(getattr(self._session, method), *args)
+            except Exception as e:
+                self.closed = True
+                await self._records.put(_Failed(e))
+                raise
+            for record in records:
+                await self._records.put(record)
+
+    async def feed(self, block):
+        """Decode a block of samples. The records are queued for iteration."""
+        if self.closed:
+            raise ValueError("Can't feed a closed pipeline.")
+        await self._run("feed", block)
+
+    async def close(self):
+        """End the stream. Iteration stops after the remaining records."""
+        if self.closed:
+            return
+        self.closed = True
+        await self._run("close")
+        await self._records.put(_END)
+
+    async def abort(self):
+        """Abandon the stream without decoding the rest of it.
+
+        Releases the session's decoder thread. Iterating over the records
+        doesn't end unless an error or the end was already queued.
+        """
+        self.closed = True
+        async with self._lock:
+            if self._session is not None:
+                await self._call(self._session.abort)
+
+    async def feed_from(self, blocks):
+        """Feed every block of an async iterable and close the pipeline.
+
+        When blocks raises, the pipeline is aborted and iterating over the
+        records raises the same error after the records before it.
+        """
+        try:
+            async for block in blocks:
+                await self.feed(block)
+        except Exception as e:
+            # Errors from the decoders are already queued.
+            if not self.closed:
+                self.closed = True
+                await self._records.put(_Failed(e))
+            await self.abort()
+            raise
+        await self.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        record = await self._records.get()
+        if record is _END:
+            # Let other iterators stop too.
+            self._records.put_nowait(_END)
+            raise StopAsyncIteration
+        if isinstance(record, _Failed):
+            self._records.put_nowait(record)
+            raise record.error
+        return record
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+async def decode_stream(blocks, decoders, logic_channels, **kwargs):
+    """Decode an async iterable of sample blocks and yield the records.
+
+    Stopping early abandons the stream and releases its decoder thread.
+    """
+    pipeline = DecodePipeline(decoders, logic_channels, **kwargs)
+    feeder = asyncio.ensure_future(pipeline.feed_from(blocks))
+    try:
+        async for record in pipeline:
+            yield record
+        await feeder
+    finally:
+        if not feeder.done():
+            feeder.cancel()
+        await asyncio.wait([feeder])
+        if not feeder.cancelled():
+            # The iterator raised the error already.
+            feeder.exception()
+        await pipeline.abort()
@@ -0,0 +1,180 @@
+"""Decode many capture files on a pool of worker processes.
+
+The manifest has one JSON object per line describing a job:
+
+    {"input": "a.sr", "decoders": "uart:rx=D0", "output": "a.txt",
+     "output_format": "bits"}
+
+"input" and "output" are required. "input_format", "output_format",
+"decoders" and "annotations" take the same values as pysigrok-cli's -I, -O,
+-P and -A. "binary": true outputs raw binary data like -B. Workers are started
+once and load the decoders the manifest uses once, so each job only pays for
+its own decoding.
+
+A JSON report line is written for every job as it finishes.
+"""
+import click
+import concurrent.futures
+import json
+import os
+import sys
+import time
+import traceback
+
+from . import run_decoders, OUTPUT_ANN, OUTPUT_BINARY
+
+
+def _load_plugins(decoder_ids):
+    """Load the decoders used by the jobs in a worker before its first job."""
+    from .cli import decoder_classes
+
+    for decoder_id in decoder_ids:
+        try:
+            decoder_classes[decoder_id]
+        except KeyError:
+            # Reported by the jobs that use it.
+            pass
+
+
+def _decoder_ids(jobs):
+    decoder_ids = set()
+    for job in jobs:
+        for pd in (job.get("decoders") or "").split(","):
+            if pd:
+                decoder_ids.add(pd.split(":", maxsplit=1)[0])
+    return sorted(decoder_ids)
+
+
+def run_job(job):
+    """Run a single manifest job in this process."""
+    from .cli import (
+        BinaryOutput,
+        input_classes,
+        output_classes,
+        parse_annotations,
+        parse_decoders,
+        parse_format,
+    )
+
+    input_format, input_options = parse_format(job.get("input_format", "srzip"))
+    driver = input_classes[input_format](job["input"], **input_options)
+    try:
+        decoders = parse_decoders(job.get("decoders"), driver.logic_channels)
+        annotations = parse_annotations(job.get("annotations"))
+        if job.get("binary"):
+            output_class = BinaryOutput
+            output_options = {}
+            output_type = OUTPUT_BINARY
+        else:
+            output_format_id, output_options = parse_format(
+                job.get("output_format", "srzip")
+            )
+            output_class = output_classes[output_format_id]
+            output_type = OUTPUT_ANN
+
+        # Output is written next to its final name and only moved there once the
+        # job succeeds, so failed jobs leave no partial files behind.
+        tmp = f"{job['output']}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                output = output_class(
+                    f,
+                    driver,
+                    logic_channels=driver.logic_channels,
+                    analog_channels=driver.analog_channels,
+                    decoders=decoders,
+                    **output_options,
+                )
+                run_decoders(
+                    driver,
+                    output,
+                    decoders,
+                    output_type=output_type,
+                    annotations=annotations,
+                )
+            os.replace(tmp, job["output"])
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+    finally:
+        driver.close()
+
+
+def _timed_job(job):
+    start = time.perf_counter()
+    try:
+        run_job(job)
+    except Exception as e:
+        return {
+            "status": "error",
+            "seconds": time.perf_counter() - start,
+            "error": f"{type(e).__name__}: {e}",
+            "traceback": traceback.format_exc(),
+        }
+    return {"status": "ok", "seconds": time.perf_counter() - start}
+
+
+def read_manifest(manifest):
+    """Return the jobs in an open manifest file, skipping blank lines."""
+    jobs = []
+    for line in manifest:
+        line = line.strip()
+        if line:
+            jobs.append(json.loads(line))
+    return jobs
+
+
+def run_batch(jobs, workers=None, report=None):
+    """Run jobs on a process pool and return their reports in manifest order.
+
+    report is called with each report as soon as its job finishes.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    reports = [None] * len(jobs)
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_load_plugins,
+        initargs=(_decoder_ids(jobs),),
+    ) as executor:
+        futures = {
+            executor.submit(_timed_job, job): index for index, job in enumerate(jobs)
+        }
+        for future in concurrent.futures.as_completed(futures):
+            index = futures[future]
+            result = {"job": index, "input": jobs[index].get("input")}
+            result["output"] = jobs[index].get("output")
+            result.update(future.result())
+            reports[index] = result
+            if report is not None:
+                report(result)
+    return reports
+
+
+@click.command()
+@click.argument("manifest", type=click.File("r"))
+@click.option("-j", "--jobs", "workers", type=int, help="Number of worker processes")
+@click.option(
+    "-r",
+    "--report",
+    type=click.File("w"),
+    default="-",
+    help="File to write the JSON lines report to",
+)
+def main(manifest, workers, report):
+    def write_report(result):
+        report.write(json.dumps(result) + "\n")
+        report.flush()
+
+    start = time.perf_counter()
+    reports = run_batch(read_manifest(manifest), workers, write_report)
+    failed = sum(1 for r in reports if r["status"] != "ok")
+    print(
+        f"{len(reports)} jobs, {failed} failed in {time.perf_counter() - start:.2f}s",
+        file=sys.stderr,
+    )
+    if failed:
+        sys.exit(1)
@@ -1,11 +1,24 @@
 from .output import Output
+from .runs import LogicRuns
 
-import io
+# Rendered text is collected and written to the file in blocks of this size.
+BUFFER_SIZE = 1 << 20
+
+# bytes.translate() tables from a byte to the ASCII digit of each of its bits.
+_BIT_DIGITS = [
+    bytes(0x31 if (value >> bit) & 0x1 else 0x30 for value in range(256))
+    for bit in range(8)
+]
+_BYTES = [bytes((value,)) for value in range(256)]
+
+# Upper bound on the number of cached renderings of lines with a single value.
+_MAX_STEADY_LINES = 256
 
 
 class BitsOutput(Output):
     name = "bits"
     desc = "ASCII rendering with 0/1"
+    data_classes = ("logic",)
 
     def __init__(
         self,
@@ -16,13 +29,102 @@ class BitsOutput(Output):
         decoders=[],
         *,
         width="64",
+        flush="auto",
     ):
         self.width = int(width)
         self.logic_channels = logic_channels
-        self.lines = [[c, ":"] for c in self.logic_channels]
         self.decoders = decoders
+        if decoders:
+            # Logic isn't printed when decoding so don't ask the input for it.
+            self.data_classes = ()
         self.samplenum = 0
-        self.openfile = io.TextIOWrapper(openfile)
+        self.openfile = openfile
+        self._buffer = bytearray()
+        # Whether decoded annotations are written out as soon as they are put.
+        # By default they are when the output is a terminal.
+        if flush == "auto":
+            isatty = getattr(openfile, "isatty", None)
+            self._flush_annotations = isatty is not None and isatty()
+        else:
+            self._flush_annotations = str(flush).lower() in ("true", "1", "yes")
+        self._prefixes = [(name + ":").encode("utf-8") for name in logic_channels]
+        # Logic runs that haven't been rendered yet. They start at samplenum.
+        self._runs = LogicRuns()
+        self._line_end = self.width
+        self._steady_lines = {}
+
+    def _write(self, data):
+        self._buffer += data
+        if len(self._buffer) >= BUFFER_SIZE:
+            self.openfile.write(self._buffer)
+            self._buffer.clear()
+
+    def _flush(self):
+        self.openfile.write(self._buffer)
+        self._buffer.clear()
+        self.openfile.flush()
+
+    def _render_line(self, runs):
+        """Render runs that fit on a single line starting at self.samplenum."""
+        samples = runs.samples
+        # Lines within a long idle stretch are all the same.
+        steady = len(runs.values) == 1 and self.samplenum % 8 == 0
+        if steady:
+            key = (runs.values[0], samples)
+            rendered = self._steady_lines.get(key)
+            if rendered is not None:
+                self._write(rendered)
+                self.samplenum += samples
+                return
+
+        # Expand each byte of the samples once and pick the bits of every channel
+        # out of it with translate().
+        lanes = {}
+        channel_bits = []
+        for bit in range(len(self.logic_channels)):
+            shift = bit & ~0x7
+            lane = lanes.get(shift)
+            if lane is None:
+                lane = b"".join(
+                    [_BYTES[(value >> shift) & 0xFF] * n for value, n in runs]
+                )
+                lanes[shift] = lane
+            channel_bits.append(lane.translate(_BIT_DIGITS[bit & 0x7]))
+
+        # Group the bits in bytes of the absolute sample number.
+        lines = []
+        if self.samplenum % 8 == 0 and samples % 8 == 0:
+            # Every line is made of whole bytes so group all of them at once.
+            bits = b"".join(channel_bits)
+            groups = len(bits) // 8
+            grouped = bytearray(9 * groups)
+            grouped[8::9] = b" " * groups
+            for i in range(8):
+                grouped[i::9] = bits[i::8]
+            line_length = 9 * (samples // 8)
+            for i, prefix in enumerate(self._prefixes):
+                lines.append(prefix)
+                lines.append(grouped[i * line_length : (i + 1) * line_length])
+                lines.append(b"\n")
+        else:
+            for prefix, bits in zip(self._prefixes, channel_bits):
+                lines.append(prefix)
+                start = 0
+                end = 8 - self.samplenum % 8
+                while end <= len(bits):
+                    lines.append(bits[start:end] + b" ")
+                    start = end
+                    end += 8
+                lines.append(bits[start:] + b"\n")
+        if not self._prefixes:
+            lines.append(b"\n")
+        rendered = b"".join(lines)
+        if steady:
+            if len(self._steady_lines) >= _MAX_STEADY_LINES:
+                self._steady_lines.clear()
+            self._steady_lines[key] = rendered
+        self._write(rendered)
+        self.samplenum += samples
 
     def output(self, source, startsample: int, endsample: int, data):
         ptype = data[0]
@@ -30,34 +132,29 @@ class BitsOutput(Output):
             if self.decoders:
                 # Don't print logic when using a decoder
                 return
-            values = []
-            for b in range(len(self.logic_channels)):
-                if data[1] & (1 << b) != 0:
-                    values.append("1")
-                else:
-                    values.append("0")
-            for s in range(startsample, endsample):
-                if s % self.width == 0:
-                    if s > 1:
-                        print(
-                            "\n".join(("".join(line) for line in self.lines)),
-                            file=self.openfile,
-                        )
-                    self.lines = [[c, ":"] for c in self.logic_channels]
-                for bit in range(len(self.logic_channels)):
-                    self.lines[bit].append(values[bit])
-                if s % 8 == 7:
-                    for bit in range(len(self.logic_channels)):
-                        self.lines[bit].append(" ")
+            pending = self._runs
+            if not pending:
+                self.samplenum = startsample
+                self._line_end = (startsample // self.width + 1) * self.width
+            if isinstance(data[1], LogicRuns):
+                pending.extend(data[1])
+            else:
+                pending.append(data[1], endsample - startsample)
+            # Only print a full line once the next one has started.
+            while self.samplenum + pending.samples > self._line_end:
+                self._render_line(pending.take(self._line_end - self.samplenum))
+                self._line_end += self.width
         elif ptype == "analog":
             # print(data)
             pass
         else:
             # annotation
             if data[1] is not None:
-                print(data[1][0], file=self.openfile)
-            pass
+                self._write((str(data[1][0]) + "\n").encode("utf-8"))
+                if self._flush_annotations:
+                    self._flush()
 
     def stop(self):
         if not self.decoders:
-            print("\n".join(("".join(line) for line in self.lines)), file=self.openfile)
+            self._render_line(self._runs.take(self._runs.samples))
+        self._flush()
@@ -1,39 +1,21 @@
 import click
+import json
 import pathlib
-from serial.tools import list_ports
 import sys
 
 from . import run_decoders, OUTPUT_BINARY, OUTPUT_ANN
 from .output import Output
+from .live import LiveCapture, DEFAULT_BUFFER_SAMPLES, OVERFLOW_POLICIES
+from .parallel import run_decoders_parallel, DEFAULT_OVERLAP
+from .plugins import PluginRegistry
+from .srzip import SrZipInput
+from .stats import RunStats
 
-if sys.version_info < (3, 10):
-    from importlib_metadata import entry_points
-else:
-    from importlib.metadata import entry_points
-
-drivers = entry_points(group="pysigrok.hardware")
-driver_classes = {}
-for hw in drivers:
-    loaded = hw.load()
-    driver_classes[loaded.name] = loaded
-
-input_formats = entry_points(group="pysigrok.input_format")
-input_classes = {}
-for f in input_formats:
-    loaded = f.load()
-    input_classes[loaded.name] = loaded
-
-output_formats = entry_points(group="pysigrok.output_format")
-output_classes = {}
-for f in output_formats:
-    loaded = f.load()
-    output_classes[loaded.name] = loaded
-
-decoders = entry_points(group="pysigrok.decoders")
-decoder_classes = {}
-for decoder in decoders:
-    loaded = decoder.load()
-    decoder_classes[loaded.id] = loaded
+# Plugins are only imported when they are used.
+driver_classes = PluginRegistry("pysigrok.hardware", "name")
+input_classes = PluginRegistry("pysigrok.input_format", "name")
+output_classes = PluginRegistry("pysigrok.output_format", "name")
+decoder_classes = PluginRegistry("pysigrok.decoders", "id")
 
 
 class BinaryOutput(Output):
@@ -53,6 +35,108 @@ class BinaryOutput(Output):
         self.openfile.write(data[1])
 
 
+def parse_format(spec):
+    """Split a format such as "bits:width=64" into its id and options.
+
+    Options without a value are set to "true".
+    """
+    format_id, *unparsed_options = spec.split(":")
+    options = {}
+    for option in unparsed_options:
+        if "=" in option:
+            k, v = option.split("=", maxsplit=1)
+            options[k] = v
+        else:
+            options[option] = "true"
+    return format_id, options
+
+
+def parse_decoders(protocol_decoders, logic_channels):
+    """Parse a comma separated decoder stack into the list run_decoders() takes."""
+    if not protocol_decoders:
+        protocol_decoders = []
+    elif "," not in protocol_decoders:
+        protocol_decoders = [protocol_decoders]
+    else:
+        protocol_decoders = protocol_decoders.split(",")
+    decoders = []
+    for pd in protocol_decoders:
+        if ":" in pd:
+            pd_id, unparsed_options = pd.split(":", maxsplit=1)
+        else:
+            pd_id = pd
+            unparsed_options = ""
+
+        pd_class = decoder_classes[pd_id]
+        # Make sure the protocol decoder has at least one annotation row for all
+        # of the annotations.
+        if not hasattr(pd_class, "annotation_rows") and hasattr(
+            pd_class, "annotations"
+        ):
+            pd_class.annotation_rows = (
+                ("all", "All", tuple(range(len(pd_class.annotations)))),
+            )
+        options = {}
+        for default_option in pd_class.options:
+            options[default_option["id"]] = default_option["default"]
+
+        pin_mapping = {}
+        for unparsed_option in unparsed_options.split(":"):
+            if "=" in unparsed_option:
+                k, v = unparsed_option.split("=")
+            else:
+                k = unparsed_option
+                v = "true"
+
+            if k in options:
+                if isinstance(options[k], int):
+                    v = int(v)
+                options[k] = v
+            else:
+                for channel in getattr(pd_class, "channels", tuple()) + getattr(
+                    pd_class, "optional_channels", tuple()
+                ):
+                    if channel["id"] == k:
+                        try:
+                            channelnum = int(v)
+                        except ValueError:
+                            channelnum = logic_channels.index(v)
+                        pin_mapping[k] = channelnum
+
+        # Assume one to one mapping when required channels are omitted.
+        for i, channel in enumerate(getattr(pd_class, "channels", tuple())):
+            if channel["id"] not in pin_mapping:
+                pin_mapping[channel["id"]] = i
+
+        decoders.append(
+            {
+                "id": pd_id,
+                "cls": pd_class,
+                "options": options,
+                "pin_mapping": pin_mapping,
+            }
+        )
+    return decoders
+
+
+def parse_annotations(protocol_decoder_annotations):
+    """Parse the annotations to output. None is all annotations."""
+    annotations = None
+    if protocol_decoder_annotations:
+        annotations = {}
+        for decoder in protocol_decoder_annotations.split(","):
+            if "=" in decoder:
+                decoder, options = decoder.split("=")
+                annotations[decoder] = set(options.split(":"))
+            else:
+                annotations[decoder] = None  # Everything
+    return annotations
+
+
+def write_stats(stats_file, run_stats, **extra):
+    stats_file.write(json.dumps(dict(run_stats.to_dict(), **extra), indent=2) + "\n")
+
+
 @click.command()
 @click.option("--list-supported", "-L", is_flag=True, default=False)
 @click.option("--list-serial", is_flag=True, default=False)
@@ -84,7 +168,49 @@ class BinaryOutput(Output):
 @click.option("--time", "sample_time")
 @click.option("--samples", type=int)
 @click.option("--frames")
-@click.option("--continuous", is_flag=True)
+@click.option(
+    "--continuous",
+    is_flag=True,
+    help="Decode while the driver captures instead of after it is done",
+)
+@click.option(
+    "--buffer-samples",
+    type=int,
+    default=DEFAULT_BUFFER_SAMPLES,
+    show_default=True,
+    help="Samples buffered between the driver and decoders with --continuous",
+)
+@click.option(
+    "--overflow",
+    "overflow_policy",
+    type=click.Choice(OVERFLOW_POLICIES),
+    default="block",
+    show_default=True,
+    help="Whether a full --continuous buffer makes the driver wait or drops blocks",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=int,
+    help="Decode segments of an srzip input file on this many processes",
+)
+@click.option(
+    "--overlap",
+    type=int,
+    default=DEFAULT_OVERLAP,
+    show_default=True,
+    help="Samples decoded around each segment so decoders can resync",
+)
+@click.option("--start-sample", type=int, help="First sample to decode")
+@click.option("--end-sample", type=int, help="Sample to stop decoding before")
+@click.option("--start-time", type=float, help="Time in seconds to start decoding at")
+@click.option("--end-time", type=float, help="Time in seconds to stop decoding at")
+@click.option(
+    "--stats",
+    "stats_file",
+    type=click.File("w"),
+    help="File to write JSON statistics about the decoders and input to",
+)
 def main(
     list_supported,
     list_serial,
@@ -104,36 +230,45 @@ def main(
     samples,
     frames,
     continuous,
+    buffer_samples,
+    overflow_policy,
+    jobs,
+    overlap,
+    start_sample,
+    end_sample,
+    start_time,
+    end_time,
+    stats_file,
 ):
     if list_supported:
+        # Only read the plugins' metadata so that nothing gets imported.
         print("Supported hardware drivers:")
-        for driver_id in driver_classes:
-            driver_class = driver_classes[driver_id]
-            print(f"  {driver_id}\t{driver_class.longname}")
+        for driver_id, info in driver_classes.metadata().items():
+            print(f"  {driver_id}\t{info.get('longname', '')}")
         print()
         print("Supported input formats:")
-        for input_format_id in input_classes:
-            input_class = input_classes[input_format_id]
-            print(f"  {input_format_id}\t{input_class.desc}")
+        for input_format_id, info in input_classes.metadata().items():
+            print(f"  {input_format_id}\t{info.get('desc', '')}")
         print()
         print("Supported output formats:")
-        for output_format_id in output_classes:
-            output_class = output_classes[output_format_id]
-            print(f"  {output_format_id}\t{output_class.desc}")
+        for output_format_id, info in output_classes.metadata().items():
+            print(f"  {output_format_id}\t{info.get('desc', '')}")
         print()
         print("Supported transform modules:")
         print()
         print("Supported protocol decoders:")
-        for pd in decoder_classes:
-            decoder_class = decoder_classes[pd]
-            print(f"  {pd}\t{decoder_class.longname}")
+        for pd, info in decoder_classes.metadata().items():
+            print(f"  {pd}\t{info.get('longname', '')}")
         return
     elif list_serial:
+        from serial.tools import list_ports
+
         print("Available serial ports:")
         for port in list_ports.comports():
             print(" ", port)
         return
 
+    live_capture = None
     if driver:
         driver_options = {}
         if ":" in driver:
@@ -147,15 +282,10 @@ def main(
                 k, v = config.split("=", maxsplit=1)
                 driver_configs[k] = v
 
-        driver_class = None
-        for hw in drivers:
-            loaded = hw.load()
-            if loaded.name == driver:
-                driver_class = loaded
-
+        driver_class = driver_classes[driver]
         driver = driver_class(channels, **driver_options, **driver_configs)
 
-        if samples:
+        if samples or continuous:
             if not triggers:
                 triggers = []
             elif "," in triggers:
@@ -172,16 +302,16 @@ def main(
                 elif condition == "1":
                     condition = "h"
                 trigger_dict[pin] = condition
+        if continuous:
+            # Decode while capturing instead of acquiring everything first.
+            live_capture = LiveCapture(driver, buffer_samples, overflow_policy)
+            driver = live_capture.input
+        elif samples:
             # acquire data
             driver.acquire(samples, trigger_dict, not wait_trigger)
 
     elif input_file:
-        input_options = {}
-        if ":" in input_format:
-            input_format, options = input_format.split(":", maxsplit=1)
-            for option in options.split(":"):
-                k, v = option.split("=", maxsplit=1)
-                input_options[k] = v
+        input_format, input_options = parse_format(input_format)
         input_class = input_classes[input_format]
         driver = input_class(input_file, **input_options)
 
@@ -201,95 +331,23 @@ def main(
         output_class = BinaryOutput
         output_type = OUTPUT_BINARY
     else:
-        if ":" in output_format:
-            output_split = output_format.split(":")
-            output_format_id = output_split[0]
-            for option in output_split[1:]:
-                if "=" in option:
-                    k, v = option.split("=")
-                    output_options[k] = v
-                else:
-                    output_options[option] = "true"
-        else:
-            output_format_id = output_format
-
+        output_format_id, output_options = parse_format(output_format)
         output_class = output_classes[output_format_id]
         output_type = OUTPUT_ANN
 
-    if not protocol_decoders:
-        protocol_decoders = []
-    elif "," not in protocol_decoders:
-        protocol_decoders = [protocol_decoders]
-    else:
-        protocol_decoders = protocol_decoders.split(",")
-    decoders = []
-    for pd in protocol_decoders:
-        if ":" in pd:
-            pd_id, unparsed_options = pd.split(":", maxsplit=1)
-        else:
-            pd_id = pd
-            unparsed_options = ""
+    decoders = parse_decoders(protocol_decoders, driver.logic_channels)
+    annotations = parse_annotations(protocol_decoder_annotations)
 
-        pd_class = decoder_classes[pd_id]
-        # Make sure the protocol decoder has at least one annotation row for all
-        # of the annotations.
-        if not hasattr(pd_class, "annotation_rows") and hasattr(
-            pd_class, "annotations"
-        ):
-            pd_class.annotation_rows = (
-                ("all", "All", tuple(range(len(pd_class.annotations)))),
+    if start_time is not None:
+        start_sample = int(start_time * driver.samplerate)
+    if end_time is not None:
+        end_sample = int(end_time * driver.samplerate)
+    if start_sample is not None or end_sample is not None:
+        if not hasattr(driver, "seek") or jobs:
+            raise ValueError(
+                "Only decoding an input file without --jobs supports a sample range."
             )
-        options = {}
-        for default_option in pd_class.options:
-            options[default_option["id"]] = default_option["default"]
-
-        pin_mapping = {}
-        for unparsed_option in unparsed_options.split(":"):
-            if "=" in unparsed_option:
-                k, v = unparsed_option.split("=")
-            else:
-                k = unparsed_option
-                v = "true"
-
-            if k in options:
-                if isinstance(options[k], int):
-                    v = int(v)
-                options[k] = v
-            else:
-                for channel in getattr(pd_class, "channels", tuple()) + getattr(
-                    pd_class, "optional_channels", tuple()
-                ):
-                    if channel["id"] == k:
-                        try:
-                            channelnum = int(v)
-                        except ValueError:
-                            channelnum = driver.logic_channels.index(v)
-                        pin_mapping[k] = channelnum
-
-        # Assume one to one mapping when required channels are omitted.
-        for i, channel in enumerate(getattr(pd_class, "channels", tuple())):
-            if channel["id"] not in pin_mapping:
-                pin_mapping[channel["id"]] = i
-
-        decoders.append(
-            {
-                "id": pd_id,
-                "cls": pd_class,
-                "options": options,
-                "pin_mapping": pin_mapping,
-            }
-        )
-
-    # None is all annotations.
-    annotations = None
-    if protocol_decoder_annotations:
-        annotations = {}
-        for decoder in protocol_decoder_annotations.split(","):
-            if "=" in decoder:
-                decoder, options = decoder.split("=")
-                annotations[decoder] = set(options.split(":"))
-            else:
-                annotations[decoder] = None  # Everything
+        driver.seek(start_sample or 0, end_sample)
 
     output = output_class(
         f,
@@ -299,6 +357,55 @@ def main(
         decoders=decoders,
         **output_options,
     )
+    run_stats = RunStats() if stats_file else None
+    if live_capture is not None:
+        try:
+            live_capture.run(
+                output,
+                decoders,
+                output_type=output_type,
+                annotations=annotations,
+                samples=samples,
+                triggers=trigger_dict,
+                trigger_immediately=not wait_trigger,
+                stats=run_stats,
+            )
+        finally:
+            stats = live_capture.buffer.stats()
+            print(
+                f"Buffered {stats['received_samples']} samples, at most "
+                f"{stats['high_water_samples']} at once. The driver waited "
+                f"{stats['blocked']} times for {stats['blocked_seconds']:.3f}s and "
+                f"{stats['dropped_samples']} samples in {stats['dropped_blocks']} "
+                "blocks were dropped.",
+                file=sys.stderr,
+            )
+        if run_stats is not None:
+            write_stats(stats_file, run_stats, buffer=stats)
+        return
+    if jobs:
+        if not isinstance(driver, SrZipInput) or not decoders:
+            raise ValueError("--jobs needs an srzip input file and protocol decoders.")
+        if run_stats is not None:
+            raise ValueError("--stats can't be used with --jobs.")
+        run_decoders_parallel(
+            input_file,
+            output,
+            decoders,
+            output_type=output_type,
+            annotations=annotations,
+            input_options=input_options,
+            jobs=jobs,
+            overlap=overlap,
+        )
+        return
     run_decoders(
-        driver, output, decoders, output_type=output_type, annotations=annotations
+        driver,
+        output,
+        decoders,
+        output_type=output_type,
+        annotations=annotations,
+        stats=run_stats,
     )
+    if run_stats is not None:
+        write_stats(stats_file, run_stats)
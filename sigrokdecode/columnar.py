@@ -0,0 +1,219 @@
+"""Annotations stored as binary columns.
+
+The columnar output writes annotations in blocks of fixed width columns so
+they can be loaded straight into arrays without parsing text:
+
+    pysigrok-cli -i capture.sr -P uart:rx=D0 -O columnar -o capture.ann
+
+    annotations = read_annotations("capture.ann")
+    annotations.startsample  # array of the start sample of every annotation
+
+A file starts with MAGIC and the version. Blocks follow, each a kind byte, the
+little-endian 64-bit length of its payload and the payload:
+
+* DECODER_BLOCK: JSON describing the next decoder, its id, annotation classes
+  and annotation rows. Decoders are numbered in the order they appear.
+* TEXTS_BLOCK: JSON list of the next entries of the string table. An entry is
+  the list of strings of an annotation, longest first.
+* ANNOTATIONS_BLOCK: the number of annotations as a 32-bit integer followed by
+  one column after the other, see COLUMNS.
+"""
+import array
+import json
+import struct
+import sys
+
+from .output import Output
+from .srzip import little_endian
+
+MAGIC = b"PYSRANN"
+VERSION = 1
+
+DECODER_BLOCK = b"D"
+TEXTS_BLOCK = b"S"
+ANNOTATIONS_BLOCK = b"A"
+
+# Column name and array typecode, in the order they are stored. decoder and
+# text index the decoder and string tables. row is -1 for classes in no row.
+COLUMNS = (
+    ("startsample", "Q"),
+    ("endsample", "Q"),
+    ("decoder", "H"),
+    ("ann_class", "H"),
+    ("row", "h"),
+    ("text", "I"),
+)
+
+# Annotations buffered before they are written as a block.
+BLOCK_ANNOTATIONS = 1 << 16
+
+_BLOCK_HEADER = struct.Struct("<cQ")
+_COUNT = struct.Struct("<I")
+
+
+def _decoder_info(decoder):
+    """Describe a decoder instance for the decoder table."""
+    annotations = getattr(decoder, "annotations", ())
+    rows = getattr(decoder, "annotation_rows", ())
+    return {
+        "id": decoder.id,
+        "annotations": [list(annotation[:2]) for annotation in annotations],
+        "annotation_rows": [
+            [row_id, desc, list(classes)] for row_id, desc, classes in rows
+        ],
+    }
+
+
+class ColumnarOutput(Output):
+    """Writes decoder annotations into blocks of binary columns."""
+
+    name = "columnar"
+    desc = "annotations in binary columns"
+    # Only decoder output is written.
+    data_classes = ()
+
+    def __init__(
+        self,
+        openfile,
+        driver,
+        logic_channels=[],
+        analog_channels=[],
+        decoders=[],
+        *,
+        block=BLOCK_ANNOTATIONS,
+    ):
+        self.openfile = openfile
+        self._block = max(int(block), 1)
+        # Decoder number and row of each annotation class by decoder instance.
+        self._decoders = {}
+        self._texts = {}
+        self._new_texts = []
+        self._columns = [array.array(typecode) for _, typecode in COLUMNS]
+        self.openfile.write(MAGIC + bytes((VERSION,)))
+
+    def _write_block(self, kind, payload):
+        self.openfile.write(_BLOCK_HEADER.pack(kind, len(payload)))
+        self.openfile.write(payload)
+
+    def _add_decoder(self, source):
+        info = _decoder_info(source)
+        rows = [-1] * len(info["annotations"])
+        for row, (_, _, classes) in enumerate(info["annotation_rows"]):
+            for ann_class in classes:
+                rows[ann_class] = row
+        decoder = (len(self._decoders), rows)
+        self._decoders[source] = decoder
+        self._write_block(DECODER_BLOCK, json.dumps(info).encode("utf-8"))
+        return decoder
+
+    def output(self, source, startsample, endsample, data):
+        # Logic and analog data from the input.
+        if isinstance(data[0], str):
+            return
+        decoder = self._decoders.get(source)
+        if decoder is None:
+            decoder = self._add_decoder(source)
+        number, rows = decoder
+        ann_class = data[0]
+        texts = tuple(data[1])
+        text = self._texts.get(texts)
+        if text is None:
+            text = len(self._texts)
+            self._texts[texts] = text
+            self._new_texts.append(texts)
+        starts, ends, decoders, classes, row_column, text_column = self._columns
+        starts.append(startsample)
+        ends.append(endsample)
+        decoders.append(number)
+        classes.append(ann_class)
+        row_column.append(rows[ann_class])
+        text_column.append(text)
+        if len(starts) >= self._block:
+            self._flush()
+
+    def _flush(self):
+        if self._new_texts:
+            self._write_block(TEXTS_BLOCK, json.dumps(self._new_texts).encode("utf-8"))
+            self._new_texts = []
+        count = len(self._columns[0])
+        if not count:
+            return
+        payload = [_COUNT.pack(count)]
+        for column in self._columns:
+            payload.append(little_endian(column).tobytes())
+        self._write_block(ANNOTATIONS_BLOCK, b"".join(payload))
+        self._columns = [array.array(typecode) for _, typecode in COLUMNS]
+
+    def stop(self):
+        self._flush()
+        self.openfile.flush()
+
+
+class Annotations:
+    """Annotations read from a columnar file.
+
+    Each column of COLUMNS is an array attribute with one item per annotation.
+    decoders describes the decoders the decoder column indexes and texts holds
+    the string table the text column indexes.
+    """
+
+    def __init__(self):
+        for name, typecode in COLUMNS:
+            setattr(self, name, array.array(typecode))
+        self.decoders = []
+        self.texts = []
+
+    def __len__(self):
+        return len(self.startsample)
+
+    def __iter__(self):
+        """Yield (decoder id, startsample, endsample, class id, strings) tuples."""
+        for startsample, endsample, decoder, ann_class, text in zip(
+            self.startsample, self.endsample, self.decoder, self.ann_class, self.text
+        ):
+            info = self.decoders[decoder]
+            yield (
+                info["id"],
+                startsample,
+                endsample,
+                info["annotations"][ann_class][0],
+                self.texts[text],
+            )
+
+
+def read_annotations(file) -> Annotations:
+    """Read a columnar annotation file from a path or binary file object."""
+    if hasattr(file, "read"):
+        contents = file.read()
+    else:
+        with open(file, "rb") as f:
+            contents = f.read()
+    view = memoryview(contents)
+    header = len(MAGIC) + 1
+    if bytes(view[: len(MAGIC)]) != MAGIC:
+        raise ValueError("Not a columnar annotation file.")
+    if view[len(MAGIC)] != VERSION:
+        raise ValueError(f"Unsupported columnar file version {view[len(MAGIC)]}.")
+    annotations = Annotations()
+    columns = [getattr(annotations, name) for name, _ in COLUMNS]
+    position = header
+    while position < len(view):
+        kind, length = _BLOCK_HEADER.unpack_from(view, position)
+        position += _BLOCK_HEADER.size
+        payload = view[position : position + length]
+        position += length
+        if kind == DECODER_BLOCK:
+            annotations.decoders.append(json.loads(bytes(payload)))
+        elif kind == TEXTS_BLOCK:
+            annotations.texts.extend(tuple(t) for t in json.loads(bytes(payload)))
+        elif kind == ANNOTATIONS_BLOCK:
+            (count,) = _COUNT.unpack_from(payload)
+            offset = _COUNT.size
+            for column in columns:
+                end = offset + count * column.itemsize
+                column.frombytes(payload[offset:end])
+                offset = end
+    if sys.byteorder == "big":
+        for column in columns:
+            column.byteswap()
+    return annotations
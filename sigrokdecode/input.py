@@ -1,16 +1,90 @@
 """Super class for output formats that make them look like decoders."""
-from sigrokdecode import OutputType, DataType, OUTPUT_ANN, OUTPUT_BINARY
+from sigrokdecode import (
+    callback_filter,
+    OutputType,
+    DataType,
+    OUTPUT_ANN,
+    OUTPUT_BINARY,
+    OUTPUT_PYTHON,
+)
+
+# Data class of each OUTPUT_PYTHON event type. Outputs list the data classes they
+# consume and OUTPUT_PYTHON callbacks may be filtered by a collection of them.
+DATA_CLASSES = {"logic": "logic", "analog": "analog", "analog_block": "analog"}
+
+# The bits of every byte value, least significant first.
+_BYTE_BITS = [tuple((value >> bit) & 0x1 for bit in range(8)) for value in range(256)]
+
+# Upper bound on the number of cached bit tuples returned by wait().
+_MAX_BIT_TUPLES = 1 << 16
 
 
 class Input:
     def __init__(self):
         self.callbacks = {}
+        self._wanted = {}
+        # Callbacks to call by output type and then by data[0], filled on use.
+        self._dispatch = {}
+        # Pin tuples returned by wait() by sample value.
+        self._bit_tuples = {}
 
     def add_callback(self, output_type, output_filter, fun):
         if output_type not in self.callbacks:
-            self.callbacks[output_type] = set()
+            self.callbacks[output_type] = []
+
+        output_filter = callback_filter(output_filter)
+        if (output_filter, fun) not in self.callbacks[output_type]:
+            self.callbacks[output_type].append((output_filter, fun))
+        self._wanted = {}
+        self._dispatch[output_type] = {}
+
+    def _callbacks_for(self, output_id, key):
+        """Return the callbacks that want output_id data whose data[0] is key."""
+        if output_id == OUTPUT_ANN:
+            name = self.annotations[key][0]
+        elif output_id == OUTPUT_BINARY:
+            name = self.binary[key][0]
+        elif output_id == OUTPUT_PYTHON:
+            name = DATA_CLASSES.get(key, key)
+        else:
+            name = None
+        callbacks = tuple(
+            cb
+            for output_filter, cb in self.callbacks[output_id]
+            if output_filter is None or name is None or name in output_filter
+        )
+        self._dispatch[output_id][key] = callbacks
+        return callbacks
 
-        self.callbacks[output_type].add((output_filter, fun))
+    def _sample_bits(self, sample):
+        """Return the unitsize bytes of sample as a tuple of bits, LSB first."""
+        bits = self._bit_tuples.get(sample)
+        if bits is None:
+            bits = ()
+            for byte_index in range(self.unitsize):
+                bits += _BYTE_BITS[(sample >> (8 * byte_index)) & 0xFF]
+            if len(self._bit_tuples) >= _MAX_BIT_TUPLES:
+                self._bit_tuples.clear()
+            self._bit_tuples[sample] = bits
+        return bits
+
+    def close(self):
+        """Release the files and threads the input holds."""
+        pass
+
+    def wants(self, data_class: str) -> bool:
+        """Return whether any OUTPUT_PYTHON callback consumes data_class.
+
+        Inputs use this to skip producing data that nobody will receive.
+        """
+        wanted = self._wanted.get(data_class)
+        if wanted is None:
+            wanted = any(
+                output_filter is None or data_class in output_filter
+                for output_filter, _ in self.callbacks.get(OUTPUT_PYTHON, ())
+            )
+            self._wanted[data_class] = wanted
+        return wanted
 
     def put(
         self, startsample: int, endsample: int, output_id: OutputType, data: DataType
@@ -27,16 +101,11 @@ class Input:
         :return: None
         """
         # print(startsample, endsample, output_id, data)
-        if output_id not in self.callbacks:
+        dispatch = self._dispatch.get(output_id)
+        if dispatch is None:
             return
-        for output_filter, cb in self.callbacks[output_id]:
-            if output_filter is not None:
-                if output_id == OUTPUT_ANN:
-                    annotation = self.annotations[data[0]]
-                    if annotation[0] != output_filter:
-                        continue
-                elif output_id == OUTPUT_BINARY:
-                    track = self.binary[data[0]]
-                    if track[0] != output_filter:
-                        continue
+        callbacks = dispatch.get(data[0])
+        if callbacks is None:
+            callbacks = self._callbacks_for(output_id, data[0])
+        for cb in callbacks:
             cb(startsample, endsample, data)
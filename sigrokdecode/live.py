@@ -0,0 +1,206 @@
+"""Decode samples from a hardware driver while it is still capturing.
+
+Drivers that support this implement a streaming hook:
+
+    def stream(self, push, samples=None, triggers={}, trigger_immediately=True):
+        ...
+
+stream() captures like acquire() but hands each block of samples to push() as
+it arrives instead of keeping them. A block is a LogicRuns or a sequence of
+sample values. push() returns False once the consumer has stopped, after which
+the driver should return. samples=None captures until that happens.
+
+Blocks are held in a BlockBuffer of bounded size between the driver's thread
+and the decoders. Interrupting a capture run from the main thread, with Ctrl-C,
+ends it like the end of the stream: the driver is told to stop, the samples it
+already captured are decoded and the decoders and outputs are stopped as usual.
+A second interrupt raises KeyboardInterrupt.
+"""
+import collections
+import signal
+import threading
+import time
+
+from . import run_decoders, OUTPUT_ANN
+from .runs import LogicRuns
+from .stream import StreamInput
+
+# Default number of samples buffered between the driver and the decoders.
+DEFAULT_BUFFER_SAMPLES = 16 * 1024 * 1024
+
+OVERFLOW_POLICIES = ("block", "drop")
+
+
+def _block_samples(block):
+    if isinstance(block, LogicRuns):
+        return block.samples
+    return len(block)
+
+
+class BlockBuffer:
+    """Bounded queue of sample blocks that counts how often it fills up.
+
+    When full, put() makes the producer wait with the "block" policy and
+    discards the block with the "drop" policy. Dropped samples are not decoded
+    so the sample numbers after them shift.
+    """
+
+    def __init__(self, capacity=DEFAULT_BUFFER_SAMPLES, overflow="block"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                "Unknown overflow policy "
+                + overflow
+                + ". Use one of: "
+                + ", ".join(OVERFLOW_POLICIES)
+            )
+        self.capacity = capacity
+        self.overflow = overflow
+        self.closed = False
+        self._blocks = collections.deque()
+        self._samples = 0
+        self._condition = threading.Condition()
+        # Counters
+        self.received_samples = 0
+        self.blocked = 0
+        self.blocked_seconds = 0.0
+        self.dropped_blocks = 0
+        self.dropped_samples = 0
+        self.high_water = 0
+
+    def _full(self, samples):
+        # A block larger than the whole buffer is let through once it is empty.
+        return self._blocks and self._samples + samples > self.capacity
+
+    def put(self, block) -> bool:
+        """Queue block. Returns False once the buffer is closed."""
+        samples = _block_samples(block)
+        with self._condition:
+            if self.closed:
+                return False
+            self.received_samples += samples
+            if self._full(samples):
+                if self.overflow == "drop":
+                    self.dropped_blocks += 1
+                    self.dropped_samples += samples
+                    return True
+                self.blocked += 1
+                start = time.monotonic()
+                while self._full(samples) and not self.closed:
+                    self._condition.wait()
+                self.blocked_seconds += time.monotonic() - start
+                if self.closed:
+                    return False
+            self._blocks.append(block)
+            self._samples += samples
+            self.high_water = max(self.high_water, self._samples)
+            self._condition.notify_all()
+        return True
+
+    def get(self):
+        """Return the next block, waiting for one. None means the stream ended."""
+        with self._condition:
+            while not self._blocks and not self.closed:
+                self._condition.wait()
+            if not self._blocks:
+                return None
+            block = self._blocks.popleft()
+            self._samples -= _block_samples(block)
+            self._condition.notify_all()
+            return block
+
+    def close(self):
+        """End the stream. Queued blocks can still be read."""
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def stats(self):
+        return {
+            "received_samples": self.received_samples,
+            "blocked": self.blocked,
+            "blocked_seconds": self.blocked_seconds,
+            "dropped_blocks": self.dropped_blocks,
+            "dropped_samples": self.dropped_samples,
+            "high_water_samples": self.high_water,
+        }
+
+
+class LiveCapture:
+    """Run a decoder stack over a driver's stream() while it captures.
+
+    input is the StreamInput the decoders read. Pass it to outputs in place of
+    the driver.
+    """
+
+    def __init__(self, driver, buffer_samples=DEFAULT_BUFFER_SAMPLES, overflow="block"):
+        if not hasattr(driver, "stream"):
+            raise ValueError(f"{driver.name} doesn't support continuous capture.")
+        self.driver = driver
+        self.buffer = BlockBuffer(buffer_samples, overflow)
+        self.input = StreamInput(driver.logic_channels, driver.samplerate)
+        # Outputs such as srzip name the capture after its source.
+        self.input.name = driver.name
+        self.input.need_data = self._pull
+        self._error = None
+
+    def _pull(self):
+        block = self.buffer.get()
+        if block is None:
+            self.input.end()
+        else:
+            self.input.push(block)
+
+    def _interrupt(self, signum, frame):
+        """SIGINT handler that ends the capture instead of raising."""
+        signal.signal(signal.SIGINT, self._previous_handler)
+        self.buffer.close()
+
+    def _produce(self, samples, triggers, trigger_immediately):
+        try:
+            self.driver.stream(self.buffer.put, samples, triggers, trigger_immediately)
+        except BaseException as e:
+            self._error = e
+        finally:
+            self.buffer.close()
+
+    def run(
+        self,
+        output,
+        decoders=[],
+        output_type=OUTPUT_ANN,
+        annotations=None,
+        *,
+        samples=None,
+        triggers={},
+        trigger_immediately=True,
+        stats=None,
+    ):
+        producer = threading.Thread(
+            target=self._produce,
+            args=(samples, triggers, trigger_immediately),
+            name="pysigrok-capture",
+            daemon=True,
+        )
+        interruptible = threading.current_thread() is threading.main_thread()
+        if interruptible:
+            previous = signal.signal(signal.SIGINT, self._interrupt)
+            # None when the handler wasn't set from Python.
+            self._previous_handler = signal.SIG_DFL if previous is None else previous
+        producer.start()
+        try:
+            run_decoders(
+                self.input,
+                output,
+                decoders,
+                output_type=output_type,
+                annotations=annotations,
+                stats=stats,
+            )
+        finally:
+            # Tells the driver to stop when decoding ends early.
+            self.buffer.close()
+            producer.join()
+            if interruptible:
+                signal.signal(signal.SIGINT, self._previous_handler)
+        if self._error is not None:
+            raise self._error
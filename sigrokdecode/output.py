@@ -2,6 +2,10 @@
 
 
 class Output:
+    # Data classes of the input's OUTPUT_PYTHON events that output() handles.
+    # Inputs skip producing the classes that no output consumes.
+    data_classes = ("logic", "analog")
+
     def reset(self):
         pass
 
@@ -0,0 +1,132 @@
+"""Decode a single srzip capture in parallel by splitting it into segments.
+
+Each segment is decoded in its own process by a fresh decoder stack. Decoding
+starts overlap samples before the segment so that decoders can resync and runs
+overlap samples past its end so that frames crossing the boundary complete. A
+segment only keeps the output that starts within it. Every item is therefore
+produced once, by the segment that owns its start sample.
+"""
+import concurrent.futures
+import os
+
+from . import start_decoders, stop_decoders, OUTPUT_ANN
+from .output import Output
+from .srzip import SrZipInput
+
+# Samples decoded on each side of a segment to let decoders resync.
+DEFAULT_OVERLAP = 1024 * 1024
+
+
+class _SegmentOutput(Output):
+    """Collect decoder output that starts within [keep_start, keep_end)."""
+
+    data_classes = ()
+
+    def __init__(self, keep_start, keep_end):
+        # Stack position of each decoder instance. The same decoder class may
+        # appear more than once in a stack.
+        self.decoder_index = {}
+        self.keep_start = keep_start
+        self.keep_end = keep_end
+        self.items = []
+
+    def output(self, source, startsample, endsample, data):
+        if self.keep_start <= startsample < self.keep_end:
+            self.items.append(
+                (self.decoder_index[source], startsample, endsample, data)
+            )
+
+
+def _decode_segment(
+    input_file,
+    input_options,
+    decoders,
+    output_type,
+    annotations,
+    keep_start,
+    keep_end,
+    overlap,
+):
+    input_ = SrZipInput(input_file, **input_options)
+    try:
+        input_._seek(max(keep_start - overlap, 0), keep_end + overlap)
+        output = _SegmentOutput(keep_start, keep_end)
+        all_decoders = start_decoders(
+            input_, output, decoders, output_type=output_type, annotations=annotations
+        )
+        output.decoder_index = {decoder: i for i, decoder in enumerate(all_decoders)}
+        (all_decoders[0] if all_decoders else output).run(input_)
+        stop_decoders(all_decoders, output)
+    finally:
+        input_.close()
+    return output.items
+
+
+def segment_bounds(total_samples, segment_samples):
+    """Split total_samples into consecutive (start, end) ranges."""
+    return [
+        (start, min(start + segment_samples, total_samples))
+        for start in range(0, total_samples, segment_samples)
+    ]
+
+
+def run_decoders_parallel(
+    input_file,
+    output,
+    decoders=[],
+    output_type=OUTPUT_ANN,
+    annotations=None,
+    *,
+    input_options={},
+    jobs=None,
+    segment_samples=None,
+    overlap=DEFAULT_OVERLAP,
+):
+    """Decode the srzip capture input_file into output on a process pool.
+
+    This is the segmented version of run_decoders(). Decoder output is passed
+    to output segment by segment in sample order. Within a segment it keeps
+    the order the decoders produced it in. The input's own logic and analog
+    data is not passed to output.
+
+    The result matches a serial run when decoders resync within overlap
+    samples. Decoder classes and their options must be picklable.
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = max(int(jobs), 1)
+    overlap = int(overlap)
+    input_ = SrZipInput(input_file, **input_options)
+    try:
+        total_samples = sum(input_._logic_chunk_lengths())
+    finally:
+        input_.close()
+    if segment_samples is None:
+        # A few segments per job keeps the pool busy when segments vary in speed.
+        segment_samples = max(-(-total_samples // (jobs * 4)), 4 * overlap, 1)
+    segment_samples = int(segment_samples)
+
+    # Outputs tell decoders apart by their class so stand-ins will do as sources.
+    sources = [decoder_info["cls"]() for decoder_info in decoders]
+
+    output.reset()
+    output.start()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(
+                _decode_segment,
+                input_file,
+                input_options,
+                decoders,
+                output_type,
+                annotations,
+                start,
+                end,
+                overlap,
+            )
+            for start, end in segment_bounds(total_samples, segment_samples)
+        ]
+        for future in futures:
+            for index, startsample, endsample, data in future.result():
+                output.output(sources[index], startsample, endsample, data)
+    output.stop()
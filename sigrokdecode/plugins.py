@@ -0,0 +1,143 @@
+"""Registries of plugins that only import a plugin when it is used.
+
+Plugins are looked up by the id or name their class declares. The classes'
+metadata is cached on disk, keyed on the installed entry points and the
+versions of the distributions providing them, so listing plugins doesn't
+import any of them.
+"""
+import collections.abc
+import hashlib
+import json
+import os
+import pathlib
+import sys
+
+if sys.version_info < (3, 10):
+    from importlib_metadata import entry_points
+else:
+    from importlib.metadata import entry_points
+
+# Class attributes recorded in the metadata cache when a plugin has them.
+METADATA_ATTRIBUTES = (
+    "id",
+    "name",
+    "longname",
+    "desc",
+    "channels",
+    "optional_channels",
+    "options",
+    "annotations",
+)
+
+
+def cache_dir() -> pathlib.Path:
+    cache_home = os.environ.get("XDG_CACHE_HOME")
+    if not cache_home:
+        cache_home = os.path.join(os.path.expanduser("~"), ".cache")
+    return pathlib.Path(cache_home) / "pysigrok"
+
+
+def _distribution(entry_point):
+    dist = getattr(entry_point, "dist", None)
+    if dist is None:
+        return None, None
+    return dist.metadata["Name"], dist.version
+
+
+class PluginRegistry(collections.abc.Mapping):
+    """Map the key attribute of the plugin classes in an entry point group to them.
+
+    Classes are loaded on first access. Iterating and metadata() only read the
+    metadata cache, unless it is out of date.
+    """
+
+    def __init__(self, group: str, key: str):
+        self.group = group
+        self.key = key
+        self._entry_points = None
+        self._metadata = None
+        self._loaded = {}
+
+    @property
+    def entry_points(self):
+        if self._entry_points is None:
+            self._entry_points = list(entry_points(group=self.group))
+        return self._entry_points
+
+    def _fingerprint(self):
+        installed = sorted(
+            (ep.name, ep.value) + _distribution(ep) for ep in self.entry_points
+        )
+        return hashlib.sha1(json.dumps(installed).encode("utf-8")).hexdigest()
+
+    def _cache_path(self):
+        return cache_dir() / f"{self.group}.json"
+
+    def _read_cache(self, fingerprint):
+        try:
+            with open(self._cache_path()) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cached.get("fingerprint") != fingerprint:
+            return None
+        return cached.get("plugins")
+
+    def _write_cache(self, fingerprint, plugins):
+        path = self._cache_path()
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "w") as f:
+                json.dump({"fingerprint": fingerprint, "plugins": plugins}, f)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def _load(self, entry_point):
+        loaded = entry_point.load()
+        self._loaded[getattr(loaded, self.key)] = loaded
+        return loaded
+
+    def metadata(self):
+        """Return the metadata of every plugin by key, without importing them."""
+        if self._metadata is not None:
+            return self._metadata
+        fingerprint = self._fingerprint()
+        plugins = self._read_cache(fingerprint)
+        if plugins is None:
+            plugins = {}
+            for entry_point in self.entry_points:
+                loaded = self._load(entry_point)
+                info = {"entry_point": entry_point.name}
+                for attribute in METADATA_ATTRIBUTES:
+                    if hasattr(loaded, attribute):
+                        info[attribute] = getattr(loaded, attribute)
+                # Round trip so that the metadata matches what is read back.
+                info = json.loads(json.dumps(info, default=repr))
+                plugins[getattr(loaded, self.key)] = info
+            self._write_cache(fingerprint, plugins)
+        self._metadata = plugins
+        return plugins
+
+    def __getitem__(self, key):
+        if key in self._loaded:
+            return self._loaded[key]
+        # Plugins are usually registered under their own id so try that first.
+        for entry_point in self.entry_points:
+            if entry_point.name == key:
+                loaded = self._load(entry_point)
+                if getattr(loaded, self.key) == key:
+                    return loaded
+        info = self.metadata().get(key)
+        if info is not None and key not in self._loaded:
+            for entry_point in self.entry_points:
+                if entry_point.name == info["entry_point"]:
+                    self._load(entry_point)
+        return self._loaded[key]
+
+    def __iter__(self):
+        return iter(self.metadata())
+
+    def __len__(self):
+        return len(self.metadata())
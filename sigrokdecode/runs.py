@@ -0,0 +1,132 @@
+"""Run-length encoded logic samples."""
+import array
+import bisect
+import operator
+
+
+class LogicRuns:
+    """Logic samples stored as runs of (value, length).
+
+    Inputs put logic data one run at a time. Outputs collect those runs here so
+    the work they do is proportional to the number of transitions rather than
+    samples, and also accept a LogicRuns put as the value of a logic event.
+    """
+
+    def __init__(self, runs=()):
+        self.values = array.array("Q")
+        self.lengths = array.array("Q")
+        self.samples = 0
+        for value, length in runs:
+            self.append(value, length)
+
+    def __bool__(self):
+        return self.samples > 0
+
+    def __iter__(self):
+        return zip(self.values, self.lengths)
+
+    def __repr__(self):
+        return f"LogicRuns({list(self)!r})"
+
+    def append(self, value: int, length: int) -> None:
+        if length <= 0:
+            return
+        if self.values and self.values[-1] == value:
+            self.lengths[-1] += length
+        else:
+            self.values.append(value)
+            self.lengths.append(length)
+        self.samples += length
+
+    def extend(self, runs: "LogicRuns") -> None:
+        for value, length in runs:
+            self.append(value, length)
+
+    def take(self, count: int) -> "LogicRuns":
+        """Remove the first count samples and return them as new runs."""
+        taken = LogicRuns()
+        if count >= self.samples:
+            taken.values, self.values = self.values, taken.values
+            taken.lengths, self.lengths = self.lengths, taken.lengths
+            taken.samples, self.samples = self.samples, 0
+            return taken
+        i = 0
+        remaining = count
+        while remaining >= self.lengths[i]:
+            remaining -= self.lengths[i]
+            i += 1
+        taken.values = self.values[:i]
+        taken.lengths = self.lengths[:i]
+        taken.samples = count - remaining
+        if remaining:
+            taken.append(self.values[i], remaining)
+            self.lengths[i] -= remaining
+        del self.values[:i]
+        del self.lengths[:i]
+        self.samples -= count
+        return taken
+
+
+class LogicTransitions:
+    """Logic samples stored as the sample numbers at which the value changes.
+
+    Sparse signals take space proportional to their transitions and any sample
+    is found with a binary search. Samples cover start up to, but not
+    including, end.
+    """
+
+    def __init__(self, start: int = 0):
+        self.samplenums = array.array("Q")
+        self.values = array.array("Q")
+        self.start = start
+        self.end = start
+
+    def __len__(self):
+        return len(self.samplenums)
+
+    def __repr__(self):
+        transitions = list(zip(self.samplenums, self.values))
+        return f"LogicTransitions({transitions!r}, end={self.end})"
+
+    @property
+    def samples(self) -> int:
+        return self.end - self.start
+
+    def append(self, value: int, length: int) -> None:
+        if length <= 0:
+            return
+        if not self.values or self.values[-1] != value:
+            self.samplenums.append(self.end)
+            self.values.append(value)
+        self.end += length
+
+    def extend(self, runs: LogicRuns) -> None:
+        for value, length in runs:
+            self.append(value, length)
+
+    def find(self, samplenum: int) -> int:
+        """Return the index of the transition samplenum belongs to."""
+        return bisect.bisect_right(self.samplenums, samplenum) - 1
+
+    def value_at(self, samplenum: int) -> int:
+        return self.values[self.find(samplenum)]
+
+    def runs(self, start=None, end=None) -> LogicRuns:
+        """Return the samples from start up to end as runs."""
+        if start is None:
+            start = self.start
+        if end is None:
+            end = self.end
+        runs = LogicRuns()
+        if start >= end:
+            return runs
+        first = self.find(start)
+        last = self.find(end - 1) + 1
+        starts = self.samplenums[first:last]
+        starts[0] = start
+        ends = self.samplenums[first + 1 : last]
+        ends.append(end)
+        runs.values = self.values[first:last]
+        runs.lengths = array.array("Q", map(operator.sub, ends, starts))
+        runs.samples = end - start
+        return runs
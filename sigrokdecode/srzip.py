@@ -1,19 +1,39 @@
 import array
+import collections
+import concurrent.futures
 import zipfile
 import configparser
+import functools
+import mmap
+import re
 import struct
 import io
+import json
+import os
+import sys
 from os import PathLike
-from typing import Union
-from typing.io import IO
+from typing import IO, Union
 
 from .output import Output
 from .input import Input
+from .runs import LogicRuns
 
-from . import cond_matches, __version__, OUTPUT_PYTHON
+from . import compile_conditions, __version__, OUTPUT_PYTHON
 
 TYPECODE = {1: "B", 2: "H", 4: "L", 5: "Q"}
 
+
+def little_endian(values: array.array) -> array.array:
+    """Return values, or a byte swapped copy on big-endian machines.
+
+    Data in pysigrok's zip based formats is stored little-endian.
+    """
+    if sys.byteorder == "big":
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
 UNITS = {
     "Hz": 1,
     "kHz": 1000,
@@ -25,13 +45,148 @@ UNITS = {
 }
 
 
+def samplerate_string(samplerate) -> str:
+    """Format samplerate the way libsigrok writes it into metadata, like "1 MHz"."""
+    if not samplerate:
+        return "0"
+    if samplerate == int(samplerate):
+        samplerate = int(samplerate)
+        for units in ("GHz", "MHz", "kHz"):
+            if samplerate % UNITS[units] == 0:
+                return f"{samplerate // UNITS[units]} {units}"
+    return f"{samplerate} Hz"
+
+
+def parse_samplerate(samplerate: str):
+    """Parse a samplerate from metadata, like "1 MHz", "1MHz" or "1000000"."""
+    if " " in samplerate:
+        num, units = samplerate.split(" ")
+        return float(num) * UNITS[units]
+    # check for a suffix with Hz last
+    for suffix in reversed(UNITS):
+        if suffix in samplerate:
+            return int(samplerate[: -len(suffix)]) * UNITS[suffix]
+    # Older versions wrote the samplerate as a float, like "1000000.0".
+    return int(float(samplerate))
+
+
+# Summary of a logic chunk in the sidecar index. Values are raw samples as
+# stored in the file. Transitions and activity, the bits that change, only
+# cover changes between samples of the chunk.
+ChunkSummary = collections.namedtuple(
+    "ChunkSummary",
+    (
+        "first_sample",
+        "last_sample",
+        "first_value",
+        "last_value",
+        "transitions",
+        "activity",
+    ),
+)
+
+INDEX_VERSION = 1
+
+INDEX_OPTIONS = ("auto", "true", "false")
+
+
+def summarize_chunk(raw, typecode: str, first_sample: int) -> ChunkSummary:
+    """Summarize the raw little-endian samples of a logic chunk."""
+    stride = array.array(typecode).itemsize
+    first_value = int.from_bytes(raw[:stride], "little")
+    last_value = int.from_bytes(raw[-stride:], "little")
+    # XOR the chunk with itself shifted by a sample to get the changed bits.
+    changes = (
+        int.from_bytes(raw[:-stride], "little") ^ int.from_bytes(raw[stride:], "little")
+    ).to_bytes(len(raw) - stride, "little")
+    activity = 0
+    for lane in range(stride):
+        for value in set(changes[lane::stride]):
+            activity |= value << (8 * lane)
+    if stride == 1:
+        unchanged = changes.count(0)
+    else:
+        unchanged = array.array(typecode, changes).count(0)
+    samples = len(raw) // stride
+    return ChunkSummary(
+        first_sample,
+        first_sample + samples - 1,
+        first_value,
+        last_value,
+        samples - 1 - unchanged,
+        activity,
+    )
+
+
+def _option_flag(value) -> bool:
+    """Interpret a plugin option given on the command line as a boolean."""
+    return str(value).lower() in ("true", "1", "yes")
+
+
+# Searching for the next change only pays off when it can skip this many samples.
+MIN_SKIP = 8
+
+
+# Masked copies of the current chunk kept for the change search, one per mask.
+_MAX_MASKED_CHUNKS = 4
+
+
+@functools.lru_cache(maxsize=None)
+def _same_run(stride: int):
+    """Compile a pattern that matches a run of equal stride byte samples.
+
+    It is used on chunks with the bits that don't matter masked off, so the
+    same pattern works for every value and mask.
+    """
+    return re.compile(b"(.{%d})\\1*" % stride, re.DOTALL)
+
+
+@functools.lru_cache(maxsize=256)
+def _mask_table(mask: int) -> bytes:
+    """Return a bytes.translate() table that ANDs every byte with mask."""
+    return bytes(value & mask for value in range(256))
+
+
 class SrZipInput(Input):
     name = "srzip"
     desc = "srzip session file format data"
+    # wait() reads the compiled form and leaves skip counts in the dicts alone.
+    uses_compiled_conditions = True
 
-    def __init__(self, file: Union[str, PathLike[str], IO[bytes]], initial_state=None):
+    def __init__(
+        self,
+        file: Union[str, PathLike[str], IO[bytes]],
+        initial_state=None,
+        *,
+        window=None,
+        prefetch=0,
+        prefetch_memory=None,
+        analog_blocks="false",
+        index="auto",
+    ):
         super().__init__()
         self.zip = zipfile.ZipFile(file)
+        # The chunk index is cached next to captures opened by path.
+        self._path = os.fspath(file) if isinstance(file, (str, PathLike)) else None
+        self._index = None
+        # Upcoming chunks are decompressed on a thread pool while the current one
+        # is decoded. zlib releases the GIL so this overlaps with decoding.
+        self._prefetch = int(prefetch)
+        if prefetch_memory is None:
+            prefetch_memory = 16 * CHUNK_SIZE
+        self._prefetch_memory = int(prefetch_memory)
+        self._pool = None
+        if self._prefetch > 0:
+            self._pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self._prefetch, thread_name_prefix="srzip-prefetch"
+            )
+        self._pending = {}
+        self._pending_size = 0
+        # Stored members are read straight out of a read-only map of the file.
+        try:
+            self._mmap = mmap.mmap(self.zip.fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError):
+            self._mmap = None
         # self.zip.printdir()
         metadata = configparser.ConfigParser()
         self.version = int(self.zip.read("version").decode("ascii"))
@@ -45,19 +200,9 @@ class SrZipInput(Input):
         #     for o in metadata.options(s):
         #         print(" ", o, metadata.get(s, o))
 
-        samplerate = metadata.get("device 1", "samplerate", fallback="0")
-        self.samplerate = None
-        if " " in samplerate:
-            num, units = samplerate.split(" ")
-            self.samplerate = float(num) * UNITS[units]
-        else:
-            # check for a suffix with Hz last
-            for suffix in reversed(UNITS):
-                if suffix in samplerate:
-                    self.samplerate = int(samplerate[: -len(suffix)]) * UNITS[suffix]
-                    break
-            if self.samplerate is None:
-                self.samplerate = int(samplerate)
+        self.samplerate = parse_samplerate(
+            metadata.get("device 1", "samplerate", fallback="0")
+        )
 
         if initial_state:
             self.last_sample = 0
@@ -67,6 +212,7 @@ class SrZipInput(Input):
             self.last_sample = None
         self.unitsize = int(metadata.get("device 1", "unitsize"))
         self.typecode = TYPECODE[self.unitsize]
+        self._stride = array.array(self.typecode).itemsize
 
         self.bit_mapping = []
         self.one_to_one = True
@@ -88,133 +234,750 @@ class SrZipInput(Input):
             name = metadata.get("device 1", f"analog{total_logic + i + 1}")
             self.analog_channels.append(name)
 
+        # Single file captures are decompressed through a bounded window instead
+        # of being read into memory in one go.
+        if window is None:
+            window = CHUNK_SIZE
+        self._window = max(int(window) // self._stride, 1) * self._stride
+        self._stream = None
+        self._next_window = None
+        self._raw = None
+        self._masked_chunks = {}
+        self.data = None
+        self._file_start = -1
+        self._next_file_start = 0
+        self._file_index = 1
+        self._end_sample = None
+        # Chunks and decompressed bytes read so far, for statistics.
+        self.chunks_read = 0
+        self.bytes_read = 0
+
+        # Mask of the raw sample bits that carry a mapped channel.
+        self._raw_mask = 0
+        for in_bit, _ in self.bit_mapping:
+            self._raw_mask |= 1 << in_bit
+        self._raw_sample = None
+
+        # Remapping is done a byte at a time through tables of the mapped bits
+        # each byte value contributes. Single byte samples are remapped a whole
+        # chunk at a time with bytes.translate().
+        self._remap_tables = []
+        self._translate = None
+        if not self.one_to_one:
+            for byte_index in range(self.unitsize):
+                table = []
+                for value in range(256):
+                    mapped_sample = 0
+                    for in_bit, out_bit in self.bit_mapping:
+                        if (value << (8 * byte_index)) & (1 << in_bit) != 0:
+                            mapped_sample |= 1 << out_bit
+                    table.append(mapped_sample)
+                self._remap_tables.append((8 * byte_index, table))
+            if self.unitsize == 1:
+                self._translate = bytes(self._remap_tables[0][1])
+
+        if self.analog_channels:
+            self._analog_indices = range(
+                total_logic + 1, total_logic + 1 + total_analog
+            )
+            # Analog chunks are only read once someone asks for their samples.
+            self._analog_file_index = 0
+            self._analog_offset = 0
+            self._analog_chunk_len = 0
+            self._analog_data = []
+        # Deliver analog data as per-channel arrays covering a range of samples
+        # instead of one put per sample.
+        self._analog_blocks = bool(self.analog_channels) and _option_flag(analog_blocks)
+        self._analog_next = 0
+
+        # wait() skips chunks in which the channels it needs don't change based
+        # on the chunk index. "auto" only uses an index that is already cached.
+        if index not in INDEX_OPTIONS:
+            raise ValueError(
+                "Unknown index option "
+                + index
+                + ". Use one of: "
+                + ", ".join(INDEX_OPTIONS)
+            )
+        self._skip_chunks = index != "false" and not self.single_file
+        if index == "true":
+            self.index()
+        elif self._skip_chunks and self._path is not None:
+            self._index = self._read_index(self._index_fingerprint())
+
+    def _read_member(self, info):
+        """Return the contents of a zip member, without copying when stored."""
+        if (
+            self._mmap is None
+            or info.compress_type != zipfile.ZIP_STORED
+            or info.flag_bits & 0x1
+        ):
+            return self.zip.read(info)
+        header = struct.unpack_from(
+            zipfile.structFileHeader, self._mmap, info.header_offset
+        )
+        # Skip the local header which has its own name and extra field lengths.
+        start = info.header_offset + zipfile.sizeFileHeader + header[10] + header[11]
+        return memoryview(self._mmap)[start : start + info.file_size]
+
+    def _fetch(self, name, upcoming=()):
+        """Read zip member name and queue decompression of the upcoming ones."""
+        info = self.zip.getinfo(name)
+        pending = self._pending.pop(name, None)
+        if pending is not None:
+            future, size = pending
+            self._pending_size -= size
+            data = future.result()
+        else:
+            data = self._read_member(info)
+        if self._pool is not None:
+            for upcoming_name in upcoming:
+                if upcoming_name in self._pending:
+                    continue
+                try:
+                    upcoming_info = self.zip.getinfo(upcoming_name)
+                except KeyError:
+                    break
+                size = upcoming_info.file_size
+                if self._pending and self._pending_size + size > self._prefetch_memory:
+                    break
+                future = self._pool.submit(self._read_member, upcoming_info)
+                self._pending[upcoming_name] = (future, size)
+                self._pending_size += size
+        return data
+
+    def _stop_prefetch(self, wait=False):
+        """Stop the prefetch threads. Later reads happen on the calling thread."""
+        if self._pool is None:
+            return
+        for future, _ in self._pending.values():
+            future.cancel()
+        self._pending = {}
+        self._pending_size = 0
+        self._pool.shutdown(wait=wait)
+        self._pool = None
+
+    def close(self):
+        """Stop prefetching and close the capture file."""
+        self._stop_prefetch(wait=True)
+        self._next_window = None
+        if self._stream is not None:
+            self._stream.close()
+        self._raw = None
+        self.data = None
+        self._masked_chunks = {}
+        self._analog_data = []
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Views of stored chunks are still in use. The map is closed once
+                # they are gone.
+                pass
+            self._mmap = None
+        self.zip.close()
+
+    def _read_window(self):
+        if self._next_window is not None:
+            raw = self._next_window.result()
+        else:
+            raw = self._stream.read(self._window)
+        self._next_window = None
+        if not raw:
+            self._stream.close()
+        elif self._pool is not None:
+            self._next_window = self._pool.submit(self._stream.read, self._window)
+        return raw
+
+    def _read_logic(self):
+        if self.single_file:
+            if self._stream is not None:
+                if self._stream.closed:
+                    return None
+                return self._read_window()
+            if self._file_index > 1:
+                return None
+            self._file_index += 1
+            info = self.zip.getinfo("logic-1")
+            if self._mmap is None or info.compress_type != zipfile.ZIP_STORED:
+                self._stream = self.zip.open(info)
+                return self._read_window()
+            return self._read_member(info)
+        index = self._file_index
+        upcoming = [
+            f"logic-1-{i:d}" for i in range(index + 1, index + 1 + self._prefetch)
+        ]
+        try:
+            raw = self._fetch(f"logic-1-{index:d}", upcoming)
+        except KeyError:
+            return None
+        self._file_index += 1
+        return raw
+
+    def _load_analog_chunk(self, samplenum):
+        """Load the analog chunks that contain samplenum.
+
+        Chunks before it are skipped based on their size without reading them.
+        """
+        first_channel = self._analog_indices[0]
+        while samplenum >= self._analog_offset + self._analog_chunk_len:
+            self._analog_offset += self._analog_chunk_len
+            self._analog_file_index += 1
+            info = self.zip.getinfo(
+                f"analog-1-{first_channel}-{self._analog_file_index:d}"
+            )
+            self._analog_chunk_len = info.file_size // 4
+        index = self._analog_file_index
+        self._analog_data = []
+        for c in self._analog_indices:
+            upcoming = [
+                f"analog-1-{c}-{i:d}"
+                for i in range(index + 1, index + 1 + self._prefetch)
+            ]
+            raw = self._fetch(f"analog-1-{c}-{index:d}", upcoming)
+            self.chunks_read += 1
+            self.bytes_read += len(raw)
+            # Samples are little-endian floats so view them in place.
+            self._analog_data.append(memoryview(raw).cast("f"))
+
+    def _load_next_chunk(self):
+        """Load the logic chunk following the current one. Returns False at the end."""
+        self._file_start = self._next_file_start
+        raw = None
+        if self._end_sample is None or self._file_start < self._end_sample:
+            raw = self._read_logic()
+        if not raw:
+            return False
+        self.chunks_read += 1
+        self.bytes_read += len(raw)
+        if self._translate is not None:
+            raw = bytes(raw).translate(self._translate)
+        self._raw = raw
+        self._masked_chunks = {}
+        self.data = raw
+        if self.unitsize > 1:
+            self.data = memoryview(raw).cast(self.typecode)
+        self._next_file_start = self._file_start + len(self.data)
+        if self._end_sample is not None and self._next_file_start > self._end_sample:
+            self.data = self.data[: self._end_sample - self._file_start]
+        return True
+
+    def _logic_chunk_names(self):
+        if self.single_file:
+            return ["logic-1"]
+        members = set(self.zip.namelist())
+        names = []
+        while f"logic-1-{len(names) + 1:d}" in members:
+            names.append(f"logic-1-{len(names) + 1:d}")
+        return names
+
+    def _skip_idle_chunks(self, index_mask, limit):
+        """Skip the chunks after the current one whose index_mask bits are constant.
+
+        Raw sample bits outside of index_mask may change. Skipped chunks must end
+        before sample limit. Returns the summary of the last skipped chunk or None.
+        """
+        index = self._index
+        # _file_index is the 1-based number of the next chunk.
+        chunk = self._file_index - 1
+        if chunk < 1 or chunk >= len(index):
+            return None
+        previous = index[chunk - 1]
+        skipped = None
+        while chunk < len(index):
+            summary = index[chunk]
+            if (
+                summary.activity & index_mask
+                or (summary.first_value ^ previous.last_value) & index_mask
+                or (limit is not None and summary.last_sample >= limit)
+            ):
+                break
+            pending = self._pending.pop(f"logic-1-{chunk + 1:d}", None)
+            if pending is not None:
+                future, size = pending
+                future.cancel()
+                self._pending_size -= size
+            skipped = previous = summary
+            chunk += 1
+        if skipped is not None:
+            self._file_index = chunk + 1
+            self._next_file_start = skipped.last_sample + 1
+        return skipped
+
+    def _logic_chunk_lengths(self):
+        """Return the number of samples in each logic chunk, in order."""
+        return [
+            self.zip.getinfo(name).file_size // self._stride
+            for name in self._logic_chunk_names()
+        ]
+
+    def _index_fingerprint(self):
+        stat = os.stat(self._path)
+        # Single file captures are summarized a window at a time.
+        return [
+            INDEX_VERSION,
+            stat.st_size,
+            stat.st_mtime_ns,
+            self._stride,
+            self._window if self.single_file else None,
+        ]
+
+    def _read_index(self, fingerprint):
+        try:
+            with open(self._path + ".idx") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cached.get("fingerprint") != fingerprint:
+            return None
+        return [ChunkSummary(*chunk) for chunk in cached["chunks"]]
+
+    def _write_index(self, fingerprint, index):
+        path = self._path + ".idx"
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump({"fingerprint": fingerprint, "chunks": index}, f)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def _build_index(self):
+        index = []
+        first_sample = 0
+
+        def add(raw):
+            nonlocal first_sample
+            index.append(summarize_chunk(raw, self.typecode, first_sample))
+            first_sample += len(raw) // self._stride
+
         if self.single_file:
-            self.data = self.zip.read("logic-1")
-            if self.unitsize > 1:
-                self.data = array.array(self.typecode, self.data)
+            # Single file captures are summarized a window at a time.
+            with self.zip.open("logic-1") as stream:
+                raw = stream.read(self._window)
+                while raw:
+                    add(raw)
+                    raw = stream.read(self._window)
         else:
-            self.data = None
-            self._file_start = -1
+            for name in self._logic_chunk_names():
+                add(self._read_member(self.zip.getinfo(name)))
+        return index
+
+    def index(self):
+        """Return a ChunkSummary for every logic chunk of the capture.
+
+        Building the index reads the whole capture once. It is then cached in a
+        .idx file next to the capture, when it was opened by path and the
+        directory is writable, and reused until the capture changes.
+        """
+        if self._index is None:
+            fingerprint = None
+            if self._path is not None:
+                fingerprint = self._index_fingerprint()
+                self._index = self._read_index(fingerprint)
+            if self._index is None:
+                self._index = self._build_index()
+                if fingerprint is not None:
+                    self._write_index(fingerprint, self._index)
+        return self._index
+
+    def seek(self, start, end=None):
+        """Decode from sample start up to, but not including, sample end.
+
+        Sample numbers stay relative to the start of the capture. Chunks before
+        start aren't read and the state of the channels before start comes from
+        the chunk index, so a change on sample start is an edge just like when
+        decoding the whole capture. Call before decoding.
+        """
+        index = self.index()
+        total = index[-1].last_sample + 1 if index else 0
+        if not 0 <= start < total or (end is not None and end <= start):
+            raise ValueError(
+                f"Can't decode samples {start} to {end} of a capture with {total}."
+            )
+        self._seek(start, end)
+        if start == 0:
+            return
+        previous = None
+        if start - 1 < self._file_start:
+            previous = next(
+                (chunk.last_value for chunk in index if chunk.last_sample == start - 1),
+                None,
+            )
+            if previous is not None:
+                previous = self._map_sample(previous)
+            else:
+                # No chunk of the index ends there so read the sample itself.
+                self._seek(start - 1, end)
+                self.samplenum = start - 1
+                self._analog_next = start
+        if previous is None:
+            previous = self.data[start - 1 - self._file_start]
+            if not self.one_to_one and self._translate is None:
+                previous = self._map_sample(previous)
+        self.last_sample = previous
+        self.start_samplenum = start
+
+    def _seek(self, start, end=None):
+        """Start the next wait() at sample start and end the input at sample end.
+
+        Chunks before start are skipped without reading them when the capture is
+        split into chunks. The state of the channels before start is unknown so
+        the first sample read is treated like the first sample of the capture.
+        """
+        if not self.single_file:
             self._file_index = 1
+            self._next_file_start = 0
+            for length in self._logic_chunk_lengths():
+                if self._next_file_start + length > start:
+                    break
+                self._next_file_start += length
+                self._file_index += 1
+        self._end_sample = end
+        self.data = None
+        while self._load_next_chunk():
+            if self._next_file_start > start:
+                break
+        self.samplenum = start - 1
+        self.last_sample = None
+        self.start_samplenum = None
+        self._analog_next = start
 
-        if self.analog_channels:
-            self._analog_file_index = 1
-            self._analog_data = []
-            for c in range(total_logic + 1, total_logic + 1 + total_analog):
-                self._analog_data.append(
-                    self.zip.read(f"analog-1-{c}-{self._analog_file_index}")
+    def _map_sample(self, sample):
+        if self.one_to_one:
+            return sample
+        mapped_sample = 0
+        for shift, table in self._remap_tables:
+            mapped_sample |= table[(sample >> shift) & 0xFF]
+        return mapped_sample
+
+    def _unmap_mask(self, mask):
+        if self.one_to_one:
+            return mask
+        raw_mask = 0
+        for in_bit, out_bit in self.bit_mapping:
+            if mask & (1 << out_bit) != 0:
+                raw_mask |= 1 << in_bit
+        return raw_mask
+
+    def _find_change(self, raw_mask, limit=None):
+        """Return the first sample after samplenum whose masked raw bits change.
+
+        The search stops at limit or at the end of the current chunk, whichever is
+        first.
+        """
+        chunk_end = self._file_start + len(self.data)
+        if limit is None or limit > chunk_end:
+            limit = chunk_end
+        first = self.samplenum + 1
+        if first >= limit:
+            return first
+        if raw_mask == 0:
+            return limit
+        # The run starts at the current sample so the first sample after it is
+        # compared against it too.
+        stride = self._stride
+        pos = (self.samplenum - self._file_start) * stride
+        endpos = (limit - self._file_start) * stride
+        run_end = _same_run(stride).match(self._masked_raw(raw_mask), pos, endpos).end()
+        return self.samplenum + (run_end - pos) // stride
+
+    def _masked_raw(self, raw_mask):
+        """Return the raw bytes of the current chunk ANDed with raw_mask.
+
+        The copy is made once per chunk and mask, at the speed of a memory copy.
+        """
+        stride = self._stride
+        masked = self._masked_chunks.get(raw_mask)
+        if masked is None:
+            if raw_mask == (1 << (8 * stride)) - 1:
+                masked = bytes(self._raw)
+            elif stride == 1:
+                masked = bytes(self._raw).translate(_mask_table(raw_mask))
+            else:
+                repeated = raw_mask.to_bytes(stride, "little") * (
+                    len(self._raw) // stride
                 )
-            self._analog_offset = 0
-            self._analog_chunk_len = len(self._analog_data[0]) // 4
+                masked = (
+                    int.from_bytes(self._raw, "little")
+                    & int.from_bytes(repeated, "little")
+                ).to_bytes(len(self._raw), "little")
+            if len(self._masked_chunks) >= _MAX_MASKED_CHUNKS:
+                self._masked_chunks.clear()
+            self._masked_chunks[raw_mask] = masked
+        return masked
 
     def wait(self, conds=[]):
         if conds is None:
             conds = []
-        self.matched = [False] * (len(conds) if conds else 1)
-        while not any(self.matched):
-            self.samplenum += 1
-            if self.single_file:
-                if self.samplenum >= len(self.data):
+        compiled = compile_conditions(conds)
+        matched = [False] * (len(compiled.conditions) or 1)
+        self.matched = matched
+
+        pin_conds = compiled.pins
+        steady_conds = compiled.steady
+        skip_until = [(i, self.samplenum + skip) for i, skip in compiled.skips]
+        next_skip = None
+        if skip_until:
+            next_skip = min(target for _, target in skip_until)
+
+        # Chunks remapped as a whole are already in channel order.
+        one_to_one = self.one_to_one or self._translate is not None
+
+        # Every change of the full sample is reported to outputs so only skip past
+        # changes on other channels when nobody listens.
+        if self.wants("logic"):
+            raw_mask = -1 if one_to_one else self._raw_mask
+        elif one_to_one:
+            raw_mask = compiled.mask
+        else:
+            raw_mask = self._unmap_mask(compiled.mask)
+        if one_to_one:
+            raw_mask &= (1 << (self._stride * 8)) - 1
+
+        analog = bool(self.analog_channels) and self.wants("analog")
+        analog_samples = analog and not self._analog_blocks
+        analog_blocks = analog and self._analog_blocks
+
+        # Whole chunks can be skipped when this wait() can only match on a change
+        # and analog samples aren't put one at a time.
+        skip_index = None
+        if (
+            self._skip_chunks
+            and self._index is not None
+            and compiled.conditions
+            and not analog_samples
+        ):
+            skip_index = self._index
+            if self.wants("logic"):
+                index_mask = self._raw_mask
+            else:
+                index_mask = self._unmap_mask(compiled.mask)
+            skip_limit = next_skip
+            if self._end_sample is not None and (
+                skip_limit is None or self._end_sample < skip_limit
+            ):
+                skip_limit = self._end_sample
+
+        data = self.data
+        file_start = self._file_start
+        samplenum = self.samplenum
+        last_sample = self.last_sample
+        while True:
+            samplenum += 1
+            file_samplenum = samplenum - file_start
+            if data is None or file_samplenum >= len(data):
+                if (
+                    skip_index is not None
+                    and data is not None
+                    and last_sample is not None
+                    and not any(
+                        cond.matches(last_sample, last_sample) for cond in steady_conds
+                    )
+                ):
+                    skipped = self._skip_idle_chunks(index_mask, skip_limit)
+                    if skipped is not None:
+                        samplenum = skipped.last_sample + 1
+                        last_sample = self._map_sample(skipped.last_value)
+                self.samplenum = samplenum
+                if not self._load_next_chunk():
+                    self.last_sample = last_sample
+                    if analog_blocks:
+                        self._put_analog_blocks(samplenum)
+                    # Logic and analog data are both done with now.
+                    self._stop_prefetch()
                     self.put(
                         self.start_samplenum,
-                        self.samplenum,
+                        samplenum,
                         OUTPUT_PYTHON,
-                        ["logic", self.last_sample],
+                        ["logic", last_sample],
                     )
                     raise EOFError()
-                sample = self.data[self.samplenum]
+                data = self.data
+                file_start = self._file_start
+                file_samplenum = samplenum - file_start
+            raw_sample = data[file_samplenum]
+            if one_to_one:
+                sample = raw_sample
             else:
-                file_samplenum = self.samplenum - self._file_start
-                if self.data is None or file_samplenum >= len(self.data):
-                    self._file_start = self.samplenum
-                    try:
-                        self.data = self.zip.read(f"logic-1-{self._file_index:d}")
-                    except KeyError:
-                        self.put(
-                            self.start_samplenum,
-                            self.samplenum,
-                            OUTPUT_PYTHON,
-                            ["logic", self.last_sample],
-                        )
-                        raise EOFError()
-
-                    if self.unitsize > 1:
-                        self.data = array.array(self.typecode, self.data)
-
-                    file_samplenum = 0
-                    self._file_index += 1
-                sample = self.data[file_samplenum]
-
-            if not self.one_to_one:
-                mapped_sample = 0
-                for in_bit, out_bit in self.bit_mapping:
-                    if sample & (1 << in_bit) != 0:
-                        mapped_sample |= 1 << out_bit
-                sample = mapped_sample
-
-            if self.last_sample is None:
-                self.last_sample = sample
-                self.start_samplenum = self.samplenum
-
-            if self.last_sample != sample:
-                self.put(
-                    self.start_samplenum,
-                    self.samplenum,
-                    OUTPUT_PYTHON,
-                    ["logic", self.last_sample],
-                )
-                self.start_samplenum = self.samplenum
+                sample = self._map_sample(raw_sample)
+
+            if last_sample is None:
+                last_sample = sample
+                self.start_samplenum = samplenum
+
+            if last_sample != sample:
+                # After seek() the first sample may differ from the one before it.
+                if self.start_samplenum != samplenum:
+                    self.put(
+                        self.start_samplenum,
+                        samplenum,
+                        OUTPUT_PYTHON,
+                        ["logic", last_sample],
+                    )
+                self.start_samplenum = samplenum
 
-            if self.analog_channels:
+            if analog_samples:
                 self.put(
-                    self.samplenum,
-                    self.samplenum + 1,
+                    samplenum,
+                    samplenum + 1,
                     OUTPUT_PYTHON,
-                    ["analog"] + self.get_analog_values(self.samplenum),
+                    ["analog"] + self.get_analog_values(samplenum),
                 )
 
             # Go one sample if no conditions are given.
-            if len(conds) == 0:
-                self.matched[0] = True
+            if not compiled.conditions:
+                matched[0] = True
+                break
 
-            for i, cond in enumerate(conds):
-                if "skip" in cond:
-                    cond["skip"] -= 1
-                    self.matched[i] = cond["skip"] <= 0
-                    continue
-                self.matched[i] = cond_matches(cond, self.last_sample, sample)
-            self.last_sample = sample
+            found = False
+            for i, target in skip_until:
+                if samplenum >= target:
+                    matched[i] = found = True
+            for i, cond in pin_conds:
+                if cond.matches(last_sample, sample):
+                    matched[i] = found = True
+            last_sample = sample
+            if found:
+                break
+
+            # A condition without edges that holds while the sample stays the same
+            # matches on the very next sample so there is nothing to skip. Only
+            # search for the next change when the following samples look idle.
+            if any(cond.matches(sample, sample) for cond in steady_conds):
+                continue
+            if next_skip is not None and next_skip - samplenum < MIN_SKIP:
+                continue
+            if file_samplenum + 2 < len(data) and (
+                (data[file_samplenum + 1] ^ raw_sample) & raw_mask != 0
+                or (data[file_samplenum + 2] ^ raw_sample) & raw_mask != 0
+            ):
+                continue
+            self.samplenum = samplenum
+            self._raw_sample = raw_sample
+            change = self._find_change(raw_mask, next_skip)
+            if change <= samplenum + 1:
+                continue
+            if analog_samples:
+                for skipped in range(samplenum + 1, change):
+                    self.put(
+                        skipped,
+                        skipped + 1,
+                        OUTPUT_PYTHON,
+                        ["analog"] + self.get_analog_values(skipped),
+                    )
+            samplenum = change - 1
+            last_sample = data[samplenum - file_start]
+            if not one_to_one:
+                last_sample = self._map_sample(last_sample)
 
-        bits = []
-        for b in range(self.unitsize * 8):
-            bits.append((sample >> b) & 0x1)
+        self.samplenum = samplenum
+        self.last_sample = sample
+        self._raw_sample = raw_sample
+        if analog_blocks:
+            self._put_analog_blocks(samplenum + 1)
 
-        return tuple(bits)
+        return self._sample_bits(sample)
 
     def get_analog_values(self, samplenum):
         if samplenum >= (self._analog_offset + self._analog_chunk_len):
-            self._analog_offset += self._analog_chunk_len
-            self._analog_file_index += 1
-            self._analog_data = []
-            total_logic = len(self.logic_channels)
-            total_analog = len(self.analog_channels)
-            for c in range(total_logic + 1, total_logic + 1 + total_analog):
-                self._analog_data.append(
-                    self.zip.read(f"analog-1-{c}-{self._analog_file_index}")
-                )
-            self._analog_chunk_len = len(self._analog_data[0]) // 4
+            self._load_analog_chunk(samplenum)
 
-        values = []
-        for data in self._analog_data:
-            values.append(
-                struct.unpack_from("f", data, (samplenum - self._analog_offset) * 4)[0]
-            )
+        index = samplenum - self._analog_offset
+        return [data[index] for data in self._analog_data]
+
+    def get_analog_block(self, start, end):
+        """Return per-channel float views of analog samples from start up to end.
 
-        return values
+        The views never span chunks so they may end before end. Returns the end
+        sample of the block along with the views.
+        """
+        if start >= (self._analog_offset + self._analog_chunk_len):
+            self._load_analog_chunk(start)
+        end = min(end, self._analog_offset + self._analog_chunk_len)
+        first = start - self._analog_offset
+        last = end - self._analog_offset
+        return end, [data[first:last] for data in self._analog_data]
+
+    def _put_analog_blocks(self, end):
+        """Put the analog samples not yet delivered, up to end, as blocks."""
+        start = self._analog_next
+        while start < end:
+            block_end, block = self.get_analog_block(start, end)
+            self.put(start, block_end, OUTPUT_PYTHON, ["analog_block"] + block)
+            start = block_end
+        self._analog_next = start
 
 
 CHUNK_SIZE = 4 * 1024 * 1024
 
+COMPRESSION = {"deflated": zipfile.ZIP_DEFLATED, "stored": zipfile.ZIP_STORED}
+
+
+def open_output_zip(
+    file: Union[str, PathLike[str], IO[bytes]], compression="deflated", level=None
+) -> zipfile.ZipFile:
+    """Open a zip for writing with a COMPRESSION name and optional level."""
+    if compression not in COMPRESSION:
+        raise ValueError(
+            "Unknown compression "
+            + compression
+            + ". Use one of: "
+            + ", ".join(COMPRESSION)
+        )
+    if level is not None:
+        level = int(level)
+    return zipfile.ZipFile(
+        file, "w", compression=COMPRESSION[compression], compresslevel=level
+    )
+
+
+class _ChunkWriter:
+    """Fills a chunk sized buffer and writes it to the zip in one go once full.
+
+    Chunk files are named by formatting name with the 1-based chunk count.
+    """
+
+    def __init__(self, write, name: str, itemsize: int):
+        self._write = write
+        self.name = name
+        self.count = 1
+        self._buffer = bytearray(CHUNK_SIZE // itemsize * itemsize)
+        self._view = memoryview(self._buffer)
+        self._used = 0
+
+    def write_repeated(self, item: bytes, count: int) -> None:
+        """Write item count times."""
+        while count > 0:
+            n = min(count, (len(self._buffer) - self._used) // len(item))
+            end = self._used + n * len(item)
+            self._view[self._used : end] = item * n
+            self._used = end
+            count -= n
+            if self._used == len(self._buffer):
+                self._flush()
+
+    def write(self, data) -> None:
+        """Write the bytes in data."""
+        data = memoryview(data)
+        while data:
+            n = min(len(data), len(self._buffer) - self._used)
+            self._view[self._used : self._used + n] = data[:n]
+            self._used += n
+            data = data[n:]
+            if self._used == len(self._buffer):
+                self._flush()
+
+    def _flush(self) -> None:
+        self._write(self.name.format(self.count), self._view[: self._used])
+        self.count += 1
+        self._used = 0
+
+    def close(self, write_empty=False) -> None:
+        """Write the partial last chunk. write_empty forces a chunk for no data."""
+        if self._used or (write_empty and self.count == 1):
+            self._flush()
+
 
 class SrZipOutput(Output):
     name = "srzip"
@@ -227,12 +990,27 @@ class SrZipOutput(Output):
         logic_channels=[],
         analog_channels=[],
         decoders=[],
+        *,
+        compression="deflated",
+        level=None,
+        background="false",
+        max_pending="4",
     ):
         super().__init__()
         if decoders:
             raise NotImplementedError("Annotations can't be saved into .sr files.")
 
-        self.zip = zipfile.ZipFile(file, "w", compression=zipfile.ZIP_DEFLATED)
+        self.zip = open_output_zip(file, compression, level)
+        # Chunks are compressed and written in order by a single background
+        # thread so that the producer only waits when max_pending chunks are
+        # queued up.
+        self._executor = None
+        self._pending = collections.deque()
+        self._max_pending = max(int(max_pending), 1)
+        if _option_flag(background):
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="srzip-writer"
+            )
 
         self.zip.writestr("version", "2")
         metadata = configparser.ConfigParser()
@@ -242,28 +1020,30 @@ class SrZipOutput(Output):
 
         metadata.add_section("device 1")
         metadata.set("device 1", "driver", driver.name)
-        metadata.set("device 1", "samplerate", str(driver.samplerate))
+        metadata.set("device 1", "samplerate", samplerate_string(driver.samplerate))
         self.driver = driver
-        self.logic_buffer = None
-        self._analog_buffers = []
-        self._analog_indices = []
-        self._analog_count = 1
+        self._logic_chunks = None
+        self._analog_chunks = []
         if logic_channels:
             self.capturefile = "logic-1"
-            self.count = 1
             metadata.set("device 1", "capturefile", self.capturefile)
             self.unitsize = len(logic_channels) // 8 + 1
             metadata.set("device 1", "unitsize", str(self.unitsize))
             metadata.set("device 1", "total probes", str(len(logic_channels)))
             for i, channelname in enumerate(logic_channels):
                 metadata.set("device 1", f"probe{i+1:d}", channelname)
-            self.logic_buffer = array.array(TYPECODE[self.unitsize])
+            logic_struct = struct.Struct(TYPECODE[self.unitsize])
+            self._pack_logic = logic_struct.pack
+            self._logic_chunks = _ChunkWriter(
+                self._write_chunk, self.capturefile + "-{:d}", logic_struct.size
+            )
         if analog_channels:
             metadata.set("device 1", "total analog", str(len(analog_channels)))
             for i, channelname in enumerate(analog_channels):
                 i += len(logic_channels)
-                self._analog_indices.append(i + 1)
-                self._analog_buffers.append(array.array("f"))
+                self._analog_chunks.append(
+                    _ChunkWriter(self._write_chunk, f"analog-1-{i + 1:d}-{{:d}}", 4)
+                )
                 metadata.set("device 1", f"analog{i+1:d}", channelname)
 
         with self.zip.open("metadata", "w") as f:
@@ -273,32 +1053,47 @@ class SrZipOutput(Output):
         # Only output data from the input driver.
         if source != self.driver:
             return
+        if self._pending:
+            self._check_writer()
         ptype = data[0]
         if ptype == "logic":
-            for _ in range(startsample, endsample):
-                self.logic_buffer.append(data[1])
-                if len(self.logic_buffer) * self.logic_buffer.itemsize >= CHUNK_SIZE:
-                    fn = f"{self.capturefile}-{self.count:d}"
-                    self.zip.writestr(fn, self.logic_buffer.tobytes())
-                    self.count += 1
-                    self.logic_buffer = array.array(TYPECODE[self.unitsize])
+            runs = data[1]
+            if not isinstance(runs, LogicRuns):
+                runs = ((runs, endsample - startsample),)
+            for value, length in runs:
+                self._logic_chunks.write_repeated(self._pack_logic(value), length)
         elif ptype == "analog":
-            for _ in range(startsample, endsample):
-                if len(self._analog_buffers[0]) * 4 >= CHUNK_SIZE:
-                    for i, file_index in enumerate(self._analog_indices):
-                        fn = f"analog-1-{file_index:d}-{self._analog_count:d}"
-                        self.zip.writestr(fn, self._analog_buffers[i].tobytes())
-                        self._analog_buffers[i] = array.array("f")
-                    self._analog_count += 1
-                for i, file_index in enumerate(self._analog_indices):
-                    self._analog_buffers[i].append(data[1 + i])
+            for chunks, value in zip(self._analog_chunks, data[1:]):
+                chunks.write_repeated(struct.pack("f", value), endsample - startsample)
+        elif ptype == "analog_block":
+            for chunks, values in zip(self._analog_chunks, data[1:]):
+                chunks.write(memoryview(values).cast("B"))
+
+    def _check_writer(self):
+        """Raise the error of the first chunk the writer failed on, if any."""
+        while self._pending and self._pending[0].done():
+            self._pending.popleft().result()
+
+    def _write_chunk(self, name, data):
+        if self._executor is None:
+            self.zip.writestr(name, data)
+            return
+        self._check_writer()
+        while len(self._pending) >= self._max_pending:
+            self._pending.popleft().result()
+        # The chunk buffer is reused so hand the writer its own copy.
+        future = self._executor.submit(self.zip.writestr, name, bytes(data))
+        self._pending.append(future)
 
     def stop(self):
-        if self.logic_buffer:
-            fn = f"{self.capturefile}-{self.count:d}"
-            self.zip.writestr(fn, self.logic_buffer.tobytes())
-        if self._analog_buffers:
-            for i, file_index in enumerate(self._analog_indices):
-                fn = f"analog-1-{file_index:d}-{self._analog_count:d}"
-                self.zip.writestr(fn, self._analog_buffers[i].tobytes())
+        if self._logic_chunks is not None:
+            self._logic_chunks.close()
+        for chunks in self._analog_chunks:
+            chunks.close(write_empty=True)
+        if self._executor is not None:
+            try:
+                while self._pending:
+                    self._pending.popleft().result()
+            finally:
+                self._executor.shutdown()
         self.zip.close()
@@ -0,0 +1,156 @@
+"""Opt-in instrumentation of a decode run.
+
+Pass a RunStats to run_decoders() to count what each decoder does and time
+the stages of the run:
+
+    stats = RunStats()
+    run_decoders(input_, output, decoders, stats=stats)
+    print(json.dumps(stats.to_dict(), indent=2))
+
+Time is exclusive. Time a decoder spends in wait() is counted for the input
+and time spent in an output or in the next decoder of the stack is counted for
+that. Without a RunStats nothing is wrapped, so runs pay nothing for this.
+"""
+import functools
+import time
+
+
+class StageStats:
+    """Time spent in one stage of a run and how often it was entered."""
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.calls = 0
+
+    def to_dict(self):
+        return {"name": self.name, "seconds": self.seconds, "calls": self.calls}
+
+
+class DecoderStats(StageStats):
+    """Stage counters of a decoder plus its wait() and put() calls."""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.waits = 0
+        self.samples_scanned = 0
+        self.puts = {}
+
+    def to_dict(self):
+        return dict(
+            super().to_dict(),
+            waits=self.waits,
+            samples_scanned=self.samples_scanned,
+            puts=dict(self.puts),
+        )
+
+
+class RunStats:
+    """Statistics of a run_decoders() call, filled in while it runs."""
+
+    def __init__(self):
+        self.input = StageStats("input")
+        self.output = StageStats("output")
+        self.decoders = []
+        self.seconds = 0.0
+        self.samples = 0
+        self.chunks = None
+        self.bytes = None
+        self._stack = []
+        self._last = None
+
+    def _switch(self, stage):
+        """Charge the time since the last switch to the running stage."""
+        now = time.perf_counter()
+        if self._stack:
+            self._stack[-1].seconds += now - self._last
+        self._last = now
+        if stage is not None:
+            self._stack.append(stage)
+        else:
+            self._stack.pop()
+
+    def _timed(self, stage, fun):
+        @functools.wraps(fun)
+        def timed(*args, **kwargs):
+            stage.calls += 1
+            self._switch(stage)
+            try:
+                return fun(*args, **kwargs)
+            finally:
+                self._switch(None)
+
+        return timed
+
+    def add_output(self, output):
+        """Time output.output(). Call before callbacks to it are registered."""
+        output.output = self._timed(self.output, output.output)
+
+    def add_decoder(self, decoder, decoder_id):
+        """Instrument a decoder. Call before callbacks to it are registered."""
+        stage = DecoderStats(decoder_id)
+        self.decoders.append(stage)
+        decoder.decode = self._timed(stage, decoder.decode)
+        wait = self._timed(self.input, decoder.wait)
+        put = decoder.put
+
+        def counted_wait(conds=[]):
+            stage.waits += 1
+            start = decoder.input.samplenum
+            try:
+                pins = wait(conds)
+            except EOFError:
+                # samplenum is one past the last sample once the input runs out.
+                stage.samples_scanned += decoder.input.samplenum - start - 1
+                raise
+            stage.samples_scanned += decoder.input.samplenum - start
+            return pins
+
+        def counted_put(startsample, endsample, output_id, data):
+            stage.puts[output_id.name] = stage.puts.get(output_id.name, 0) + 1
+            put(startsample, endsample, output_id, data)
+
+        decoder.wait = counted_wait
+        decoder.put = counted_put
+
+    def run(self, input_, fun):
+        """Call fun, timing the whole run, and read the input's counters."""
+        first_sample = input_.samplenum + 1
+        wait = input_.wait
+        ran_out = False
+
+        def checked_wait(conds=[]):
+            nonlocal ran_out
+            try:
+                return wait(conds)
+            except EOFError:
+                ran_out = True
+                raise
+
+        input_.wait = checked_wait
+        start = time.perf_counter()
+        try:
+            return fun()
+        finally:
+            self.seconds += time.perf_counter() - start
+            del input_.wait
+            # samplenum is one past the last sample once the input runs out and
+            # on the last sample read otherwise.
+            last_sample = input_.samplenum if ran_out else input_.samplenum + 1
+            self.samples = max(last_sample - first_sample, 0)
+            self.chunks = getattr(input_, "chunks_read", None)
+            self.bytes = getattr(input_, "bytes_read", None)
+
+    def to_dict(self):
+        return {
+            "seconds": self.seconds,
+            "input": dict(
+                self.input.to_dict(),
+                samples=self.samples,
+                samples_per_second=self.samples / self.seconds if self.seconds else 0,
+                chunks=self.chunks,
+                bytes=self.bytes,
+            ),
+            "decoders": [decoder.to_dict() for decoder in reversed(self.decoders)],
+            "output": self.output.to_dict(),
+        }
@@ -0,0 +1,406 @@
+"""Incremental decoding of samples that arrive in blocks.
+
+A DecoderSession owns a StreamInput and a decoder stack. feed() hands it a
+block of samples and returns the decoder output the block produced. The
+decoders pick up where they left off on the next block and close() ends the
+stream. Many sessions can be interleaved in one process.
+
+Decoders whose decode() is a generator are driven directly. They yield their
+wait() conditions and receive the pins back:
+
+    def decode(self):
+        while True:
+            pins = yield {0: "r"}
+            ...
+
+Other decoders block in wait(), so they run on a thread of their own that only
+runs while feed() or close() waits for it.
+"""
+import collections
+import inspect
+import itertools
+import threading
+
+from . import (
+    compile_conditions,
+    run_decoders,
+    start_decoders,
+    stop_decoders,
+    OUTPUT_ANN,
+    OUTPUT_PYTHON,
+)
+from .input import Input
+from .output import Output
+from .runs import LogicRuns
+
+
+class StreamInput(Input):
+    """Input of logic samples pushed in blocks.
+
+    wait() works through the samples one run of equal values at a time. Once
+    the pushed samples run out it calls need_data, when set, to get more. It
+    raises EOFError when there is nothing more and end() was called or
+    need_data isn't set. poll() never blocks and returns None instead.
+    """
+
+    name = "stream"
+    desc = "logic samples pushed in blocks"
+    uses_compiled_conditions = True
+
+    def __init__(self, logic_channels, samplerate=0, initial_state=None):
+        super().__init__()
+        self.logic_channels = list(logic_channels)
+        self.analog_channels = []
+        self.samplerate = samplerate
+        self.unitsize = len(self.logic_channels) // 8 + 1
+        self.samplenum = -1
+        self.start_samplenum = None
+        self.matched = None
+        if initial_state:
+            self.last_sample = 0
+            for channel in initial_state:
+                self.last_sample |= initial_state[channel] << channel
+        else:
+            self.last_sample = None
+        self.ended = False
+        self.finished = False
+        self.need_data = None
+        # Pending (value, length) runs that start at samplenum + 1.
+        self._pending = collections.deque()
+        self._pending_samples = 0
+        # samplenum when the wait() that poll() works on started.
+        self._wait_start = None
+
+    @property
+    def pending_samples(self):
+        return self._pending_samples
+
+    def push(self, block):
+        """Queue a block of samples.
+
+        block is a LogicRuns or a sequence of sample values such as bytes.
+        """
+        if not isinstance(block, LogicRuns):
+            runs = LogicRuns()
+            for value, group in itertools.groupby(block):
+                runs.append(value, sum(1 for _ in group))
+            block = runs
+        pending = self._pending
+        for value, length in block:
+            if pending and pending[-1][0] == value:
+                pending[-1] = (value, pending[-1][1] + length)
+            else:
+                pending.append((value, length))
+        self._pending_samples += block.samples
+
+    def end(self):
+        """Mark the end of the stream. Pushed samples are still decoded."""
+        self.ended = True
+
+    def _consume(self, count):
+        """Drop count samples from the start of the pending runs."""
+        value, length = self._pending[0]
+        if count == length:
+            self._pending.popleft()
+        else:
+            self._pending[0] = (value, length - count)
+        self._pending_samples -= count
+
+    def _advance(self, compiled, wait_start):
+        """Advance to the first pending sample that matches compiled.
+
+        Returns False when the pending samples run out before a match.
+        """
+        matched = [False] * (len(compiled.conditions) or 1)
+        self.matched = matched
+        skip_until = [(i, wait_start + skip) for i, skip in compiled.skips]
+        pin_conds = compiled.pins
+        steady_conds = compiled.steady
+        put_logic = self.wants("logic")
+        pending = self._pending
+        samplenum = self.samplenum
+        last_sample = self.last_sample
+        found = False
+        while pending:
+            value, length = pending[0]
+            samplenum += 1
+            if last_sample is None:
+                last_sample = value
+                self.start_samplenum = samplenum
+            if last_sample != value:
+                # After a seek the first sample may differ from the one before it.
+                if put_logic and self.start_samplenum not in (None, samplenum):
+                    self.put(
+                        self.start_samplenum,
+                        samplenum,
+                        OUTPUT_PYTHON,
+                        ["logic", last_sample],
+                    )
+                self.start_samplenum = samplenum
+
+            # The first sample of the run is the only one that can have an edge.
+            found = not compiled.conditions
+            if found:
+                matched[0] = True
+            for i, target in skip_until:
+                if samplenum >= target:
+                    matched[i] = found = True
+            for i, cond in pin_conds:
+                if cond.matches(last_sample, value):
+                    matched[i] = found = True
+            last_sample = value
+            if found:
+                self._consume(1)
+                break
+
+            # The rest of the run only matches steady conditions and skips.
+            run_end = samplenum + length - 1
+            hit = None
+            if length > 1 and any(cond.matches(value, value) for cond in steady_conds):
+                hit = samplenum + 1
+            for _, target in skip_until:
+                if target <= run_end and (hit is None or target < hit):
+                    hit = max(target, samplenum + 1)
+            if hit is not None:
+                for i, target in skip_until:
+                    if hit >= target:
+                        matched[i] = True
+                for i, cond in pin_conds:
+                    if cond.matches(value, value):
+                        matched[i] = True
+                self._consume(hit - samplenum + 1)
+                samplenum = hit
+                found = True
+                break
+            self._consume(length)
+            samplenum = run_end
+
+        self.samplenum = samplenum
+        self.last_sample = last_sample
+        return found
+
+    def _finish(self):
+        if not self.finished:
+            self.finished = True
+            # Like file inputs, samplenum ends one past the last sample.
+            self.samplenum += 1
+            if self.start_samplenum is not None and self.wants("logic"):
+                self.put(
+                    self.start_samplenum,
+                    self.samplenum,
+                    OUTPUT_PYTHON,
+                    ["logic", self.last_sample],
+                )
+
+    def poll(self, conds=[]):
+        """Like wait() but returns None instead of blocking for more samples."""
+        compiled = compile_conditions(conds or [])
+        if self._wait_start is None:
+            self._wait_start = self.samplenum
+        if self._advance(compiled, self._wait_start):
+            self._wait_start = None
+            return self._sample_bits(self.last_sample)
+        if self.ended:
+            self._finish()
+        return None
+
+    def wait(self, conds=[]):
+        compiled = compile_conditions(conds or [])
+        wait_start = self.samplenum
+        while not self._advance(compiled, wait_start):
+            if self.ended or self.need_data is None:
+                self._finish()
+                raise EOFError()
+            self.need_data()
+        return self._sample_bits(self.last_sample)
+
+
+class _Aborted(BaseException):
+    """Unwinds a decoder thread whose session was abandoned."""
+
+
+Record = collections.namedtuple(
+    "Record", ("decoder", "startsample", "endsample", "data")
+)
+
+
+class _RecordOutput(Output):
+    data_classes = ()
+
+    def __init__(self):
+        self.records = []
+
+    def output(self, source, startsample, endsample, data):
+        self.records.append(Record(source.id, startsample, endsample, data))
+
+
+class DecoderSession:
+    """Run a decoder stack over samples fed to it a block at a time.
+
+    Without an output, feed() and close() return the Records the decoders put.
+    abort() abandons a session that won't be closed.
+    """
+
+    def __init__(
+        self,
+        decoders,
+        logic_channels,
+        *,
+        samplerate=0,
+        output=None,
+        output_type=OUTPUT_ANN,
+        annotations=None,
+        initial_state=None,
+    ):
+        self.input = StreamInput(logic_channels, samplerate, initial_state)
+        self.output = output if output is not None else _RecordOutput()
+        self.decoders = decoders
+        self.output_type = output_type
+        self.annotations = annotations
+        self.finished = False
+        self._generator = None
+        self._thread = None
+        self._error = None
+        self._aborted = False
+        if decoders and inspect.isgeneratorfunction(decoders[0]["cls"].decode):
+            self._start_generator()
+        else:
+            self._start_thread()
+
+    def _records(self):
+        if not isinstance(self.output, _RecordOutput):
+            return []
+        records = self.output.records
+        self.output.records = []
+        return records
+
+    def feed(self, block):
+        """Decode a block of samples and return the records it produced."""
+        if self.input.ended:
+            raise ValueError("Can't feed a closed session.")
+        self.input.push(block)
+        self._resume()
+        return self._records()
+
+    def close(self):
+        """Decode the rest of the stream, stop the decoders and return the records."""
+        if not self.input.ended:
+            self.input.end()
+            self._resume()
+        return self._records()
+
+    def abort(self):
+        """Abandon the stream and release the decoder thread.
+
+        The rest of the stream isn't decoded and the decoders and output aren't
+        stopped. The session can't be used afterwards.
+        """
+        self.input.end()
+        if self.finished:
+            return
+        if self._generator is not None:
+            self._generator.close()
+            self._generator = None
+        elif self._thread is not None:
+            self._aborted = True
+            self._turn.release()
+            self._done.acquire()
+            self._thread.join()
+            self._thread = None
+            self._error = None
+        self.finished = True
+
+    def _resume(self):
+        if self._generator is not None:
+            self._resume_generator()
+        elif self._thread is not None:
+            self._resume_thread()
+
+    # Generator decoders are stepped from feed() and close().
+    def _start_generator(self):
+        self._all_decoders = start_decoders(
+            self.input,
+            self.output,
+            self.decoders,
+            self.output_type,
+            annotations=self.annotations,
+        )
+        self._first_decoder = self._all_decoders[0]
+        self._first_decoder.input = self.input
+        self._generator = self._first_decoder.decode()
+        self._conds = None
+        self._step_generator(None)
+
+    def _step_generator(self, pins):
+        try:
+            if pins is None:
+                self._conds = next(self._generator)
+            else:
+                self._conds = self._generator.send(
+                    self._first_decoder._decoder_pins(pins)
+                )
+        except StopIteration:
+            self._generator.close()
+            self._generator = None
+
+    def _resume_generator(self):
+        while self._generator is not None:
+            pins = self.input.poll(self._first_decoder._data_conditions(self._conds))
+            if pins is None:
+                break
+            self._step_generator(pins)
+        if self.input.ended and not self.finished:
+            if self._generator is not None:
+                self._generator.close()
+                self._generator = None
+            self.input._finish()
+            stop_decoders(self._all_decoders, self.output)
+            self.finished = True
+
+    # Other decoders run on a thread that takes turns with the caller.
+    def _start_thread(self):
+        self._turn = threading.Semaphore(0)
+        self._done = threading.Semaphore(0)
+        self.input.need_data = self._need_data
+        self._thread = threading.Thread(
+            target=self._run, name="pysigrok-decoder", daemon=True
+        )
+        self._thread.start()
+        self._wait_for_thread()
+
+    def _run(self):
+        try:
+            run_decoders(
+                self.input,
+                self.output,
+                self.decoders,
+                output_type=self.output_type,
+                annotations=self.annotations,
+            )
+        except BaseException as e:
+            self._error = e
+        finally:
+            self.finished = True
+            self._done.release()
+
+    def _need_data(self):
+        """Called on the decoder thread when the pushed samples run out."""
+        self._done.release()
+        self._turn.acquire()
+        if self._aborted:
+            raise _Aborted()
+
+    def _resume_thread(self):
+        if self.finished:
+            return
+        self._turn.release()
+        self._wait_for_thread()
+
+    def _wait_for_thread(self):
+        self._done.acquire()
+        if self.finished:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
@@ -0,0 +1,194 @@
+"""Logic captures stored as lists of transitions.
+
+A transitions file is a zip like srzip. Instead of one word per sample it
+stores the sample number of every change of the logic channels and the value
+they change to, so mostly idle captures stay small however long they are.
+Conditions are evaluated once per transition so decoding takes time
+proportional to the number of edges. Analog channels aren't stored.
+
+Convert a capture by using it as the input and this as the output format, or
+the other way around:
+
+    pysigrok-cli -i capture.sr -o capture.srt -O transitions
+"""
+import array
+import configparser
+import io
+import zipfile
+from os import PathLike
+from typing import IO, Union
+
+from . import __version__
+from .output import Output
+from .runs import LogicRuns, LogicTransitions
+from .srzip import (
+    little_endian,
+    open_output_zip,
+    parse_samplerate,
+    samplerate_string,
+)
+from .stream import StreamInput
+
+VERSION = 1
+
+# Transitions handed to the decoders at a time.
+BATCH_TRANSITIONS = 1 << 16
+
+
+def _value_typecode(unitsize: int) -> str:
+    """Return the narrowest array typecode that holds unitsize byte values."""
+    for typecode in "BHIQ":
+        if array.array(typecode).itemsize >= unitsize:
+            return typecode
+    raise ValueError(f"Unsupported unitsize {unitsize}.")
+
+
+class TransitionsInput(StreamInput):
+    """Reads a transitions file and decodes it one transition at a time."""
+
+    name = "transitions"
+    desc = "logic transitions with their sample numbers"
+
+    def __init__(self, file: Union[str, PathLike[str], IO[bytes]], initial_state=None):
+        with zipfile.ZipFile(file) as zip_file:
+            version = int(zip_file.read("version").decode("ascii"))
+            if version != VERSION:
+                raise ValueError(f"Unsupported transitions file version {version}.")
+            metadata = configparser.ConfigParser()
+            metadata.read_string(zip_file.read("metadata").decode("ascii"))
+            unitsize = int(metadata.get("device 1", "unitsize"))
+            samplenums = array.array("Q")
+            samplenums.frombytes(zip_file.read("samplenums"))
+            values = array.array(_value_typecode(unitsize))
+            values.frombytes(zip_file.read("values"))
+        total_logic = int(metadata.get("device 1", "total probes", fallback="0"))
+        logic_channels = [
+            metadata.get("device 1", f"probe{i + 1}") for i in range(total_logic)
+        ]
+        super().__init__(
+            logic_channels,
+            parse_samplerate(metadata.get("device 1", "samplerate", fallback="0")),
+            initial_state,
+        )
+        self.unitsize = unitsize
+
+        transitions = LogicTransitions(int(metadata.get("device 1", "start sample")))
+        transitions.samplenums = little_endian(samplenums)
+        transitions.values = array.array("Q", little_endian(values))
+        transitions.end = int(metadata.get("device 1", "end sample"))
+        self.transitions = transitions
+        self.samplenum = transitions.start - 1
+        # Next sample to push and the sample the input ends at.
+        self._position = transitions.start
+        self._end = transitions.end
+        self.need_data = self._push_transitions
+
+    def _push_transitions(self):
+        """Push the next batch of transitions or end the input at the end."""
+        if self._position >= self._end:
+            self.end()
+            return
+        transitions = self.transitions
+        last = transitions.find(self._position) + BATCH_TRANSITIONS
+        end = self._end
+        if last < len(transitions):
+            end = min(end, transitions.samplenums[last])
+        self.push(transitions.runs(self._position, end))
+        self._position = end
+
+    def seek(self, start, end=None):
+        """Decode from sample start up to, but not including, sample end.
+
+        Sample numbers stay relative to the start of the capture and the value
+        before start is known, so a change on sample start is an edge just like
+        when decoding the whole capture. Call before decoding.
+        """
+        transitions = self.transitions
+        if (
+            not transitions.start <= start < transitions.end
+            or end is not None
+            and end <= start
+        ):
+            raise ValueError(
+                f"Can't decode samples {start} to {end} of a capture with "
+                f"{transitions.end}."
+            )
+        if end is None or end > transitions.end:
+            end = transitions.end
+        self._pending.clear()
+        self._pending_samples = 0
+        self._position = start
+        self._end = end
+        self.samplenum = start - 1
+        if start > transitions.start:
+            self.last_sample = transitions.value_at(start - 1)
+            self.start_samplenum = start
+
+
+class TransitionsOutput(Output):
+    """Writes the logic samples of the input as a transitions file."""
+
+    name = "transitions"
+    desc = "logic transitions with their sample numbers"
+    data_classes = ("logic",)
+
+    def __init__(
+        self,
+        file: Union[str, PathLike[str], IO[bytes]],
+        driver,
+        logic_channels=[],
+        analog_channels=[],
+        decoders=[],
+        *,
+        compression="deflated",
+        level=None,
+    ):
+        super().__init__()
+        if decoders:
+            raise NotImplementedError(
+                "Annotations can't be saved into transitions files."
+            )
+        self.zip = open_output_zip(file, compression, level)
+        self.driver = driver
+        self.logic_channels = list(logic_channels)
+        self.unitsize = len(self.logic_channels) // 8 + 1
+        self.transitions = None
+
+    def output(self, source, startsample, endsample, data):
+        # Only output data from the input driver.
+        if source != self.driver or data[0] != "logic":
+            return
+        if self.transitions is None:
+            self.transitions = LogicTransitions(startsample)
+        runs = data[1]
+        if isinstance(runs, LogicRuns):
+            self.transitions.extend(runs)
+        else:
+            self.transitions.append(runs, endsample - startsample)
+
+    def stop(self):
+        transitions = self.transitions
+        if transitions is None:
+            transitions = LogicTransitions()
+        self.zip.writestr("version", str(VERSION))
+        metadata = configparser.ConfigParser()
+        metadata.add_section("global")
+        metadata.set("global", "pysigrok version", __version__)
+        metadata.add_section("device 1")
+        metadata.set("device 1", "driver", self.driver.name)
+        metadata.set(
+            "device 1", "samplerate", samplerate_string(self.driver.samplerate)
+        )
+        metadata.set("device 1", "unitsize", str(self.unitsize))
+        metadata.set("device 1", "total probes", str(len(self.logic_channels)))
+        for i, channelname in enumerate(self.logic_channels):
+            metadata.set("device 1", f"probe{i + 1:d}", channelname)
+        metadata.set("device 1", "start sample", str(transitions.start))
+        metadata.set("device 1", "end sample", str(transitions.end))
+        with self.zip.open("metadata", "w") as f:
+            metadata.write(io.TextIOWrapper(f))
+
+        values = array.array(_value_typecode(self.unitsize), transitions.values)
+        for name, data in (("samplenums", transitions.samplenums), ("values", values)):
+            self.zip.writestr(name, memoryview(little_endian(data)).cast("B"))
+        self.zip.close()
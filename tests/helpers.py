@@ -0,0 +1,328 @@
+"""Captures, decoders and reference implementations shared by the tests.
+
+Optimized paths are checked against ReferenceInput, which decodes a plain list
+of sample values with the original one-sample-at-a-time wait() loop.
+"""
+import configparser
+import contextlib
+import io
+import random
+import zipfile
+
+import sigrokdecode as srd
+from sigrokdecode import srzip
+from sigrokdecode.input import Input
+from sigrokdecode.output import Output
+from sigrokdecode.runs import LogicRuns
+
+
+class Device:
+    name = "tests"
+    samplerate = 1000000
+
+
+@contextlib.contextmanager
+def chunk_size(size):
+    """Make SrZipOutput write chunks of size bytes."""
+    old = srzip.CHUNK_SIZE
+    srzip.CHUNK_SIZE = size
+    try:
+        yield
+    finally:
+        srzip.CHUNK_SIZE = old
+
+
+def random_runs(seed, channels, count=300):
+    """Idle stretches alternating with bursts of changes on a few channels."""
+    rng = random.Random(seed)
+    runs = LogicRuns()
+    value = 0
+    for _ in range(count):
+        if rng.random() < 0.3:
+            runs.append(value, rng.randrange(1, 5000))
+            continue
+        busy = rng.sample(range(channels), rng.randint(1, min(3, channels)))
+        for _ in range(rng.randrange(1, 30)):
+            for bit in busy:
+                if rng.random() < 0.6:
+                    value ^= 1 << bit
+            runs.append(value, rng.randrange(1, 12))
+    return runs
+
+
+def expand(runs):
+    """Return runs as a list with one value per sample."""
+    values = []
+    for value, length in runs:
+        values.extend([value] * length)
+    return values
+
+
+def write_capture(file, runs, channels, *, analog=(), chunk=None, **options):
+    """Write logic runs on channels D0... and analog arrays as an srzip capture."""
+    device = Device()
+    with chunk_size(chunk or srzip.CHUNK_SIZE):
+        output = srzip.SrZipOutput(
+            file,
+            device,
+            logic_channels=[f"D{i}" for i in range(channels)],
+            analog_channels=[f"A{i}" for i in range(len(analog))],
+            **options,
+        )
+        output.output(device, 0, runs.samples, ["logic", runs])
+        if analog:
+            output.output(device, 0, len(analog[0]), ["analog_block", *analog])
+        output.stop()
+
+
+def write_raw_capture(
+    file,
+    values,
+    unitsize,
+    probes,
+    *,
+    chunk_samples=None,
+    single_file=False,
+    compression=zipfile.ZIP_DEFLATED,
+):
+    """Write raw sample values as srzip the way other sigrok tools may.
+
+    probes maps raw bits to channel names. Bits without a name are unmapped.
+    """
+    typecode = srzip.TYPECODE[unitsize]
+    with zipfile.ZipFile(file, "w", compression=compression) as capture:
+        capture.writestr("version", "2")
+        metadata = configparser.ConfigParser()
+        metadata.add_section("device 1")
+        metadata.set("device 1", "samplerate", "1 MHz")
+        metadata.set("device 1", "unitsize", str(unitsize))
+        metadata.set("device 1", "total probes", str(max(probes) + 1))
+        for in_bit, name in probes.items():
+            metadata.set("device 1", f"probe{in_bit + 1}", name)
+        text = io.StringIO()
+        metadata.write(text)
+        capture.writestr("metadata", text.getvalue())
+        raw = srzip.array.array(typecode, values).tobytes()
+        if single_file:
+            capture.writestr("logic-1", raw)
+            return
+        stride = srzip.array.array(typecode).itemsize
+        chunk_bytes = (chunk_samples or len(values)) * stride
+        for i, start in enumerate(range(0, len(raw), chunk_bytes)):
+            capture.writestr(f"logic-1-{i + 1}", raw[start : start + chunk_bytes])
+
+
+def map_values(values, probes):
+    """Remap raw sample values to channel order like the inputs do."""
+    mapping = [(in_bit, out_bit) for out_bit, in_bit in enumerate(sorted(probes))]
+    mapped = []
+    for value in values:
+        sample = 0
+        for in_bit, out_bit in mapping:
+            if value & (1 << in_bit):
+                sample |= 1 << out_bit
+        mapped.append(sample)
+    return mapped
+
+
+def cond_matches(cond, last_sample, current_sample):
+    """The original per-channel condition check."""
+    for channel in cond:
+        if channel == "skip":
+            return cond["skip"] == 0
+        state = cond[channel]
+        mask = 1 << channel
+        last_value = last_sample & mask
+        value = current_sample & mask
+        if (
+            (state == "l" and value != 0)
+            or (state == "h" and value == 0)
+            or (state == "r" and not (last_value == 0 and value != 0))
+            or (state == "f" and not (last_value != 0 and value == 0))
+            or (state == "e" and last_value == value)
+            or (state == "s" and last_value != value)
+        ):
+            return False
+    return True
+
+
+class ReferenceInput(Input):
+    """The original SrZipInput.wait() loop over a list of mapped sample values."""
+
+    def __init__(self, values, logic_channels, initial_state=None):
+        super().__init__()
+        self.values = values
+        self.logic_channels = list(logic_channels)
+        self.analog_channels = []
+        self.samplerate = Device.samplerate
+        self.unitsize = len(self.logic_channels) // 8 + 1
+        self.samplenum = -1
+        self.start_samplenum = None
+        self.matched = None
+        self.last_sample = None
+        if initial_state:
+            self.last_sample = 0
+            for channel in initial_state:
+                self.last_sample |= initial_state[channel] << channel
+
+    def seek(self, start, end=None):
+        """Decode values[start:end] knowing the value before start."""
+        self.values = self.values[:end]
+        self.samplenum = start - 1
+        if start > 0:
+            self.last_sample = self.values[start - 1]
+            self.start_samplenum = start
+
+    def wait(self, conds=[]):
+        if conds is None:
+            conds = []
+        self.matched = [False] * (len(conds) if conds else 1)
+        while not any(self.matched):
+            self.samplenum += 1
+            if self.samplenum >= len(self.values):
+                self.put(
+                    self.start_samplenum,
+                    self.samplenum,
+                    srd.OUTPUT_PYTHON,
+                    ["logic", self.last_sample],
+                )
+                raise EOFError()
+            sample = self.values[self.samplenum]
+            if self.last_sample is None:
+                self.last_sample = sample
+                self.start_samplenum = self.samplenum
+            if self.last_sample != sample:
+                self.put(
+                    self.start_samplenum,
+                    self.samplenum,
+                    srd.OUTPUT_PYTHON,
+                    ["logic", self.last_sample],
+                )
+                self.start_samplenum = self.samplenum
+            if len(conds) == 0:
+                self.matched[0] = True
+            for i, cond in enumerate(conds):
+                if "skip" in cond:
+                    cond["skip"] -= 1
+                    self.matched[i] = cond["skip"] <= 0
+                    continue
+                self.matched[i] = cond_matches(cond, self.last_sample, sample)
+            self.last_sample = sample
+        return tuple((sample >> b) & 0x1 for b in range(self.unitsize * 8))
+
+
+def random_conditions(rng, channels):
+    """Return a random list of wait() conditions on the first channels."""
+    conds = []
+    for _ in range(rng.randint(1, 3)):
+        r = rng.random()
+        if r < 0.15:
+            conds.append({"skip": rng.choice([0, 1, 2, 5, 30, 500, 5000])})
+            continue
+        cond = {}
+        for channel in rng.sample(range(channels), rng.randint(1, min(2, channels))):
+            cond[channel] = rng.choice("lhrfes" if r > 0.3 else "rfe")
+        conds.append(cond)
+    return conds
+
+
+def random_waiter(channels, seed, generator=False):
+    """Return a decoder class that waits on random conditions and logs them.
+
+    With generator set its decode() yields the conditions instead of calling
+    wait().
+    """
+
+    class RandomWaiter(srd.Decoder):
+        id = "waiter"
+        name = "Waiter"
+        api_version = 3
+        options = ()
+        annotations = (("wait", "Wait"),)
+
+        def reset(self):
+            self.log = []
+
+        def start(self):
+            self.out_ann = self.register(srd.OUTPUT_ANN)
+
+        def waited(self, pins):
+            self.log.append((self.samplenum, pins, tuple(self.matched)))
+            if len(self.log) % 7 == 0:
+                self.put(
+                    self.samplenum, self.samplenum + 1, self.out_ann, [0, [str(pins)]]
+                )
+
+        def decode(self):
+            rng = random.Random(seed)
+            while True:
+                self.waited(self.wait(random_conditions(rng, channels)))
+
+    class GeneratorWaiter(RandomWaiter):
+        def decode(self):
+            rng = random.Random(seed)
+            while True:
+                pins = yield random_conditions(rng, channels)
+                self.waited(pins)
+
+    cls = GeneratorWaiter if generator else RandomWaiter
+    cls.channels = tuple(
+        {"id": f"c{i}", "name": f"C{i}", "desc": ""} for i in range(channels)
+    )
+    return cls
+
+
+class Recorder(Output):
+    """Records what it is handed with logic runs merged and analog expanded."""
+
+    def __init__(self, data_classes=("logic",)):
+        self.data_classes = data_classes
+        self.items = []
+
+    def _logic(self, start, end, value):
+        items = self.items
+        if items and items[-1][0] == "logic" and items[-1][2] == start:
+            if items[-1][3] == value:
+                items[-1] = ("logic", items[-1][1], end, value)
+                return
+        items.append(("logic", start, end, value))
+
+    def output(self, source, startsample, endsample, data):
+        if data[0] == "logic":
+            if isinstance(data[1], LogicRuns):
+                for value, length in data[1]:
+                    self._logic(startsample, startsample + length, value)
+                    startsample += length
+            elif endsample > startsample:
+                self._logic(startsample, endsample, data[1])
+        elif data[0] == "analog":
+            values = tuple(round(v, 5) for v in data[1:])
+            self.items.append(("analog", startsample, values))
+        elif data[0] == "analog_block":
+            for i in range(endsample - startsample):
+                values = tuple(round(c[i], 5) for c in data[1:])
+                self.items.append(("analog", startsample + i, values))
+        else:
+            self.items.append((source.id, startsample, endsample, repr(data)))
+
+
+def decode(input_, decoder_cls=None, pin_mapping=None, data_classes=("logic",)):
+    """Decode input_ and return the decoder's log and what the output recorded."""
+    output = Recorder(data_classes)
+    decoders = []
+    annotations = None
+    if decoder_cls is not None:
+        decoders = [
+            {
+                "id": decoder_cls.id,
+                "cls": decoder_cls,
+                "options": {},
+                "pin_mapping": pin_mapping,
+            }
+        ]
+        annotations = {decoder_cls.id: None}
+    all_decoders = srd.start_decoders(input_, output, decoders, annotations=annotations)
+    (all_decoders[0] if all_decoders else output).run(input_)
+    srd.stop_decoders(all_decoders, output)
+    log = all_decoders[0].log if all_decoders else None
+    return log, output.items
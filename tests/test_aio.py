@@ -0,0 +1,133 @@
+import asyncio
+import threading
+
+import pytest
+
+import sigrokdecode as srd
+from sigrokdecode.aio import DecodePipeline, decode_stream
+
+from .helpers import ReferenceInput, decode, expand, random_runs, random_waiter
+
+CHANNELS = 4
+PIN_MAPPING = {f"c{i}": i for i in range(CHANNELS)}
+NAMES = [f"D{i}" for i in range(CHANNELS)]
+
+
+def waiter_stack(decoder):
+    return [{"id": "waiter", "cls": decoder, "options": {}, "pin_mapping": PIN_MAPPING}]
+
+
+def expected_records(values, seed):
+    _, items = decode(
+        ReferenceInput(values, NAMES), random_waiter(CHANNELS, seed), PIN_MAPPING
+    )
+    return [item for item in items if item[0] == "waiter"]
+
+
+def as_items(records):
+    return [(r.decoder, r.startsample, r.endsample, repr(r.data)) for r in records]
+
+
+async def blocks(values, size):
+    for position in range(0, len(values), size):
+        await asyncio.sleep(0)
+        yield values[position : position + size]
+
+
+async def collect(values, seed, size):
+    decoders = waiter_stack(random_waiter(CHANNELS, seed))
+    return [
+        record async for record in decode_stream(blocks(values, size), decoders, NAMES)
+    ]
+
+
+def test_interleaved_streams_match_reference():
+    streams = [(expand(random_runs(seed, CHANNELS)), seed) for seed in range(3)]
+
+    async def main():
+        return await asyncio.gather(
+            *(collect(values, seed, 777 * (seed + 1)) for values, seed in streams)
+        )
+
+    results = asyncio.run(main())
+    for (values, seed), records in zip(streams, results):
+        assert as_items(records) == expected_records(values, seed)
+
+
+class Failing(srd.Decoder):
+    id = "failing"
+    api_version = 3
+    channels = ({"id": "d", "name": "D", "desc": ""},)
+    annotations = ()
+
+    def reset(self):
+        pass
+
+    def start(self):
+        pass
+
+    def decode(self):
+        self.wait({"skip": 100})
+        raise RuntimeError("bad frame")
+
+
+def test_decoder_errors_reach_the_iterator():
+    async def main():
+        pipeline = DecodePipeline(
+            [{"id": "failing", "cls": Failing, "options": {}, "pin_mapping": {}}],
+            NAMES,
+        )
+        with pytest.raises(RuntimeError, match="bad frame"):
+            await pipeline.feed([0] * 1000)
+        with pytest.raises(RuntimeError, match="bad frame"):
+            async for _ in pipeline:
+                pass
+
+    asyncio.run(main())
+
+
+def decoder_threads():
+    return [t for t in threading.enumerate() if t.name == "pysigrok-decoder"]
+
+
+def test_source_errors_end_the_iterator():
+    values = expand(random_runs(2, CHANNELS, count=50))
+    unretrieved = []
+
+    async def failing_source():
+        yield values[:1000]
+        await asyncio.sleep(0)
+        raise ConnectionError("socket dropped")
+
+    async def main():
+        asyncio.get_running_loop().set_exception_handler(
+            lambda loop, context: unretrieved.append(context)
+        )
+        decoders = waiter_stack(random_waiter(CHANNELS, 2))
+        records = []
+        with pytest.raises(ConnectionError, match="socket dropped"):
+            async for record in decode_stream(failing_source(), decoders, NAMES):
+                records.append(record)
+        return records
+
+    records = asyncio.run(asyncio.wait_for(main(), 10))
+    assert as_items(records) == [
+        item for item in expected_records(values, 2) if item[2] <= 1000
+    ]
+    assert not decoder_threads()
+    assert not unretrieved
+
+
+def test_stopping_early_releases_the_decoder_thread():
+    values = expand(random_runs(3, CHANNELS))
+
+    async def main():
+        decoders = waiter_stack(random_waiter(CHANNELS, 3))
+        stream = decode_stream(blocks(values, 500), decoders, NAMES)
+        async for _ in stream:
+            assert decoder_threads()
+            break
+        await stream.aclose()
+
+    asyncio.run(asyncio.wait_for(main(), 10))
+    assert not decoder_threads()
@@ -0,0 +1,70 @@
+import io
+
+import pytest
+
+import sigrokdecode as srd
+from sigrokdecode.batch import run_batch, run_job
+from sigrokdecode.bits import BitsOutput
+from sigrokdecode.srzip import SrZipInput
+
+from .helpers import random_runs, write_capture
+
+
+@pytest.fixture
+def capture(tmp_path, monkeypatch):
+    # Keep the plugin metadata cache out of the home directory.
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    path = tmp_path / "capture.sr"
+    write_capture(path, random_runs(13, 3, count=50), 3)
+    return path
+
+
+def test_batch_output_matches_a_direct_run(tmp_path, capture):
+    jobs = [
+        {
+            "input": str(capture),
+            "output": str(tmp_path / f"{width}.txt"),
+            "output_format": f"bits:width={width}",
+        }
+        for width in (64, 100)
+    ]
+    reports = run_batch(jobs, workers=2)
+    assert [report["status"] for report in reports] == ["ok", "ok"]
+    for job, width in zip(jobs, (64, 100)):
+        input_ = SrZipInput(capture)
+        expected = io.BytesIO()
+        output = BitsOutput(expected, input_, input_.logic_channels, width=str(width))
+        srd.run_decoders(input_, output)
+        with open(job["output"], "rb") as f:
+            assert f.read() == expected.getvalue()
+
+
+def test_failed_jobs_leave_no_output(tmp_path, capture):
+    output = tmp_path / "failed.sr"
+    jobs = [
+        {
+            "input": str(capture),
+            "output": str(output),
+            "output_format": "srzip:compression=bogus",
+        }
+    ]
+    (report,) = run_batch(jobs, workers=1)
+    assert report["status"] == "error"
+    assert "Unknown compression" in report["error"]
+    assert not output.exists()
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_jobs_close_their_input(tmp_path, capture, monkeypatch):
+    closed = []
+    monkeypatch.setattr(SrZipInput, "close", lambda self: closed.append(self))
+    job = {
+        "input": str(capture),
+        "output": str(tmp_path / "failed.sr"),
+        "output_format": "srzip:compression=bogus",
+    }
+    with pytest.raises(ValueError):
+        run_job(job)
+    job["output_format"] = "bits"
+    run_job(job)
+    assert len(closed) == 2
@@ -0,0 +1,77 @@
+import pytest
+
+import sigrokdecode as srd
+from benchmarks.captures import WAVEFORMS, SyntheticDevice, capture_path
+from benchmarks.suite import BENCHMARKS, EdgeCounter, ToyUart, run_benchmark
+
+from .helpers import ReferenceInput, Recorder
+
+SAMPLES = 20000
+
+
+def values_of(device):
+    values = []
+    for block in device.logic_blocks(SAMPLES):
+        for value, length in block:
+            values.extend([value] * length)
+    return values
+
+
+def reference_run(device, cls, annotations=None):
+    """Run a benchmark decoder over the original per-sample loop."""
+    input_ = ReferenceInput(values_of(device), device.logic_channels)
+    output = Recorder(())
+    decoders = srd.start_decoders(
+        input_,
+        output,
+        [
+            {
+                "id": cls.id,
+                "cls": cls,
+                "options": {},
+                "pin_mapping": {cls.channels[0]["id"]: 0},
+            }
+        ],
+        annotations=annotations,
+    )
+    decoders[0].run(input_)
+    srd.stop_decoders(decoders, output)
+    return decoders[0], output.items
+
+
+@pytest.mark.parametrize("waveform", list(WAVEFORMS))
+@pytest.mark.parametrize("unitsize", [1, 2])
+def test_logic_blocks_cover_the_samples(waveform, unitsize):
+    device = SyntheticDevice(waveform, unitsize)
+    values = values_of(device)
+    assert len(values) == SAMPLES
+    assert max(values) < 1 << len(device.logic_channels)
+
+
+@pytest.mark.parametrize(
+    "name,waveform",
+    [
+        (name, waveform)
+        for name, (_, waveforms) in BENCHMARKS.items()
+        for waveform in waveforms or (None,)
+    ],
+)
+def test_benchmarks_match_reference(tmp_path, name, waveform):
+    device = path = None
+    if waveform is not None:
+        device = SyntheticDevice(waveform, 2)
+        path = capture_path(str(tmp_path), waveform, SAMPLES, 2)
+    result = run_benchmark(name, path, device, SAMPLES, repeat=1)
+    assert result["benchmark"] == name
+    assert result["samples"] == SAMPLES
+
+    if name.startswith("wait_edges"):
+        decoder, _ = reference_run(device, EdgeCounter)
+        assert result["edges"] == decoder.edges
+    elif name == "srzip_read":
+        values = values_of(device)
+        changes = sum(1 for a, b in zip(values, values[1:]) if a != b)
+        assert result["puts"] == changes + 1
+    elif name == "decode_uart":
+        _, items = reference_run(device, ToyUart)
+        assert result["annotations"] == len(items)
@@ -0,0 +1,128 @@
+import io
+import itertools
+
+import pytest
+
+from sigrokdecode.bits import BitsOutput
+from sigrokdecode.runs import LogicRuns
+
+from .helpers import Device, expand, random_runs
+
+CHANNELS = ["D0", "D1", "D2", "D3", "D4", "D5", "D6", "D7", "D8", "D9"]
+
+
+def reference_bits(values, logic_channels, width):
+    """The original BitsOutput, one character per sample and channel."""
+    out = io.StringIO()
+    lines = [[c, ":"] for c in logic_channels]
+    for s, value in enumerate(values):
+        if s % width == 0:
+            if s > 1:
+                print("\n".join(("".join(line) for line in lines)), file=out)
+            lines = [[c, ":"] for c in logic_channels]
+        for bit in range(len(logic_channels)):
+            lines[bit].append("1" if value & (1 << bit) else "0")
+        if s % 8 == 7:
+            for bit in range(len(logic_channels)):
+                lines[bit].append(" ")
+    print("\n".join(("".join(line) for line in lines)), file=out)
+    return out.getvalue().encode("utf-8")
+
+
+def render(puts, logic_channels, width):
+    file = io.BytesIO()
+    device = Device()
+    output = BitsOutput(file, device, logic_channels, width=str(width))
+    for start, end, value in puts:
+        output.output(device, start, end, ["logic", value])
+    output.stop()
+    return file.getvalue()
+
+
+def per_sample(runs):
+    return [(s, s + 1, value) for s, value in enumerate(expand(runs))]
+
+
+def by_run(runs):
+    puts = []
+    start = 0
+    for value, length in runs:
+        puts.append((start, start + length, value))
+        start += length
+    return puts
+
+
+def in_blocks(runs, size=1000):
+    runs = LogicRuns(runs)
+    puts = []
+    start = 0
+    while runs:
+        block = runs.take(size)
+        puts.append((start, start + block.samples, block))
+        start += block.samples
+    return puts
+
+
+@pytest.mark.parametrize("width", [8, 13, 64, 100])
+@pytest.mark.parametrize("channels", [1, 3, 10])
+def test_matches_reference(width, channels):
+    runs = LogicRuns()
+    for value, length in random_runs(channels * width, channels, count=40):
+        # Keep the reference quick.
+        runs.append(value, min(length, 300))
+    logic_channels = CHANNELS[:channels]
+    expected = reference_bits(expand(runs), logic_channels, width)
+    for puts in (per_sample(runs), by_run(runs), in_blocks(runs)):
+        assert render(puts, logic_channels, width) == expected
+
+
+@pytest.mark.parametrize("samples", [1, 7, 8, 64, 65, 128])
+def test_line_and_byte_boundaries(samples):
+    runs = LogicRuns((value & 0x3, 1) for value in range(samples))
+    expected = reference_bits(expand(runs), CHANNELS[:2], 64)
+    assert render(by_run(runs), CHANNELS[:2], 64) == expected
+
+
+def test_steady_lines_are_reused():
+    # Long idle stretches alternating between two values.
+    runs = LogicRuns(itertools.islice(itertools.cycle([(0, 640), (5, 6400)]), 6))
+    expected = reference_bits(expand(runs), CHANNELS[:3], 64)
+    assert render(in_blocks(runs, 333), CHANNELS[:3], 64) == expected
+
+
+def test_skips_logic_with_decoders():
+    file = io.BytesIO()
+    device = Device()
+    output = BitsOutput(file, device, CHANNELS[:1], decoders=["uart"])
+    output.output(device, 0, 100, ["logic", LogicRuns([(1, 100)])])
+    output.output(device, 10, 20, [0, ["Start"]])
+    output.stop()
+    assert file.getvalue() == b"Start\n"
+
+
+class Terminal(io.BytesIO):
+    def __init__(self, tty=True):
+        super().__init__()
+        self.tty = tty
+
+    def isatty(self):
+        return self.tty
+
+
+@pytest.mark.parametrize(
+    "file,flush,flushed",
+    [
+        (Terminal(), "auto", True),
+        (Terminal(tty=False), "auto", False),
+        (Terminal(tty=False), "true", True),
+        (Terminal(), "false", False),
+    ],
+)
+def test_annotations_are_flushed_to_terminals(file, flush, flushed):
+    device = Device()
+    output = BitsOutput(file, device, CHANNELS[:1], decoders=["uart"], flush=flush)
+    output.output(device, 10, 20, [0, ["Start"]])
+    output.output(device, 20, 30, [0, ["41"]])
+    assert file.getvalue() == (b"Start\n41\n" if flushed else b"")
+    output.stop()
+    assert file.getvalue() == b"Start\n41\n"
@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+from sigrokdecode.runs import LogicRuns
+from sigrokdecode.srzip import SrZipInput
+
+from .helpers import ReferenceInput, decode, expand, random_waiter, write_capture
+
+CHANNELS = 6
+NAMES = [f"D{i}" for i in range(CHANNELS)]
+PIN_MAPPING = {f"c{i}": i for i in range(3)}
+
+
+def sparse_runs(seed):
+    """Bursts on the decoded channels far apart, with D5 busy all along."""
+    rng = random.Random(seed)
+    runs = LogicRuns()
+    value = 0
+    for _ in range(40):
+        for _ in range(rng.randrange(20, 400)):
+            value ^= 1 << 5
+            runs.append(value, rng.randrange(5, 200))
+        for _ in range(rng.randrange(1, 20)):
+            value ^= 1 << rng.randrange(3)
+            runs.append(value, rng.randrange(1, 10))
+    return runs
+
+
+@pytest.mark.parametrize("data_classes", [(), ("logic",)])
+@pytest.mark.parametrize("seed", range(3))
+def test_skipping_matches_reference(tmp_path, data_classes, seed):
+    runs = sparse_runs(seed)
+    path = tmp_path / "capture.sr"
+    write_capture(path, runs, CHANNELS, chunk=2048)
+    decoder = random_waiter(3, seed)
+
+    expected = decode(
+        ReferenceInput(expand(runs), NAMES), decoder, PIN_MAPPING, data_classes
+    )
+    input_ = SrZipInput(path, index="true")
+    assert decode(input_, decoder, PIN_MAPPING, data_classes) == expected
+    chunks = len(input_.index())
+    if data_classes:
+        assert input_.chunks_read == chunks
+    else:
+        assert input_.chunks_read < chunks
+
+
+def test_cached_index_is_used_by_default(tmp_path):
+    runs = sparse_runs(5)
+    path = tmp_path / "capture.sr"
+    write_capture(path, runs, CHANNELS, chunk=2048)
+    SrZipInput(path, index="true")
+    decoder = random_waiter(3, 5)
+    expected = decode(SrZipInput(path, index="false"), decoder, PIN_MAPPING, ())
+    input_ = SrZipInput(path)
+    assert decode(input_, decoder, PIN_MAPPING, ()) == expected
+    assert input_.chunks_read < len(input_.index())
@@ -0,0 +1,101 @@
+import io
+
+import pytest
+
+import sigrokdecode as srd
+from sigrokdecode.columnar import ColumnarOutput, read_annotations
+from sigrokdecode.srzip import SrZipInput
+
+from .helpers import Recorder, random_runs, write_capture
+
+
+class Edges(srd.Decoder):
+    """Annotates edges on its channel and passes them up the stack."""
+
+    id = "edges"
+    name = "Edges"
+    api_version = 3
+    channels = ({"id": "d", "name": "D", "desc": ""},)
+    options = ()
+    annotations = (("rise", "Rise"), ("fall", "Fall"), ("note", "Note"))
+    annotation_rows = (("rises", "Rises", (0,)), ("falls", "Falls", (1,)))
+
+    def reset(self):
+        pass
+
+    def start(self):
+        self.out_ann = self.register(srd.OUTPUT_ANN)
+        self.out_python = self.register(srd.OUTPUT_PYTHON)
+
+    def decode(self):
+        while True:
+            (pin,) = self.wait({0: "e"})
+            texts = ["Rise", "R"] if pin else ["Fall", "F"]
+            self.put(self.samplenum, self.samplenum + 1, self.out_ann, [1 - pin, texts])
+            if self.samplenum % 3 == 0:
+                note = [f"at {self.samplenum}"]
+                self.put(self.samplenum, self.samplenum + 2, self.out_ann, [2, note])
+            self.put(self.samplenum, self.samplenum + 1, self.out_python, pin)
+
+
+class Tally(srd.Decoder):
+    """Stacked on Edges. Annotates the number of rising edges so far."""
+
+    id = "tally"
+    name = "Tally"
+    api_version = 3
+    inputs = ["edges"]
+    options = ()
+    annotations = (("count", "Count"),)
+
+    def reset(self):
+        self.rises = 0
+
+    def start(self):
+        self.out_ann = self.register(srd.OUTPUT_ANN)
+
+    def decode(self, startsample, endsample, data):
+        self.rises += data
+        self.put(startsample, endsample, self.out_ann, [0, [str(self.rises)]])
+
+
+DECODERS = [
+    {"id": "edges", "cls": Edges, "options": {}, "pin_mapping": {"d": 1}},
+    {"id": "tally", "cls": Tally, "options": {}, "pin_mapping": {}},
+]
+
+
+@pytest.mark.parametrize("block", [1, 7, 1 << 16])
+def test_columns_match_the_annotations(tmp_path, block):
+    path = tmp_path / "capture.sr"
+    write_capture(path, random_runs(16, 3, count=80), 3)
+
+    recorder = Recorder(())
+    srd.run_decoders(SrZipInput(path), recorder, DECODERS)
+    expected = []
+    rows = []
+    for decoder_id, start, end, data in recorder.items:
+        ann_class, texts = eval(data)
+        cls = Edges if decoder_id == "edges" else Tally
+        expected.append(
+            (decoder_id, start, end, cls.annotations[ann_class][0], tuple(texts))
+        )
+        rows.append(ann_class if decoder_id == "edges" and ann_class < 2 else -1)
+    assert len(expected) > 7
+
+    file = io.BytesIO()
+    output = ColumnarOutput(file, None, block=str(block))
+    srd.run_decoders(SrZipInput(path), output, DECODERS)
+    file.seek(0)
+    annotations = read_annotations(file)
+
+    assert list(annotations) == expected
+    assert list(annotations.row) == rows
+    assert [info["id"] for info in annotations.decoders] == ["edges", "tally"]
+    # Each distinct list of strings is stored once.
+    assert sorted(annotations.texts) == sorted({item[4] for item in expected})
+
+
+def test_rejects_other_files():
+    with pytest.raises(ValueError):
+        read_annotations(io.BytesIO(b"PK\x03\x04 not annotations"))
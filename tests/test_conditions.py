@@ -0,0 +1,66 @@
+import itertools
+
+import pytest
+
+import sigrokdecode as srd
+
+from . import helpers
+
+
+def test_cond_matches_reference():
+    states = [None, "l", "h", "r", "f", "e", "s"]
+    for cond_states in itertools.product(states, repeat=3):
+        cond = {
+            channel: state
+            for channel, state in enumerate(cond_states)
+            if state is not None
+        }
+        for last_sample, current_sample in itertools.product(range(8), repeat=2):
+            assert srd.cond_matches(
+                cond, last_sample, current_sample
+            ) == helpers.cond_matches(cond, last_sample, current_sample), (
+                cond,
+                last_sample,
+                current_sample,
+            )
+
+
+@pytest.mark.parametrize("skip", [0, 1, 2, 5])
+def test_skip_matches_reference(skip):
+    assert srd.cond_matches({"skip": skip}, 0, 0) == helpers.cond_matches(
+        {"skip": skip}, 0, 0
+    )
+
+
+def test_compiled_conditions_are_cached():
+    conds = [{0: "r"}, {"skip": 3}]
+    assert srd.compile_conditions(conds) is srd.compile_conditions(
+        [{0: "r"}, {"skip": 3}]
+    )
+
+
+class SkipDecoder(srd.Decoder):
+    id = "skipper"
+    api_version = 3
+    channels = ({"id": "d0", "name": "D0", "desc": ""},)
+    annotations = ()
+
+    def reset(self):
+        self.log = []
+
+    def start(self):
+        pass
+
+    def decode(self):
+        while True:
+            self.wait([{"skip": 5}])
+            self.log.append(self.samplenum)
+
+
+def test_skip_counts_are_fresh_for_inputs_that_count_down():
+    # ReferenceInput counts skips down in the dicts it is handed.
+    values = [0] * 23
+    log, _ = helpers.decode(
+        helpers.ReferenceInput(values, ["D0"]), SkipDecoder, {"d0": 0}
+    )
+    assert log == [4, 9, 14, 19]
@@ -0,0 +1,85 @@
+import random
+
+import sigrokdecode as srd
+from sigrokdecode.input import Input
+
+
+class Annotator(srd.Decoder):
+    id = "annotator"
+    annotations = (("bit", "Bit"), ("byte", "Byte"), ("warning", "Warning"))
+    binary = (("raw", "Raw"), ("frames", "Frames"))
+
+
+FILTERS = {
+    srd.OUTPUT_ANN: [None, ("bit",), ("byte", "warning"), ()],
+    srd.OUTPUT_BINARY: [None, "raw", "frames"],
+}
+
+
+def reference_callbacks(decoder, output_id, data, callbacks):
+    """The original filter check of Decoder.put(), done on every call."""
+    wanted = []
+    for output_filter, cb in callbacks:
+        if output_filter is not None:
+            if output_id == srd.OUTPUT_ANN:
+                if decoder.annotations[data[0]][0] not in output_filter:
+                    continue
+            elif output_id == srd.OUTPUT_BINARY:
+                if decoder.binary[data[0]][0] != output_filter:
+                    continue
+        wanted.append(cb)
+    return wanted
+
+
+def test_decoder_put_matches_reference():
+    decoder = Annotator()
+    received = []
+    callbacks = {}
+    for output_id, filters in FILTERS.items():
+        callbacks[output_id] = []
+        for i, output_filter in enumerate(filters):
+
+            def cb(startsample, endsample, data, name=(output_id, i)):
+                received.append((name, startsample, data))
+
+            decoder.add_callback(output_id, output_filter, cb)
+            callbacks[output_id].append((output_filter, cb))
+
+    rng = random.Random(0)
+    expected = []
+    for samplenum in range(200):
+        output_id = rng.choice(list(FILTERS))
+        classes = decoder.annotations if output_id == srd.OUTPUT_ANN else decoder.binary
+        data = [rng.randrange(len(classes)), ["x"]]
+        for cb in reference_callbacks(decoder, output_id, data, callbacks[output_id]):
+            expected.append((cb.__defaults__[0], samplenum, data))
+        decoder.put(samplenum, samplenum + 1, output_id, data)
+    assert received == expected
+
+
+def test_decoder_without_callbacks_puts_nowhere():
+    Annotator().put(0, 1, srd.OUTPUT_ANN, [0, ["x"]])
+
+
+def test_input_put_filters_data_classes():
+    input_ = Input()
+    received = []
+    for output_filter in (None, ("logic",), ("analog",)):
+        input_.add_callback(
+            srd.OUTPUT_PYTHON,
+            output_filter,
+            lambda s, e, data, f=output_filter: received.append((f, data[0])),
+        )
+    for kind in ("logic", "analog", "analog_block", "logic"):
+        input_.put(0, 1, srd.OUTPUT_PYTHON, [kind])
+    assert received == [
+        (None, "logic"),
+        (("logic",), "logic"),
+        (None, "analog"),
+        (("analog",), "analog"),
+        (None, "analog_block"),
+        (("analog",), "analog_block"),
+        (None, "logic"),
+        (("logic",), "logic"),
+    ]
+    assert input_.wants("logic") and input_.wants("analog")
@@ -0,0 +1,135 @@
+import _thread
+import io
+import itertools
+import random
+import signal
+
+import pytest
+
+from sigrokdecode.live import BlockBuffer, LiveCapture
+from sigrokdecode.runs import LogicRuns
+from sigrokdecode.srzip import SrZipInput, SrZipOutput
+
+from .helpers import (
+    Recorder,
+    ReferenceInput,
+    decode,
+    expand,
+    random_runs,
+    random_waiter,
+)
+
+CHANNELS = 4
+PIN_MAPPING = {f"c{i}": i for i in range(CHANNELS)}
+NAMES = [f"D{i}" for i in range(CHANNELS)]
+
+
+class StreamingDriver:
+    name = "streaming"
+    samplerate = 1000000
+    logic_channels = NAMES
+
+    def __init__(self, values, seed, error=None):
+        self.values = values
+        self.seed = seed
+        self.error = error
+        self.stopped = False
+
+    def stream(self, push, samples=None, triggers={}, trigger_immediately=True):
+        rng = random.Random(self.seed)
+        position = 0
+        while position < len(self.values):
+            size = rng.choice([1, 3, 250, 2000, 9000])
+            block = self.values[position : position + size]
+            if rng.random() < 0.5:
+                block = LogicRuns((value, 1) for value in block)
+            if not push(block):
+                self.stopped = True
+                return
+            position += size
+        if self.error is not None:
+            raise self.error
+
+
+def waiter_stack(seed):
+    return [
+        {
+            "id": "waiter",
+            "cls": random_waiter(CHANNELS, seed),
+            "options": {},
+            "pin_mapping": PIN_MAPPING,
+        }
+    ]
+
+
+@pytest.mark.parametrize("buffer_samples", [500, 1 << 20])
+@pytest.mark.parametrize("seed", range(2))
+def test_live_capture_matches_reference(buffer_samples, seed):
+    values = expand(random_runs(seed, CHANNELS))
+    _, expected = decode(
+        ReferenceInput(values, NAMES), random_waiter(CHANNELS, seed), PIN_MAPPING
+    )
+
+    capture = LiveCapture(StreamingDriver(values, seed), buffer_samples)
+    output = Recorder()
+    capture.run(output, waiter_stack(seed), annotations={"waiter": None})
+    assert output.items == expected
+    stats = capture.buffer.stats()
+    assert stats["received_samples"] == len(values)
+    assert stats["dropped_samples"] == 0
+    if buffer_samples == 500:
+        assert stats["blocked"] > 0
+
+
+def test_driver_errors_are_raised():
+    values = expand(random_runs(1, CHANNELS, count=20))
+    capture = LiveCapture(StreamingDriver(values, 1, error=OSError("unplugged")))
+    with pytest.raises(OSError, match="unplugged"):
+        capture.run(Recorder(), waiter_stack(1))
+
+
+def test_drop_policy_counts_dropped_blocks():
+    buffer = BlockBuffer(10, overflow="drop")
+    assert buffer.put([0] * 6)
+    assert buffer.put([1] * 6)
+    assert buffer.get() == [0] * 6
+    buffer.close()
+    assert buffer.get() is None
+    assert not buffer.put([2])
+    stats = buffer.stats()
+    assert stats["dropped_blocks"] == 1
+    assert stats["dropped_samples"] == 6
+    assert stats["high_water_samples"] == 6
+
+
+class EndlessDriver(StreamingDriver):
+    """Streams runs of a random capture over and over until told to stop."""
+
+    def stream(self, push, samples=None, triggers={}, trigger_immediately=True):
+        self.pushed = LogicRuns()
+        runs = itertools.cycle(random_runs(self.seed, CHANNELS))
+        for i in itertools.count():
+            if i == 50:
+                _thread.interrupt_main()
+            block = LogicRuns([next(runs)])
+            if not push(block):
+                self.stopped = True
+                return
+            self.pushed.extend(block)
+
+
+def test_interrupt_ends_the_capture_and_finishes_the_output():
+    driver = EndlessDriver([], 3)
+    handler = signal.getsignal(signal.SIGINT)
+    capture = LiveCapture(driver)
+    file = io.BytesIO()
+    output = SrZipOutput(file, capture.input, logic_channels=NAMES)
+    capture.run(output, waiter_stack(3), annotations={"waiter": None})
+    assert driver.stopped
+    assert signal.getsignal(signal.SIGINT) is handler
+    assert capture.buffer.stats()["received_samples"] == driver.pushed.samples
+
+    file.seek(0)
+    _, items = decode(SrZipInput(file))
+    _, expected = decode(ReferenceInput(expand(driver.pushed), NAMES))
+    assert items == expected
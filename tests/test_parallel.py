@@ -0,0 +1,80 @@
+import pytest
+
+import sigrokdecode as srd
+from sigrokdecode.output import Output
+from sigrokdecode.parallel import run_decoders_parallel, segment_bounds
+from sigrokdecode.srzip import SrZipInput
+
+from .helpers import random_runs, write_capture
+
+
+class Edges(srd.Decoder):
+    """Annotates edges on its channel, or the edges of the decoder below it."""
+
+    id = "edges"
+    name = "Edges"
+    api_version = 3
+    channels = ({"id": "d", "name": "D", "desc": ""},)
+    options = ()
+    annotations = (("edge", "Edge"),)
+
+    def reset(self):
+        pass
+
+    def start(self):
+        self.out_python = self.register(srd.OUTPUT_PYTHON)
+        self.out_ann = self.register(srd.OUTPUT_ANN)
+
+    def decode(self, *stacked):
+        if stacked:
+            startsample, endsample, data = stacked
+            self.put(startsample, endsample, self.out_ann, [0, [f"stacked {data}"]])
+            return
+        while True:
+            (pin,) = self.wait({0: "e"})
+            self.put(self.samplenum, self.samplenum + 1, self.out_python, pin)
+            self.put(self.samplenum, self.samplenum + 1, self.out_ann, [0, [str(pin)]])
+
+
+class Collect(Output):
+    data_classes = ()
+
+    def __init__(self):
+        self.items = {}
+
+    def output(self, source, startsample, endsample, data):
+        self.items.setdefault(source, []).append((startsample, endsample, repr(data)))
+
+
+def by_decoder(output):
+    # Sources differ between runs so compare what each one produced.
+    return sorted(output.items.values())
+
+
+def test_segment_bounds_cover_all_samples():
+    assert segment_bounds(10, 4) == [(0, 4), (4, 8), (8, 10)]
+
+
+@pytest.mark.parametrize("segment_samples", [20000, 77777])
+def test_parallel_matches_serial_with_repeated_decoder(tmp_path, segment_samples):
+    runs = random_runs(12, 2)
+    path = tmp_path / "capture.sr"
+    write_capture(path, runs, 2, chunk=8192)
+    decoders = [
+        {"id": "edges", "cls": Edges, "options": {}, "pin_mapping": {"d": 1}},
+        {"id": "edges", "cls": Edges, "options": {}, "pin_mapping": {}},
+    ]
+
+    serial = Collect()
+    srd.run_decoders(SrZipInput(path), serial, decoders)
+    parallel = Collect()
+    run_decoders_parallel(
+        path,
+        parallel,
+        decoders,
+        jobs=2,
+        segment_samples=segment_samples,
+        overlap=10000,
+    )
+    assert len(serial.items) == 2
+    assert by_decoder(parallel) == by_decoder(serial)
@@ -0,0 +1,53 @@
+import itertools
+
+import pytest
+
+import sigrokdecode as srd
+
+
+def make_decoder(required, optional):
+    class Pins(srd.Decoder):
+        id = "pins"
+        channels = tuple(
+            {"id": f"r{i}", "name": f"R{i}", "desc": ""} for i in range(required)
+        )
+        optional_channels = tuple(
+            {"id": f"o{i}", "name": f"O{i}", "desc": ""} for i in range(optional)
+        )
+
+    return Pins()
+
+
+def reference_pins(decoder, raw_data):
+    """The original per-call pin tuple construction."""
+    data = [None] * (
+        len(type(decoder).channels)
+        + len(getattr(type(decoder), "optional_channels", []))
+    )
+    for decoder_channel in decoder.decoder_channel_to_data_channel:
+        data_channel = decoder.decoder_channel_to_data_channel[decoder_channel]
+        data[decoder_channel] = raw_data[data_channel]
+    return tuple(data)
+
+
+@pytest.mark.parametrize(
+    "required,optional,mapping",
+    [
+        (1, 0, {"r0": 0}),
+        (1, 0, {"r0": 5}),
+        (3, 0, {"r0": 0, "r1": 1, "r2": 2}),
+        (3, 0, {"r0": 2, "r1": 0, "r2": 7}),
+        (2, 2, {"r0": 0, "r1": 1, "o0": 2, "o1": 3}),
+        (2, 2, {"r0": 3, "r1": 1}),
+        (2, 2, {"r0": 0, "r1": 1, "o1": 6}),
+    ],
+)
+def test_pins_match_reference(required, optional, mapping):
+    decoder = make_decoder(required, optional)
+    for name, channel in mapping.items():
+        decoder.set_channelnum(name, channel)
+    for raw_data in itertools.product((0, 1), repeat=8):
+        expected = reference_pins(decoder, raw_data)
+        assert decoder._decoder_pins(raw_data) == expected
+        # Served from the cache the second time.
+        assert decoder._decoder_pins(raw_data) == expected
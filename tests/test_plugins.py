@@ -0,0 +1,60 @@
+import sys
+
+import pytest
+
+from sigrokdecode.plugins import PluginRegistry
+
+if sys.version_info < (3, 10):
+    from importlib_metadata import entry_points
+else:
+    from importlib.metadata import entry_points
+
+GROUPS = ["pysigrok.input_format", "pysigrok.output_format"]
+
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    return tmp_path
+
+
+def eager(group):
+    """Load every plugin up front like the CLI used to."""
+    plugins = {}
+    for entry_point in entry_points(group=group):
+        loaded = entry_point.load()
+        plugins[loaded.name] = loaded
+    return plugins
+
+
+@pytest.mark.parametrize("group", GROUPS)
+def test_registry_matches_eager_loading(group):
+    expected = eager(group)
+    registry = PluginRegistry(group, "name")
+    assert sorted(registry) == sorted(expected)
+    for name, cls in expected.items():
+        assert registry[name] is cls
+
+
+@pytest.mark.parametrize("group", GROUPS)
+def test_metadata_is_read_from_the_cache(group, monkeypatch):
+    metadata = PluginRegistry(group, "name").metadata()
+
+    def load(self, entry_point):
+        raise AssertionError(f"{entry_point.name} was imported")
+
+    monkeypatch.setattr(PluginRegistry, "_load", load)
+    assert PluginRegistry(group, "name").metadata() == metadata
+    for name, cls in eager(group).items():
+        assert metadata[name]["desc"] == cls.desc
+
+
+def test_stale_cache_is_rebuilt(cache_home, monkeypatch):
+    group = GROUPS[1]
+    registry = PluginRegistry(group, "name")
+    registry.metadata()
+    path = registry._cache_path()
+    path.write_text(path.read_text().replace('"desc"', '"stale"'))
+    monkeypatch.setattr(PluginRegistry, "_fingerprint", lambda self: "changed")
+    metadata = PluginRegistry(group, "name").metadata()
+    assert all("desc" in info for info in metadata.values())
@@ -0,0 +1,51 @@
+import io
+import random
+import zipfile
+
+import pytest
+
+from sigrokdecode import srzip
+from sigrokdecode.runs import LogicRuns
+
+from .helpers import Device, chunk_size, expand, random_runs
+
+
+def test_append_merges_equal_values():
+    runs = LogicRuns([(1, 3), (1, 2), (0, 0), (2, 1)])
+    assert list(runs) == [(1, 5), (2, 1)]
+    assert runs.samples == 6
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_take_matches_slicing(seed):
+    rng = random.Random(seed)
+    runs = random_runs(seed, 4, count=50)
+    samples = expand(runs)
+    while runs:
+        count = rng.randrange(0, 3000)
+        taken = runs.take(count)
+        assert expand(taken) == samples[:count]
+        assert taken.samples == len(samples[:count])
+        samples = samples[count:]
+        assert expand(runs) == samples
+        assert runs.samples == len(samples)
+
+
+def _write(runs, per_sample):
+    file = io.BytesIO()
+    device = Device()
+    with chunk_size(1000):
+        output = srzip.SrZipOutput(file, device, logic_channels=["D0", "D1", "D2"])
+        if per_sample:
+            for samplenum, value in enumerate(expand(runs)):
+                output.output(device, samplenum, samplenum + 1, ["logic", value])
+        else:
+            output.output(device, 0, runs.samples, ["logic", runs])
+        output.stop()
+    with zipfile.ZipFile(file) as capture:
+        return {name: capture.read(name) for name in capture.namelist()}
+
+
+def test_srzip_output_of_runs_matches_per_sample_output():
+    runs = random_runs(2, 3, count=100)
+    assert _write(runs, per_sample=False) == _write(runs, per_sample=True)
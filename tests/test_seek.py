@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from sigrokdecode.srzip import SrZipInput
+
+from .helpers import (
+    ReferenceInput,
+    decode,
+    expand,
+    random_runs,
+    random_waiter,
+    write_capture,
+    write_raw_capture,
+)
+
+CHANNELS = 4
+NAMES = [f"D{i}" for i in range(CHANNELS)]
+PIN_MAPPING = {f"c{i}": i for i in range(CHANNELS)}
+
+
+def ranges(total, seed, chunk_samples):
+    rng = random.Random(seed)
+    yield 1, None
+    yield chunk_samples, 3 * chunk_samples
+    yield chunk_samples - 1, chunk_samples + 1
+    for _ in range(4):
+        start = rng.randrange(total - 1)
+        yield start, rng.choice([None, rng.randrange(start + 1, total)])
+
+
+def check_ranges(path, values, seed, chunk_samples, **options):
+    decoder = random_waiter(CHANNELS, seed)
+    for start, end in ranges(len(values), seed, chunk_samples):
+        reference = ReferenceInput(values, NAMES)
+        reference.seek(start, end)
+        expected = decode(reference, decoder, PIN_MAPPING)
+        input_ = SrZipInput(path, **options)
+        input_.seek(start, end)
+        assert decode(input_, decoder, PIN_MAPPING) == expected, (start, end)
+        input_.close()
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_seek_matches_reference(tmp_path, seed):
+    runs = random_runs(seed, CHANNELS)
+    path = tmp_path / "capture.sr"
+    write_capture(path, runs, CHANNELS, chunk=4096)
+    check_ranges(path, expand(runs), seed, 4096, index="true")
+
+
+def test_single_file_index_follows_the_window(tmp_path):
+    values = expand(random_runs(3, CHANNELS))
+    probes = {i: name for i, name in enumerate(NAMES)}
+    path = tmp_path / "capture.sr"
+    write_raw_capture(path, values, 1, probes, single_file=True)
+    # Cache an index made of other windows than the ones read below.
+    SrZipInput(path, window=3000).index()
+    check_ranges(path, values, 3, 1000, window=1000)
+
+
+def test_seek_reads_the_sample_before_start_without_an_index_entry(tmp_path):
+    runs = random_runs(4, CHANNELS)
+    values = expand(runs)
+    path = tmp_path / "capture.sr"
+    write_capture(path, runs, CHANNELS, chunk=4096)
+    input_ = SrZipInput(path)
+    index = input_.index()
+    # Drop the chunk boundary seek() looks for.
+    input_._index = [index[0]._replace(last_sample=-2)] + index[1:]
+    input_.seek(4096)
+    assert input_.last_sample == values[4095]
+    reference = ReferenceInput(values, NAMES)
+    reference.seek(4096)
+    decoder = random_waiter(CHANNELS, 4)
+    assert decode(input_, decoder, PIN_MAPPING) == decode(
+        reference, decoder, PIN_MAPPING
+    )
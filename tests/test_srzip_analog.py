@@ -0,0 +1,160 @@
+import array
+import io
+
+import pytest
+
+import sigrokdecode as srd
+from sigrokdecode.bits import BitsOutput
+from sigrokdecode.runs import LogicRuns
+from sigrokdecode.srzip import SrZipInput
+
+from .helpers import decode, random_runs, random_waiter, write_capture
+
+CHANNELS = 4
+
+
+@pytest.fixture
+def capture(tmp_path):
+    runs = random_runs(6, CHANNELS, count=60)
+    analog = [
+        array.array("f", (i / 8 for i in range(runs.samples))),
+        array.array("f", (-(i % 1000) for i in range(runs.samples))),
+    ]
+    path = tmp_path / "capture.sr"
+    write_capture(path, runs, CHANNELS, analog=analog, chunk=4096)
+    return path, analog
+
+
+def expected_analog(analog):
+    return [
+        ("analog", i, (round(a, 5), round(b, 5)))
+        for i, (a, b) in enumerate(zip(*analog))
+    ]
+
+
+@pytest.mark.parametrize("prefetch", [0, 2])
+@pytest.mark.parametrize("analog_blocks", ["false", "true"])
+def test_analog_reaches_the_end_of_the_capture(capture, prefetch, analog_blocks):
+    path, analog = capture
+    decoder = random_waiter(CHANNELS, 6)
+    pin_mapping = {f"c{i}": i for i in range(CHANNELS)}
+    data_classes = ("logic", "analog")
+
+    expected_log, expected_items = decode(
+        SrZipInput(path), decoder, pin_mapping, data_classes
+    )
+    input_ = SrZipInput(path, prefetch=prefetch, analog_blocks=analog_blocks)
+    log, items = decode(input_, decoder, pin_mapping, data_classes)
+    input_.close()
+    assert log == expected_log
+    # Blocks of analog samples are put at other times than single samples.
+    for kind in ("logic", "waiter"):
+        assert [item for item in items if item[0] == kind] == [
+            item for item in expected_items if item[0] == kind
+        ]
+    analog_items = [item for item in items if item[0] == "analog"]
+    assert analog_items == expected_analog(analog)
+
+
+def test_get_analog_values_matches_written_samples(capture):
+    path, analog = capture
+    input_ = SrZipInput(path, prefetch=2)
+    for samplenum in range(0, len(analog[0]), 997):
+        assert input_.get_analog_values(samplenum) == [c[samplenum] for c in analog]
+    input_.close()
+
+
+class RiseWaiter(srd.Decoder):
+    """Waits for a rising edge on a channel that never rises."""
+
+    id = "rise"
+    api_version = 3
+    channels = ({"id": "d", "name": "D", "desc": ""},)
+    annotations = ()
+
+    def reset(self):
+        self.log = []
+
+    def start(self):
+        pass
+
+    def decode(self):
+        while True:
+            self.wait({0: "r"})
+            self.log.append(self.samplenum)
+
+
+@pytest.mark.parametrize("prefetch", [0, 2])
+def test_analog_blocks_after_the_last_wait(tmp_path, prefetch):
+    # All analog chunks after the first are put once the logic data has ended.
+    runs = LogicRuns((i % 2, 7) for i in range(3000))
+    analog = [array.array("f", range(runs.samples))] * 2
+    path = tmp_path / "capture.sr"
+    write_capture(path, runs, CHANNELS, analog=analog, chunk=4096)
+    input_ = SrZipInput(path, prefetch=prefetch, analog_blocks="true")
+    log, items = decode(input_, RiseWaiter, {"d": 3}, ("logic", "analog"))
+    input_.close()
+    assert log == []
+    assert [item for item in items if item[0] == "analog"] == expected_analog(analog)
+
+
+def test_analog_blocks_match_written_samples(capture):
+    path, analog = capture
+    input_ = SrZipInput(path)
+    start = 100
+    end = len(analog[0]) - 100
+    samples = [array.array("f") for _ in analog]
+    while start < end:
+        block_end, block = input_.get_analog_block(start, end)
+        assert start < block_end <= end
+        for channel, values in zip(samples, block):
+            channel.extend(values)
+        start = block_end
+    assert samples == [channel[100:-100] for channel in analog]
+    input_.close()
+
+
+def test_analog_is_only_read_when_wanted(capture):
+    path, _ = capture
+    decoder = random_waiter(CHANNELS, 9)
+    pin_mapping = {f"c{i}": i for i in range(CHANNELS)}
+
+    with_analog = SrZipInput(path)
+    expected_log, expected_items = decode(
+        with_analog, decoder, pin_mapping, ("logic", "analog")
+    )
+    logic_only = SrZipInput(path)
+    log, items = decode(logic_only, decoder, pin_mapping, ("logic",))
+    assert log == expected_log
+    assert items == [item for item in expected_items if item[0] != "analog"]
+    logic_chunks = len(logic_only._logic_chunk_names())
+    assert logic_only.chunks_read == logic_chunks
+    assert with_analog.chunks_read > logic_chunks
+
+
+def test_bits_output_only_wants_logic_without_decoders(capture):
+    path, _ = capture
+    decoder = random_waiter(CHANNELS, 9)
+    decoders = [
+        {
+            "id": decoder.id,
+            "cls": decoder,
+            "options": {},
+            "pin_mapping": {f"c{i}": i for i in range(CHANNELS)},
+        }
+    ]
+    input_ = SrZipInput(path)
+    output = BitsOutput(io.BytesIO(), input_, input_.logic_channels)
+    srd.start_decoders(input_, output, decoders)
+    assert input_.wants("logic")
+
+    input_ = SrZipInput(path)
+    file = io.BytesIO()
+    output = BitsOutput(file, input_, input_.logic_channels, decoders=decoders)
+    all_decoders = srd.start_decoders(input_, output, decoders)
+    assert not input_.wants("logic")
+    assert not input_.wants("analog")
+    all_decoders[0].run(input_)
+    srd.stop_decoders(all_decoders, output)
+    lines = file.getvalue().decode("utf-8").splitlines()
+    assert lines and all(line.startswith("(") for line in lines)
@@ -0,0 +1,87 @@
+import pytest
+
+from sigrokdecode.srzip import SrZipInput
+
+from .helpers import (
+    ReferenceInput,
+    decode,
+    expand,
+    map_values,
+    random_runs,
+    random_waiter,
+    write_capture,
+    write_raw_capture,
+)
+
+
+@pytest.mark.parametrize("channels", [3, 8, 12])
+@pytest.mark.parametrize("data_classes", [(), ("logic",)])
+@pytest.mark.parametrize("seed", range(3))
+def test_wait_matches_reference(tmp_path, channels, data_classes, seed):
+    runs = random_runs(seed, channels)
+    path = tmp_path / "capture.sr"
+    write_capture(path, runs, channels, chunk=4096)
+    names = [f"D{i}" for i in range(channels)]
+    decoder = random_waiter(min(channels, 4), seed)
+    pin_mapping = {f"c{i}": i for i in range(min(channels, 4))}
+
+    expected = decode(
+        ReferenceInput(expand(runs), names), decoder, pin_mapping, data_classes
+    )
+    actual = decode(SrZipInput(path), decoder, pin_mapping, data_classes)
+    assert actual == expected
+
+
+@pytest.mark.parametrize("unitsize", [1, 2])
+def test_unmapped_probes_match_reference(tmp_path, unitsize):
+    probes = {0: "A", 2: "B", 5: "C", 7: "D"}
+    if unitsize == 2:
+        probes.update({9: "E", 14: "F"})
+    values = expand(random_runs(7, 8 * unitsize))
+    path = tmp_path / "capture.sr"
+    write_raw_capture(path, values, unitsize, probes, chunk_samples=3000)
+    decoder = random_waiter(4, 7)
+    pin_mapping = {f"c{i}": i for i in range(4)}
+
+    expected = decode(
+        ReferenceInput(map_values(values, probes), list(probes.values())),
+        decoder,
+        pin_mapping,
+    )
+    actual = decode(SrZipInput(path), decoder, pin_mapping)
+    assert actual == expected
+
+
+@pytest.mark.parametrize("unitsize", [1, 2, 4])
+def test_remap_tables_match_per_bit_mapping(tmp_path, unitsize):
+    probes = {0: "A", 3: "B", 4: "C", 7: "D"}
+    probes.update({8 * unitsize - 1: "E", 8 * unitsize - 6: "F"})
+    values = [(v * 2654435761) & ((1 << (8 * unitsize)) - 1) for v in range(5000)]
+    path = tmp_path / "capture.sr"
+    write_raw_capture(path, values, unitsize, probes)
+    input_ = SrZipInput(path)
+    assert [input_._map_sample(value) for value in values] == map_values(values, probes)
+
+
+@pytest.mark.parametrize("single_file", [False, True])
+@pytest.mark.parametrize("data_classes", [(), ("logic",)])
+def test_remapped_single_byte_chunks_match_reference(
+    tmp_path, single_file, data_classes
+):
+    probes = {1: "A", 2: "B", 4: "C", 6: "D"}
+    values = expand(random_runs(11, 8))
+    path = tmp_path / "capture.sr"
+    write_raw_capture(
+        path, values, 1, probes, chunk_samples=2500, single_file=single_file
+    )
+    decoder = random_waiter(4, 11)
+    pin_mapping = {f"c{i}": i for i in range(4)}
+
+    expected = decode(
+        ReferenceInput(map_values(values, probes), list(probes.values())),
+        decoder,
+        pin_mapping,
+        data_classes,
+    )
+    actual = decode(SrZipInput(path, window=700), decoder, pin_mapping, data_classes)
+    assert actual == expected
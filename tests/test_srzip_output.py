@@ -0,0 +1,107 @@
+import array
+import concurrent.futures
+import io
+import zipfile
+
+import pytest
+
+from sigrokdecode import srzip
+
+from .helpers import Device, chunk_size, expand, random_runs
+
+CHUNK = 1000
+
+
+def reference_members(values, channels, analog):
+    """The chunk members the original per-sample SrZipOutput wrote."""
+    members = {}
+    raw = array.array(srzip.TYPECODE[channels // 8 + 1], values).tobytes()
+    for i, start in enumerate(range(0, len(raw), CHUNK)):
+        members[f"logic-1-{i + 1}"] = raw[start : start + CHUNK]
+    for c, samples in enumerate(analog):
+        raw = array.array("f", samples).tobytes()
+        for i, start in enumerate(range(0, len(raw), CHUNK)):
+            members[f"analog-1-{channels + c + 1}-{i + 1}"] = raw[start : start + CHUNK]
+    return members
+
+
+def write(runs, channels, analog, analog_blocks, **options):
+    file = io.BytesIO()
+    device = Device()
+    with chunk_size(CHUNK):
+        output = srzip.SrZipOutput(
+            file,
+            device,
+            logic_channels=[f"D{i}" for i in range(channels)],
+            analog_channels=[f"A{i}" for i in range(len(analog))],
+            **options,
+        )
+        samplenum = 0
+        for value, length in runs:
+            output.output(device, samplenum, samplenum + length, ["logic", value])
+            samplenum += length
+        if analog_blocks:
+            output.output(device, 0, len(analog[0]), ["analog_block", *analog])
+        else:
+            for samplenum, values in enumerate(zip(*analog)):
+                output.output(device, samplenum, samplenum + 1, ["analog", *values])
+        output.stop()
+    with zipfile.ZipFile(file) as capture:
+        return {
+            name: capture.read(name)
+            for name in capture.namelist()
+            if name.startswith(("logic", "analog"))
+        }
+
+
+@pytest.mark.parametrize("channels", [3, 8, 12])
+@pytest.mark.parametrize("analog_blocks", [False, True])
+def test_chunks_match_reference(channels, analog_blocks):
+    runs = random_runs(5, channels, count=100)
+    analog = [
+        array.array("f", (i * 0.25 for i in range(runs.samples))),
+        array.array("f", (-i for i in range(runs.samples))),
+    ]
+    expected = reference_members(expand(runs), channels, analog)
+    assert write(runs, channels, analog, analog_blocks) == expected
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"background": "true"},
+        {"background": "true", "max_pending": "1"},
+        {"compression": "stored"},
+        {"level": "1", "background": "true"},
+    ],
+)
+def test_options_keep_the_chunks(options):
+    runs = random_runs(8, 12, count=100)
+    analog = [array.array("f", range(runs.samples))]
+    expected = reference_members(expand(runs), 12, analog)
+    assert write(runs, 12, analog, True, **options) == expected
+
+
+class FailingFile(io.BytesIO):
+    fail = False
+
+    def write(self, data):
+        if self.fail:
+            raise OSError("disk full")
+        return super().write(data)
+
+
+def test_writer_errors_are_raised_on_the_next_write():
+    file = FailingFile()
+    device = Device()
+    with chunk_size(CHUNK):
+        output = srzip.SrZipOutput(
+            file, device, logic_channels=["D0"], background="true"
+        )
+        file.fail = True
+        output.output(device, 0, CHUNK, ["logic", 1])
+        concurrent.futures.wait(output._pending)
+        with pytest.raises(OSError, match="disk full"):
+            output.output(device, CHUNK, CHUNK + 1, ["logic", 0])
+        file.fail = False
+        output.stop()
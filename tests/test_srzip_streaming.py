@@ -0,0 +1,57 @@
+import zipfile
+
+import pytest
+
+from sigrokdecode.srzip import SrZipInput
+
+from .helpers import (
+    ReferenceInput,
+    decode,
+    expand,
+    random_runs,
+    random_waiter,
+    write_raw_capture,
+)
+
+PROBES = {i: f"D{i}" for i in range(10)}
+
+
+@pytest.mark.parametrize(
+    "compression,single_file,window",
+    [
+        (zipfile.ZIP_DEFLATED, True, 1000),
+        (zipfile.ZIP_DEFLATED, True, None),
+        (zipfile.ZIP_STORED, True, None),
+        (zipfile.ZIP_STORED, False, None),
+    ],
+)
+def test_streamed_and_mapped_reads_match_reference(
+    tmp_path, compression, single_file, window
+):
+    values = expand(random_runs(3, 10))
+    path = tmp_path / "capture.sr"
+    write_raw_capture(
+        path,
+        values,
+        2,
+        PROBES,
+        chunk_samples=5000,
+        single_file=single_file,
+        compression=compression,
+    )
+    decoder = random_waiter(4, 3)
+    pin_mapping = {f"c{i}": i for i in range(4)}
+
+    expected = decode(ReferenceInput(values, PROBES.values()), decoder, pin_mapping)
+    actual = decode(SrZipInput(path, window=window), decoder, pin_mapping)
+    assert actual == expected
+
+
+def test_stored_chunks_are_mapped(tmp_path):
+    values = expand(random_runs(4, 10))
+    path = tmp_path / "capture.sr"
+    write_raw_capture(path, values, 2, PROBES, compression=zipfile.ZIP_STORED)
+    input_ = SrZipInput(path)
+    assert input_._load_next_chunk()
+    assert isinstance(input_._raw, memoryview)
+    assert list(input_.data) == values
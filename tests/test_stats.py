@@ -0,0 +1,73 @@
+import pytest
+
+import sigrokdecode as srd
+from sigrokdecode.srzip import SrZipInput
+from sigrokdecode.stats import RunStats
+from sigrokdecode.stream import StreamInput
+
+from .helpers import (
+    Recorder,
+    decode,
+    expand,
+    random_runs,
+    random_waiter,
+    write_capture,
+)
+
+CHANNELS = 4
+PIN_MAPPING = {f"c{i}": i for i in range(CHANNELS)}
+
+
+@pytest.fixture
+def capture(tmp_path):
+    runs = random_runs(15, CHANNELS)
+    path = tmp_path / "capture.sr"
+    write_capture(path, runs, CHANNELS, chunk=8192)
+    return path, runs
+
+
+def run(input_, decoder=None):
+    stats = RunStats()
+    decoders = []
+    if decoder is not None:
+        decoders = [
+            {"id": "waiter", "cls": decoder, "options": {}, "pin_mapping": PIN_MAPPING}
+        ]
+    srd.run_decoders(input_, Recorder(), decoders, stats=stats)
+    return stats
+
+
+def test_counts_match_the_capture(capture):
+    path, runs = capture
+    decoder = random_waiter(CHANNELS, 15)
+    stats = run(SrZipInput(path), decoder)
+    log, _ = decode(SrZipInput(path), decoder, PIN_MAPPING)
+
+    assert stats.samples == runs.samples
+    (decoder_stats,) = stats.to_dict()["decoders"]
+    assert decoder_stats["waits"] == len(log) + 1
+    assert decoder_stats["samples_scanned"] == runs.samples
+    assert "matches" not in decoder_stats
+    assert stats.to_dict()["input"]["samples"] == runs.samples
+
+
+def test_counts_without_decoders(capture):
+    path, runs = capture
+    assert run(SrZipInput(path)).samples == runs.samples
+
+
+def test_counts_after_seek(capture):
+    path, _ = capture
+    input_ = SrZipInput(path)
+    input_.seek(10000, 54321)
+    assert run(input_, random_waiter(CHANNELS, 15)).samples == 44321
+
+
+def test_counts_of_a_stream(capture):
+    _, runs = capture
+    input_ = StreamInput([f"D{i}" for i in range(CHANNELS)])
+    input_.push(expand(runs))
+    input_.close()
+    stats = run(input_, random_waiter(CHANNELS, 15))
+    assert stats.samples == runs.samples
+    assert stats.to_dict()["decoders"][0]["samples_scanned"] == runs.samples
@@ -0,0 +1,105 @@
+import random
+import threading
+
+import pytest
+
+from sigrokdecode import input as srd_input
+from sigrokdecode.stream import DecoderSession, StreamInput
+
+from .helpers import (
+    Recorder,
+    ReferenceInput,
+    decode,
+    expand,
+    random_runs,
+    random_waiter,
+)
+
+CHANNELS = 4
+PIN_MAPPING = {f"c{i}": i for i in range(CHANNELS)}
+NAMES = [f"D{i}" for i in range(CHANNELS)]
+
+
+def feed_blocks(session, values, seed):
+    rng = random.Random(seed)
+    position = 0
+    while position < len(values):
+        size = rng.choice([1, 2, 17, 500, 4096, 30000])
+        session.feed(values[position : position + size])
+        position += size
+    session.close()
+
+
+@pytest.mark.parametrize("generator", [False, True])
+@pytest.mark.parametrize("seed", range(3))
+def test_session_matches_reference(generator, seed):
+    values = expand(random_runs(seed, CHANNELS))
+    decoder = random_waiter(CHANNELS, seed)
+    _, expected = decode(ReferenceInput(values, NAMES), decoder, PIN_MAPPING)
+
+    output = Recorder()
+    session = DecoderSession(
+        [
+            {
+                "id": "waiter",
+                "cls": random_waiter(CHANNELS, seed, generator=generator),
+                "options": {},
+                "pin_mapping": PIN_MAPPING,
+            }
+        ],
+        NAMES,
+        output=output,
+        annotations={"waiter": None},
+    )
+    feed_blocks(session, values, seed)
+    assert session.finished
+    assert output.items == expected
+
+
+def test_session_returns_records():
+    values = expand(random_runs(4, CHANNELS, count=50))
+    decoder = random_waiter(CHANNELS, 4)
+    _, expected = decode(ReferenceInput(values, NAMES), decoder, PIN_MAPPING)
+
+    session = DecoderSession(
+        [{"id": "waiter", "cls": decoder, "options": {}, "pin_mapping": PIN_MAPPING}],
+        NAMES,
+    )
+    records = session.feed(values[:1000])
+    records += session.feed(values[1000:])
+    records += session.close()
+    assert [("waiter", r.startsample, r.endsample, repr(r.data)) for r in records] == [
+        item for item in expected if item[0] == "waiter"
+    ]
+
+
+def test_bit_tuples_are_bounded(monkeypatch):
+    monkeypatch.setattr(srd_input, "_MAX_BIT_TUPLES", 4)
+    input_ = StreamInput(NAMES)
+    for value in range(10):
+        assert input_._sample_bits(value) == tuple(
+            (value >> bit) & 1 for bit in range(8)
+        )
+    assert len(input_._bit_tuples) <= 4
+
+
+@pytest.mark.parametrize("generator", [False, True])
+def test_abort_releases_the_decoder_thread(generator):
+    values = expand(random_runs(5, CHANNELS, count=50))
+    threads = threading.active_count()
+    stopped = []
+    decoder = random_waiter(CHANNELS, 5, generator=generator)
+    decoder.stop = lambda self: stopped.append(self)
+    session = DecoderSession(
+        [{"id": "waiter", "cls": decoder, "options": {}, "pin_mapping": PIN_MAPPING}],
+        NAMES,
+    )
+    session.feed(values[:1000])
+    session.abort()
+    assert session.finished
+    assert threading.active_count() == threads
+    assert not stopped
+    with pytest.raises(ValueError):
+        session.feed(values[1000:])
+    assert session.close() == []
+    session.abort()
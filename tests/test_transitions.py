@@ -0,0 +1,102 @@
+import array
+import io
+import random
+import zipfile
+
+import pytest
+
+import sigrokdecode as srd
+from sigrokdecode.runs import LogicTransitions
+from sigrokdecode.srzip import SrZipInput, SrZipOutput
+from sigrokdecode.transitions import TransitionsInput, TransitionsOutput
+
+from .helpers import (
+    Device,
+    ReferenceInput,
+    decode,
+    expand,
+    random_runs,
+    random_waiter,
+    write_capture,
+)
+
+CHANNELS = 10
+NAMES = [f"D{i}" for i in range(CHANNELS)]
+PIN_MAPPING = {f"c{i}": i for i in range(4)}
+
+
+def test_logic_transitions_match_samples():
+    runs = random_runs(1, 4, count=80)
+    values = expand(runs)
+    transitions = LogicTransitions(100)
+    transitions.extend(runs)
+    assert transitions.samples == len(values)
+    rng = random.Random(1)
+    for _ in range(200):
+        start = rng.randrange(100, transitions.end)
+        end = rng.randrange(start, transitions.end + 1)
+        assert transitions.value_at(start) == values[start - 100]
+        assert expand(transitions.runs(start, end)) == values[start - 100 : end - 100]
+
+
+def convert(path, tmp_path):
+    input_ = SrZipInput(path)
+    converted = tmp_path / "capture.srt"
+    with open(converted, "wb") as f:
+        output = TransitionsOutput(f, input_, input_.logic_channels)
+        srd.run_decoders(input_, output)
+    return converted
+
+
+@pytest.fixture
+def capture(tmp_path):
+    runs = random_runs(2, CHANNELS)
+    path = tmp_path / "capture.sr"
+    write_capture(path, runs, CHANNELS, chunk=4096)
+    return path, expand(runs)
+
+
+@pytest.mark.parametrize("data_classes", [(), ("logic",)])
+def test_converted_capture_matches_reference(tmp_path, capture, data_classes):
+    path, values = capture
+    converted = convert(path, tmp_path)
+    decoder = random_waiter(4, 2)
+    expected = decode(ReferenceInput(values, NAMES), decoder, PIN_MAPPING, data_classes)
+    input_ = TransitionsInput(converted)
+    assert input_.logic_channels == NAMES
+    assert decode(input_, decoder, PIN_MAPPING, data_classes) == expected
+
+
+@pytest.mark.parametrize("start,end", [(1, None), (4096, 9000), (12345, 12346)])
+def test_seek_matches_reference(tmp_path, capture, start, end):
+    path, values = capture
+    converted = convert(path, tmp_path)
+    decoder = random_waiter(4, 3)
+    reference = ReferenceInput(values, NAMES)
+    reference.seek(start, end)
+    input_ = TransitionsInput(converted)
+    input_.seek(start, end)
+    assert decode(input_, decoder, PIN_MAPPING) == decode(
+        reference, decoder, PIN_MAPPING
+    )
+
+
+def test_converting_back_gives_the_same_samples(tmp_path, capture):
+    path, values = capture
+    input_ = TransitionsInput(convert(path, tmp_path))
+    file = io.BytesIO()
+    output = SrZipOutput(file, input_, input_.logic_channels)
+    srd.run_decoders(input_, output)
+    with zipfile.ZipFile(file) as converted:
+        raw = converted.read("logic-1-1")
+    assert raw == array.array("H", values).tobytes()
+
+
+@pytest.mark.parametrize("output_class", [SrZipOutput, TransitionsOutput])
+def test_compression_options(output_class):
+    with pytest.raises(ValueError, match="Unknown compression bogus"):
+        output_class(io.BytesIO(), Device(), ["D0"], compression="bogus")
+    file = io.BytesIO()
+    output = output_class(file, Device(), ["D0"], compression="stored", level="1")
+    assert output.zip.compression == zipfile.ZIP_STORED
+    output.stop()